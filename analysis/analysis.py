@@ -1,7 +1,10 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 from statistics import mean, stdev
 import pandas as pd
 import csv
+import json
 
 EXPERIMENT_FOLDER = Path(
     __file__).parent.parent.resolve() / "data" / "experiment"
@@ -10,52 +13,183 @@ DATA_FOLDER = Path(
     __file__).parent.parent.resolve() / "data"
 
 
-def load_data():
+CACHE_FOLDER = Path(__file__).parent.resolve() / ".cache"
+
+# Types of the columns in the cache, all other columns are stored as float
+COLUMN_TYPES = {
+    "trial": "int64",
+    "correct": "bool",
+    "flipped": "bool",
+    "fact_id": "category",
+    "question": "string",
+    "answer": "string",
+}
+
+
+def get_subject_files(folder: Path = EXPERIMENT_FOLDER) -> dict:
+    """
+    Return the session log and test result files of each subject in a folder.
+    """
+    files = dict()
+    for f in sorted(folder.glob("*.csv")):
+        is_test = f.stem.endswith("_test")
+        subject = f.stem.replace("_test", "") if is_test else f.stem
+        files.setdefault(subject, dict())["test" if is_test else "experiment"] = f
+    return files
+
+
+def update_cache(f: Path) -> Path:
+    """
+    Convert a CSV file to the cache, unless the cached copy was made from a file with the same modification time and size.
+    Each column is stored as a separate typed pickle, so that columns can be loaded individually.
+    Returns the cache folder of the file.
+    """
+    folder = CACHE_FOLDER / f.parent.name / f.stem
+    stat = f.stat()
+    source = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+    meta_file = folder / "meta.json"
+    if meta_file.exists():
+        with open(meta_file, encoding="utf-8") as file:
+            if json.load(file)["source"] == source:
+                return folder
+
+    df = pd.read_csv(f, header=0, index_col=0)
+    df = df.astype({column: COLUMN_TYPES.get(column, "float64")
+                   for column in df.columns})
+
+    folder.mkdir(parents=True, exist_ok=True)
+    for column in df.columns:
+        df[column].to_pickle(folder / f"{column}.pkl")
+
+    # The metadata is written last, so that an interrupted conversion is redone
+    with open(meta_file, "w", encoding="utf-8") as file:
+        json.dump({"source": source, "columns": list(df.columns)}, file)
+
+    return folder
+
+
+def read_cached(f: Path, columns: list = None) -> pd.DataFrame:
+    """
+    Load the requested columns of a CSV file through the cache.
+    """
+    folder = update_cache(f)
+    with open(folder / "meta.json", encoding="utf-8") as file:
+        available = json.load(file)["columns"]
+
+    columns = available if columns is None else [
+        c for c in available if c in columns]
+    return pd.DataFrame({c: pd.read_pickle(folder / f"{c}.pkl") for c in columns}).reset_index(drop=True)
+
+
+def load_data(subjects: list = None, columns: list = None, folder: Path = EXPERIMENT_FOLDER):
+    """
+    Return the test results and the session logs of the experiment as two DataFrames with a `subject` column.
+    `subjects` and `columns` limit the data that is loaded to the given subjects and columns.
+    """
     test_data = []
     experiment_data = []
-    for f in EXPERIMENT_FOLDER.iterdir():
-        if f.stem.endswith("_test"):
-            df = pd.read_csv(f, header=0, index_col=0)
-            df["subject"] = f.stem.replace("_test", "")
-            test_data.append(df)
-        else:
-            df = pd.read_csv(f, header=0, index_col=0)
-            df["subject"] = f.stem
-            experiment_data.append(df)
+    for subject, files in get_subject_files(folder).items():
+        if subjects is not None and subject not in subjects:
+            continue
+        for kind, data in (("test", test_data), ("experiment", experiment_data)):
+            if kind in files:
+                df = read_cached(files[kind], columns)
+                df["subject"] = subject
+                data.append(df)
 
     test_df = pd.concat(test_data, ignore_index=True)
     experiment_df = pd.concat(experiment_data, ignore_index=True)
 
-    test_df = test_df.astype(
-        {"answer": "string", "question": "string", "subject": "category"})
+    test_df = test_df.astype({"subject": "category"})
     experiment_df = experiment_df.astype(
-        {"answer": "string", "question": "string", "subject": "category"})
+        {"subject": "category", **{c: "category" for c in ["fact_id"] if c in experiment_df}})
 
     return test_df, experiment_df
 
 
-def get_correct_scores(df: pd.DataFrame) -> dict:
+@lru_cache(maxsize=None)
+def get_swahili_words() -> frozenset:
+    """
+    Return the Swahili words of the word list, read once.
+    """
+    with open(DATA_FOLDER / "swahili.csv", encoding="utf-8") as file:
+        return frozenset(row[2] for row in csv.reader(file))
+
+
+def get_aggregates(df: pd.DataFrame, is_test: bool = False) -> pd.DataFrame:
+    """
+    Return the number of trials, correct responses and flipped trials of each subject, computed in one grouped pass.
+    Aggregates of separate parts of the data, e.g. chunks of subjects or newly added files, can be combined with merge_aggregates.
+    """
+    # The tests do not contain the flipping information, so it is inferred from the word list
+    if is_test or "flipped" not in df:
+        flipped = df["question"].isin(get_swahili_words())
+    else:
+        flipped = df["flipped"] == True
+
+    counts = pd.DataFrame({
+        "subject": df["subject"],
+        "trials": 1,
+        "correct": (df["correct"] == True).astype("int64"),
+        "flipped": flipped.astype("int64"),
+    })
+
+    return counts.groupby("subject", observed=False).sum()
+
+
+def merge_aggregates(aggregates: list) -> pd.DataFrame:
+    """
+    Combine the aggregates of separate parts of the data.
+    """
+    return pd.concat(aggregates).groupby(level=0, observed=True, sort=False).sum()
+
+
+def aggregate_subjects(subjects: list = None, is_test: bool = False, workers: int = None) -> pd.DataFrame:
+    """
+    Load and aggregate the data of each subject in a separate process and merge the results.
+    """
+    if subjects is None:
+        subjects = list(get_subject_files())
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return merge_aggregates(list(executor.map(aggregate_subject, subjects, [is_test] * len(subjects))))
+
+
+def aggregate_subject(subject: str, is_test: bool = False) -> pd.DataFrame:
+    columns = ["question", "correct"] if is_test else ["flipped", "correct"]
+    test_df, experiment_df = load_data([subject], columns)
+    return get_aggregates(test_df if is_test else experiment_df, is_test)
+
+
+def get_correct_scores(df: pd.DataFrame = None, aggregates: pd.DataFrame = None) -> dict:
+
+    if aggregates is None:
+        aggregates = get_aggregates(df)
+
+    # Subjects without correct responses are left out
+    correct = aggregates[aggregates["correct"] > 0]
 
     scores = dict()
-    scores["count"] = df.groupby(
-        "subject",  observed=True)["correct"].value_counts().xs(True, level=1)
-    scores["frequency"] = df.groupby("subject",  observed=True)["correct"].value_counts(
-        normalize=True).xs(True, level=1)
-    scores["mean"] = df.groupby("subject",  observed=True)["correct"].value_counts(
-        normalize=True).xs(True, level=1).mean()
-    scores["std"] = df.groupby("subject",  observed=True)["correct"].value_counts(
-        normalize=True).xs(True, level=1).std()
+    scores["count"] = correct["correct"].rename("count")
+    scores["frequency"] = (correct["correct"] /
+                           correct["trials"]).rename("proportion")
+    scores["mean"] = scores["frequency"].mean()
+    scores["std"] = scores["frequency"].std()
 
     return scores
 
 
-def get_trial_stats(df: pd.DataFrame) -> dict:
+def get_trial_stats(df: pd.DataFrame = None, aggregates: pd.DataFrame = None) -> dict:
+
+    if aggregates is None:
+        aggregates = get_aggregates(df)
 
     stats = dict()
 
-    stats["count"] = df["subject"].value_counts(sort=False)
-    stats["mean"] = df["subject"].value_counts(sort=False).mean()
-    stats["std"] = df["subject"].value_counts(sort=False).std()
+    stats["count"] = aggregates["trials"].rename("count")
+    stats["mean"] = stats["count"].mean()
+    stats["std"] = stats["count"].std()
 
     return stats
 
@@ -63,50 +197,32 @@ def get_trial_stats(df: pd.DataFrame) -> dict:
 def get_flipped(df: pd.DataFrame, is_test: bool = False, reverse: bool = False) -> pd.DataFrame:
     if reverse:
         if is_test:
-            swahili = []
-            with open(DATA_FOLDER / "swahili.csv", encoding="utf-8") as file:
-                csvreader = csv.reader(file)
-                for row in csvreader:
-                    swahili.append(row[2])
-
-            return df[~df.isin({"question": swahili}).any(1)]
+            return df[~df["question"].isin(get_swahili_words())]
         else:
-            df[df["flipped"] == False]
+            return df[df["flipped"] == False]
     else:
         # unfortunately we forgot to save the flipping information for the tests s we need to infer from the word list
         if is_test:
-            swahili = []
-            with open(DATA_FOLDER / "swahili.csv", encoding="utf-8") as file:
-                csvreader = csv.reader(file)
-                for row in csvreader:
-                    swahili.append(row[2])
-
-            return df[df.isin({"question": swahili}).any(1)]
+            return df[df["question"].isin(get_swahili_words())]
         else:
             return df[df["flipped"] == True]
 
 
-def get_flipping_stats(df: pd.DataFrame, is_test: bool = False) -> dict:
+def get_flipping_stats(df: pd.DataFrame = None, is_test: bool = False, aggregates: pd.DataFrame = None) -> dict:
 
-    stats = dict()
-
-    flipped_df = get_flipped(df, is_test)
-
-    df_grouped = df.groupby("subject", observed=True)
+    if aggregates is None:
+        aggregates = get_aggregates(df, is_test)
 
-    flipped_grouped = flipped_df.groupby("subject", observed=True)
-
-    stats["count"] = flipped_df["subject"].value_counts(sort=False)
-
-    frequency = []
-    freq_keys = []
+    stats = dict()
 
-    for key, group in flipped_grouped.groups.items():
-        frequency.append(len(group)/len(df_grouped.get_group(key)))
-        freq_keys.append(key)
+    stats["count"] = aggregates["flipped"].rename("count")
 
+    # The frequency is only reported for the subjects with flipped trials
+    flipped = aggregates[aggregates["flipped"] > 0]
+    frequency = list(flipped["flipped"] / flipped["trials"])
 
-    stats["frequency"] = pd.DataFrame({"subject": frequency, "frequency": freq_keys})
+    stats["frequency"] = pd.DataFrame(
+        {"subject": list(flipped.index), "frequency": frequency})
 
     stats["mean"] = mean(frequency)
     stats["std"] = stdev(frequency)
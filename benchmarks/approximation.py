@@ -0,0 +1,128 @@
+"""approximation"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+import numpy as np
+
+ROOT = Path(__file__).parent.parent.resolve()
+sys.path.insert(0, str(ROOT))
+
+import slimstampen.flippingmodel as fm  # noqa: E402
+from slimstampen.fitting import load_responses  # noqa: E402
+from slimstampen.rescore import find_session_logs  # noqa: E402
+from slimstampen.simulator import SyntheticLearners  # noqa: E402
+
+SESSION_FOLDERS = ["data/experiment", "subjectData",
+                   "subjectData-Ludwig", "subjectdata-eden"]
+
+
+def compare(exact: fm.FlippingModel, bounded: fm.FlippingModel, response: fm.Response, errors: dict) -> None:
+    """
+    Register a response with both models and record the differences in activation and rate of forgetting of the fact.
+    """
+    exact.register_response(response)
+    bounded.register_response(response)
+
+    for name in ("engine", "flip_engine"):
+        key = getattr(exact, name).key(response)
+        e = getattr(exact, name).states[key]
+        b = getattr(bounded, name).states[key]
+        if np.isfinite(e.activations[-1]):
+            errors["activation"] = max(
+                errors["activation"], abs(e.activations[-1] - b.activations[-1]))
+        errors["alpha"] = max(errors["alpha"], abs(e.alpha - b.alpha))
+        errors["encounters"] = max(errors["encounters"], len(b.times))
+        errors["exact_encounters"] = max(
+            errors["exact_encounters"], len(e.times))
+
+
+def new_errors() -> dict:
+    return {"activation": 0.0, "alpha": 0.0, "encounters": 0, "exact_encounters": 0}
+
+
+def measure_recorded(epsilon: float) -> dict:
+    """
+    Replay the recorded sessions with an exact and a bounded model.
+    """
+    errors = new_errors()
+    for log in find_session_logs([str(ROOT / folder) for folder in SESSION_FOLDERS]):
+        exact = fm.FlippingModel()
+        bounded = fm.FlippingModel(activation_epsilon=epsilon)
+        for response in load_responses(str(log)):
+            compare(exact, bounded, response, errors)
+        errors["bound"] = max(errors.get("bound", 0.0),
+                              bounded.get_activation_error_bound())
+    return errors
+
+
+def measure_simulated(epsilon: float, facts: int, trials: int, seed: int) -> dict:
+    """
+    Let a simulated learner study a small deck for a long session with the exact model, and compare the bounded model on the same responses, including the fact it would have chosen.
+    """
+    rng = np.random.default_rng(seed)
+    learner = SyntheticLearners(1, facts, rng)
+    deck = [fm.Fact(str(i), f"word {i}", f"neno {i}") for i in range(facts)]
+    exact = fm.FlippingModel()
+    bounded = fm.FlippingModel(activation_epsilon=epsilon)
+    exact.load_facts(deck)
+    bounded.load_facts(deck)
+
+    errors = new_errors()
+    errors["same_choice"] = 0
+    now = 0.0
+    for _ in range(trials):
+        fact, new = exact.get_next_fact(now, use_flipping=False)
+        other, _ = bounded.get_next_fact(now, use_flipping=False)
+        errors["same_choice"] += fact.fact_id == other.fact_id
+
+        position = np.array([exact.fact_index[fact.fact_id]])
+        activation = learner.calculate_activations(
+            np.array([0]), position, np.array([now]))
+        rt, correct = learner.respond(activation, np.array(
+            [300.0]), np.array([new]), np.array([False]))
+        learner.add_encounters(np.array([0]), position,
+                               np.array([now]), activation)
+
+        compare(exact, bounded, fm.Response(
+            fact, now, float(rt[0]), bool(correct[0])), errors)
+        now += rt[0] + rng.uniform(300, 1000) + (0 if correct[0] else 2000)
+
+    errors["same_choice"] /= trials
+    errors["bound"] = bounded.get_activation_error_bound()
+    return errors
+
+
+parser = argparse.ArgumentParser(prog="Bounded activation error",
+                                 description="measures the approximation error of the bounded activation mode on the recorded sessions and on long simulated sessions")
+parser.add_argument("--epsilons", type=float, nargs="+", default=[1e-4, 1e-3, 1e-2],
+                    help="The values of activation_epsilon to measure (default: 1e-4 1e-3 1e-2)")
+parser.add_argument("--facts", type=int, default=20,
+                    help="The deck size of the simulated sessions (default: 20)")
+parser.add_argument("--trials", "-R", type=int, default=3000,
+                    help="The number of trials of the simulated sessions (default: 3000)")
+parser.add_argument("--seed", type=int, default=0,
+                    help="Seed for the simulated learner (default: 0)")
+parser.add_argument("--output", "-O", type=str,
+                    help="A JSON file the results are written to")
+
+if __name__ == "__main__":
+
+    options = parser.parse_args()
+
+    results = []
+    for epsilon in options.epsilons:
+        for source, measure in (("recorded", lambda: measure_recorded(epsilon)),
+                                ("simulated", lambda: measure_simulated(epsilon, options.facts, options.trials, options.seed))):
+            start = time.perf_counter()
+            errors = measure()
+            errors.update(epsilon=epsilon, source=source,
+                          seconds=time.perf_counter() - start)
+            results.append(errors)
+            print(f"epsilon {epsilon:g} {source:>9}: max activation error {errors['activation']:.2e} (bound {errors['bound']:.2e}), max alpha error {errors['alpha']:.2e}, "
+                  f"at most {errors['encounters']} instead of {errors['exact_encounters']} encounters per fact" + (f", same choice in {errors['same_choice']:.1%} of trials" if "same_choice" in errors else ""))
+
+    if options.output:
+        with open(options.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
@@ -0,0 +1,330 @@
+"""benchmark"""
+import argparse
+import csv
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from statistics import mean, median
+
+ROOT = Path(__file__).parent.parent.resolve()
+sys.path.insert(0, str(ROOT))
+
+import slimstampen.alphaestimator as ae  # noqa: E402
+import slimstampen.flippingmodel as fm  # noqa: E402
+import slimstampen.spacingmodel as sp  # noqa: E402
+from slimstampen.cohort import Cohort  # noqa: E402
+
+BENCHMARKS = []
+
+# Smallest number of timed calls of the slower benchmarks, so that their statistics are not based on a single call
+MIN_SAMPLES = 3
+
+# Number of estimate_alpha calls per sample, since a single call takes only a few microseconds
+ALPHA_CALLS = 100
+
+
+def benchmark(function):
+    """
+    Register a benchmark. It is called with the command line options and returns a list of result records.
+    """
+    BENCHMARKS.append(function)
+    return function
+
+
+def summarise(name: str, params: dict, durations: list) -> dict:
+    """
+    Return the statistics of a list of durations in seconds as a result record, in milliseconds.
+    """
+    durations = sorted(durations)
+    return {
+        "benchmark": name,
+        "params": params,
+        "n": len(durations),
+        "mean_ms": mean(durations) * 1000,
+        "median_ms": median(durations) * 1000,
+        "p95_ms": durations[min(len(durations) - 1, int(len(durations) * 0.95))] * 1000,
+        "min_ms": durations[0] * 1000,
+    }
+
+
+def make_facts(deck_size: int) -> list:
+    """
+    Return the facts of data/swahili.csv, extended with synthetic facts up to the requested deck size.
+    """
+    facts = []
+    with open(ROOT / "data" / "swahili.csv", encoding="utf-8") as file:
+        for row in csv.reader(file):
+            if len(facts) == deck_size:
+                break
+            facts.append(fm.Fact(*row))
+
+    while len(facts) < deck_size:
+        i = len(facts)
+        facts.append(fm.Fact(f"synthetic-{i}", f"word {i}", f"neno {i}"))
+    return facts
+
+
+def make_model(deck_size: int, history: int, seed: int, use_forgetting_queue: bool = False):
+    """
+    Return a FlippingModel with a seeded synthetic history of the requested length, and the time after the last response.
+    """
+    rng = random.Random(seed)
+    model = fm.FlippingModel(use_forgetting_queue)
+    model.load_facts(make_facts(deck_size))
+
+    current_time = 0.0
+    for _ in range(history):
+        fact, _ = model.get_next_fact(current_time)
+        rt = rng.lognormvariate(7.5, 0.5)
+        model.register_response(fm.Response(
+            fact, current_time, rt, rng.random() < 0.8))
+        current_time += rt + rng.uniform(300, 3000)
+
+    return model, current_time
+
+
+def time_calls(function, repeat: int, calls: int = 1, reset=None) -> list:
+    """
+    Return the duration of `repeat` samples in seconds. Each sample times `calls` calls and reports the mean duration per call.
+    `reset` is called after each sample, outside of the timed region.
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(calls):
+            function()
+        durations.append((time.perf_counter() - start) / calls)
+        if reset is not None:
+            reset()
+    return durations
+
+
+@benchmark
+def bench_get_next_fact(options):
+    results = []
+    for deck_size in options.deck_sizes:
+        for history in options.histories:
+            for use_forgetting_queue in (False, True):
+                model, current_time = make_model(
+                    deck_size, history, options.seed, use_forgetting_queue)
+                # A flipped fact is stored in the fact list, so that list is restored after each call
+                facts = list(model.facts)
+
+                def reset():
+                    model.facts[:] = facts
+
+                for use_flipping in (False, True):
+                    durations = time_calls(lambda: model.get_next_fact(
+                        current_time, use_flipping=use_flipping), options.repeat, reset=reset)
+                    results.append(summarise("get_next_fact", {"deck_size": deck_size, "history": history,
+                                                               "use_flipping": use_flipping, "use_forgetting_queue": use_forgetting_queue}, durations))
+    return results
+
+
+@benchmark
+def bench_estimate_alpha(options):
+    results = []
+    model = fm.FlippingModel()
+    for encounters in (3, 10, 30, 100):
+        rng = random.Random(options.seed)
+        times = []
+        current_time = 0.0
+        for _ in range(encounters):
+            times.append(current_time)
+            current_time += rng.uniform(2000, 60000)
+        decays = [rng.uniform(0.25, 0.6) for _ in times]
+        reaction_times = [rng.uniform(800, 4000) for _ in times]
+        activation = ae.calculate_activation(times[:-1], decays[:-1], times[-1])
+
+        durations = time_calls(lambda: ae.estimate_alpha(times, decays, reaction_times, activation, reaction_times[-1], 300,
+                                                         model.DEFAULT_ALPHA, model.DEFAULT_ALPHA, model.estimate_reaction_time_from_activation), options.repeat, ALPHA_CALLS)
+        result = summarise("estimate_alpha", {
+                           "encounters": encounters}, durations)
+        result["calls_per_second"] = 1000 / result["mean_ms"]
+        results.append(result)
+    return results
+
+
+@benchmark
+def bench_add_fact(options):
+    results = []
+    for deck_size in options.deck_sizes:
+        facts = make_facts(deck_size)
+
+        def load():
+            model = fm.FlippingModel()
+            for fact in facts:
+                model.add_fact(fact)
+
+        results.append(summarise("add_fact", {"deck_size": deck_size}, time_calls(
+            load, max(MIN_SAMPLES, options.repeat // 10))))
+        results.append(summarise("load_facts", {"deck_size": deck_size}, time_calls(
+            lambda: fm.FlippingModel().load_facts(facts), max(MIN_SAMPLES, options.repeat // 10))))
+    return results
+
+
+@benchmark
+def bench_export_data(options):
+    results = []
+    for history in options.histories:
+        model, _ = make_model(max(options.deck_sizes), history, options.seed)
+        for backend in ("pandas", "csv"):
+            # Untimed call first, so that importing the backend is not measured
+            model.export_data(backend=backend)
+            results.append(summarise("export_data", {"history": history, "backend": backend}, time_calls(
+                lambda: model.export_data(backend=backend), max(MIN_SAMPLES, options.repeat // 20))))
+    return results
+
+
+@benchmark
+def bench_historical_queries(options):
+    results = []
+    for history in options.histories:
+        model, end_time = make_model(max(options.deck_sizes), history, options.seed)
+        rng = random.Random(options.seed)
+        studied = [fact for fact in model.facts if fact.fact_id in model.response_rows]
+        queries = [(rng.uniform(0, end_time), rng.choice(studied)) for _ in range(options.repeat)]
+        queries = iter(queries)
+
+        def query():
+            time, fact = next(queries)
+            model.calculate_activation(time, fact)
+            model.get_rate_of_forgetting(time, fact)
+            model.calculate_flip_activation(time, fact)
+
+        results.append(summarise("historical_query", {"history": history}, time_calls(
+            query, options.repeat)))
+    return results
+
+
+@benchmark
+def bench_plan_next(options):
+    results = []
+    for history in options.histories:
+        model, current_time = make_model(max(options.deck_sizes), history, options.seed)
+        for k in (1, 10):
+            results.append(summarise("plan_next", {"history": history, "k": k}, time_calls(
+                lambda: model.plan_next(current_time, k, 2000, True), max(MIN_SAMPLES, options.repeat // 10))))
+    return results
+
+
+@benchmark
+def bench_cohort(options):
+    results = []
+    facts = make_facts(min(options.deck_sizes))
+    for learners in (100, 1000):
+        rng = random.Random(options.seed)
+        cohort = Cohort(learners, facts)
+        models = [sp.SpacingModel() for _ in range(learners)]
+        for model in models:
+            model.load_facts(cohort.model.facts)
+        everyone = list(range(learners))
+        current_times = [0.0] * learners
+        for _ in range(30):
+            for learner, (fact, _) in enumerate(cohort.get_next_facts(everyone, current_times)):
+                rt = rng.lognormvariate(7.5, 0.5)
+                response = fm.Response(fact, current_times[learner], rt, rng.random() < 0.8)
+                cohort.register_response(learner, response)
+                models[learner].register_response(response)
+                current_times[learner] += rt + rng.uniform(300, 3000)
+
+        repeat = max(MIN_SAMPLES, options.repeat // 20)
+        results.append(summarise("cohort_batch", {"learners": learners}, time_calls(
+            lambda: cohort.get_next_facts(everyone, current_times), repeat)))
+        results.append(summarise("cohort_per_learner", {"learners": learners}, time_calls(
+            lambda: [cohort.get_next_fact(learner, current_times[learner]) for learner in everyone], repeat)))
+        results.append(summarise("cohort_separate_models", {"learners": learners}, time_calls(
+            lambda: [model.get_next_fact(current_time) for (model, current_time) in zip(models, current_times)], repeat)))
+    return results
+
+
+@benchmark
+def bench_startup(options):
+    results = []
+    for module in ("slimstampen.spacingmodel", "slimstampen.flippingmodel"):
+        command = [sys.executable, "-c",
+                   f"import sys, {module}; print(','.join(m for m in ('numpy', 'pandas') if m in sys.modules))"]
+        durations = []
+        for _ in range(max(MIN_SAMPLES, options.repeat // 20)):
+            start = time.perf_counter()
+            loaded = subprocess.run(command, cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+            durations.append(time.perf_counter() - start)
+
+        result = summarise("startup", {"module": module}, durations)
+        result["loaded"] = loaded.split(",") if loaded else []
+        results.append(result)
+    return results
+
+
+def get_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: list, path: str) -> None:
+    """
+    Print the change in mean time of each measurement relative to an earlier report.
+    """
+    with open(path, encoding="utf-8") as file:
+        baseline = {(r["benchmark"], json.dumps(r["params"], sort_keys=True)): r for r in json.load(file)["results"]}
+
+    for result in results:
+        previous = baseline.get(
+            (result["benchmark"], json.dumps(result["params"], sort_keys=True)))
+        if previous is not None:
+            print(f"{result['benchmark']:>14} {json.dumps(result['params'])}: {previous['mean_ms']:.3f} -> {result['mean_ms']:.3f} ms ({result['mean_ms'] / previous['mean_ms']:.2f}x)")
+
+
+parser = argparse.ArgumentParser(prog="Slimstampen benchmarks",
+                                 description="measures scheduling, alpha estimation, fact loading, export, historical query, planning and cohort scheduling times over deck and history sizes, and the import time of the core")
+parser.add_argument("--output", "-O", type=str, default="benchmark.json",
+                    help="The JSON file the results are written to (default: benchmark.json)")
+parser.add_argument("--deck-sizes", type=int, nargs="+", default=[100, 900, 5000],
+                    help="The deck sizes to measure (default: 100 900 5000)")
+parser.add_argument("--histories", type=int, nargs="+", default=[100, 1000, 3000],
+                    help="The numbers of registered responses to measure (default: 100 1000 3000)")
+parser.add_argument("--repeat", "-R", type=int, default=200,
+                    help="The number of timed samples per measurement (default: 200)")
+parser.add_argument("--only", type=str, nargs="+",
+                    help="Only run the benchmarks with these names, e.g. get_next_fact")
+parser.add_argument("--seed", type=int, default=0,
+                    help="Seed for the synthetic histories (default: 0)")
+parser.add_argument("--compare", "-C", type=str,
+                    help="An earlier JSON report to compare the results with")
+
+if __name__ == "__main__":
+
+    options = parser.parse_args()
+
+    results = []
+    for function in BENCHMARKS:
+        name = function.__name__.replace("bench_", "")
+        if options.only and name not in options.only:
+            continue
+        start = time.perf_counter()
+        results.extend(function(options))
+        print(f"{name}: {time.perf_counter() - start:.1f} s")
+
+    report = {
+        "commit": get_commit(),
+        "date": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "options": vars(options),
+        "results": results,
+    }
+    with open(options.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+
+    if options.compare:
+        compare(results, options.compare)
+    else:
+        for result in results:
+            print(f"{result['benchmark']:>14} {json.dumps(result['params'])}: mean {result['mean_ms']:.3f} ms, p95 {result['p95_ms']:.3f} ms")
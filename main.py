@@ -1,6 +1,9 @@
 import csv
+from itertools import islice
 from time import time
 import slimstampen.flippingmodel as slim
+from slimstampen.instrumentation import Instrumentation
+from slimstampen.prefetch import Prefetcher
 import argparse
 
 parser = argparse.ArgumentParser(prog="Slimstampen Flipping model",
@@ -13,6 +16,14 @@ parser.add_argument("--limit", "-L", type=int,
                     help="Limits the maximal number of words used in the training session (default: no limit)")
 parser.add_argument("--trials", "-R", type=int,
                     help="Specifies the maximal number of trials for the run (default: no limit)\nWhen this option is specified together with a time limit, the session will end with the first parameter to be reach the limit.")
+parser.add_argument("--latency", action="store_true",
+                    help="Print a latency summary of the model at the end of the session")
+parser.add_argument("--trace", type=str,
+                    help="Write a Chrome trace of the model calls to the given file")
+parser.add_argument("--prefetch", action="store_true",
+                    help="Compute the next fact in the background while the answer is typed")
+parser.add_argument("--stream", choices=["csv", "columnar"],
+                    help="Write each response to data.csv (csv) or data.slimcols (columnar) as soon as it is registered, so that a crash does not lose the session")
 
 if __name__ == "__main__":
 
@@ -20,28 +31,41 @@ if __name__ == "__main__":
 
     m = slim.FlippingModel()
 
-    with open(options.file, encoding="utf-8") as file:
-        csvreader = csv.reader(file)
-        count = 0
-        for row in csvreader:
-            if options.limit and count > options.limit:
-                break
-            fact = slim.Fact(*row)
-            m.add_fact(fact)
-            count+=1
+    instrumentation = None
+    if options.latency or options.trace:
+        instrumentation = Instrumentation(
+            trace=options.trace is not None).attach(m)
+
+    if options.limit:
+        with open(options.file, encoding="utf-8") as file:
+            m.load_facts(islice((row for row in csv.reader(file) if row), options.limit))
+    else:
+        m.load_facts(options.file)
+
+    if options.stream:
+        m.start_export("data.csv" if options.stream == "csv" else "data.slimcols",
+                       options.stream, buffer_size=1)
 
     start = time()
     end = start + (options.time*60)
     startMs = start*1000
 
+    prefetcher = None
+    if options.prefetch:
+        prefetcher = Prefetcher(m, lambda: time()*1000 - startMs, use_flipping=False)
+
     count = 0
     while start < end:
 
-        if options.trials and count > options.trials:
+        if options.trials and count >= options.trials:
             break
 
         presTime = int(time()*1000 - startMs)
-        fact, new = m.get_next_fact(presTime, use_flipping=False)
+        if prefetcher:
+            fact, new = prefetcher.get_next_fact(presTime)
+            prefetcher.start(fact, presTime)
+        else:
+            fact, new = m.get_next_fact(presTime, use_flipping=False)
 
         if new:
             answer = input(
@@ -61,14 +85,26 @@ if __name__ == "__main__":
             print(f"That was not correct! {fact.question} means {fact.answer}")
 
         resp = slim.Response(fact, presTime, rt, correct)
-        m.register_response(resp)
+        if prefetcher:
+            prefetcher.register_response(resp)
+        else:
+            m.register_response(resp)
 
         start = time()
         count+=1
 
+    if prefetcher:
+        prefetcher.stop()
+
     questions = m.get_test_questions()
 
     for question in questions:
         print(question)
 
-    m.export_data("data.csv")
+    m.export_data("data.csv", backend="csv")
+    m.stop_export()
+
+    if options.latency:
+        print(instrumentation.summary())
+    if options.trace:
+        instrumentation.dump_chrome_trace(options.trace)
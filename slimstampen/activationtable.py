@@ -0,0 +1,82 @@
+"""activationtable"""
+import numpy as np
+
+
+class ActivationTable(object):
+    """
+    Array-backed store of the encounter times and decays of all studied facts, used to calculate the activation of every fact in one vectorised pass.
+    Each row holds the encounters of one fact, padded to the width of the row with the most encounters.
+    """
+
+    def __init__(self, rows: int = 64, width: int = 8):
+        self.times = np.zeros((rows, width))
+        self.decays = np.zeros((rows, width))
+        self.counts = np.zeros(rows, dtype=np.int64)
+        self.positions = np.zeros(rows, dtype=np.int64)
+        self.size = 0
+
+        # Number of encounters each entry stands for, only allocated once a row has merged encounters
+        self.weights = None
+
+    def add_row(self, position: int) -> int:
+        """
+        Add an empty row for the fact at the given position in the fact list and return its index.
+        """
+        if self.size == len(self.counts):
+            self._resize(2 * self.size, self.times.shape[1])
+
+        row = self.size
+        self.positions[row] = position
+        self.counts[row] = 0
+        self.size += 1
+        return row
+
+    def set_row(self, row: int, times: list, decays: list, weights: list = None) -> None:
+        """
+        Replace the encounters stored in a row, optionally with the number of encounters each of them stands for.
+        """
+        count = len(times)
+        if count > self.times.shape[1]:
+            self._resize(len(self.counts), max(count, 2 * self.times.shape[1]))
+
+        self.times[row, :count] = times
+        self.decays[row, :count] = decays
+        self.counts[row] = count
+
+        if weights is not None and self.weights is None:
+            self.weights = np.ones(self.times.shape)
+        if self.weights is not None:
+            self.weights[row, :count] = 1.0 if weights is None else weights
+
+    def calculate_activations(self, time: float) -> np.ndarray:
+        """
+        Calculate the activation of every row at the given time.
+        Rows without encounters before that time have an activation of -inf.
+        """
+        times = self.times[:self.size]
+        decays = self.decays[:self.size]
+        width = times.shape[1]
+
+        included = (np.arange(width) < self.counts[:self.size, None]) & (times < time)
+        elapsed = np.where(included, (time - times) / 1000, 1.0)
+        contributions = np.where(included, np.power(elapsed, -decays), 0.0)
+        if self.weights is not None:
+            contributions *= self.weights[:self.size]
+
+        with np.errstate(divide="ignore"):
+            return np.log(contributions.sum(axis=1))
+
+    def _resize(self, rows: int, width: int) -> None:
+        for name in ("times", "decays", "weights"):
+            old = getattr(self, name)
+            if old is None:
+                continue
+            new = np.ones((rows, width)) if name == "weights" else np.zeros((rows, width))
+            new[:old.shape[0], :old.shape[1]] = old
+            setattr(self, name, new)
+
+        for name in ("counts", "positions"):
+            old = getattr(self, name)
+            new = np.zeros(rows, dtype=np.int64)
+            new[:len(old)] = old
+            setattr(self, name, new)
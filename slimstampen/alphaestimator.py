@@ -0,0 +1,97 @@
+"""alphaestimator"""
+import math
+from typing import Callable, List
+
+
+def calculate_activation(times: List[float], decays: List[float], current_time: float, weights: List[float] = None) -> float:
+    """
+    Calculate the activation at the given time from the times and decays of the encounters of a fact.
+    `weights` optionally gives the number of encounters each entry stands for, see slimstampen.encountersummary.
+    """
+    if weights is None:
+        contributions = [math.pow((current_time - t) / 1000, -d)
+                         for (t, d) in zip(times, decays) if t < current_time]
+    else:
+        contributions = [w * math.pow((current_time - t) / 1000, -d)
+                         for (t, d, w) in zip(times, decays, weights) if t < current_time]
+
+    if len(contributions) == 0:
+        return -float("inf")
+
+    return math.log(sum(contributions))
+
+
+def estimate_alpha(times: List[float], decays: List[float], reaction_times: List[float], activation: float, observed_rt: float, reading_time: float, previous_alpha: float, default_alpha: float, estimate_reaction_time: Callable[[float, float], float], weights: List[float] = None, calculate_error: Callable = None) -> float:
+    """
+    Estimate the rate of forgetting parameter (alpha) for an item from the times, decays and normalised reaction times of its encounters.
+    The last encounter is the one that was just added, with its activation and observed reaction time given separately.
+    `weights` optionally gives the number of encounters each entry stands for.
+    `calculate_error` evaluates the reaction time error of an alpha adjustment, calculate_predicted_reaction_time_error by default.
+    """
+    if len(times) < 3:
+        return default_alpha
+
+    a_fit = previous_alpha
+    estimated_rt = estimate_reaction_time(activation, reading_time)
+    est_diff = estimated_rt - observed_rt
+
+    if est_diff < 0:
+        # Estimated RT was too short (estimated activation too high), so actual decay was larger
+        a0 = a_fit
+        a1 = a_fit + 0.05
+
+    else:
+        # Estimated RT was too long (estimated activation too low), so actual decay was smaller
+        a0 = a_fit - 0.05
+        a1 = a_fit
+
+    if calculate_error is None:
+        calculate_error = calculate_predicted_reaction_time_error
+
+    # The elapsed times between each of the last encounters and the encounters before it do not depend on alpha
+    window = []
+    for w in range(max(1, len(times) - 5), len(times)):
+        test_time = times[w] - 100
+        included = [j for j in range(len(times)) if times[j] < test_time]
+        elapsed = [(test_time - times[j]) / 1000 for j in included]
+        window.append((reaction_times[w], included, elapsed))
+
+    # Binary search between previous fit and proposed alpha
+    for _ in range(6):
+        a0_diff = a0 - a_fit
+        a1_diff = a1 - a_fit
+
+        # Calculate the reaction times from activation for both decay adjustments and compare against observed RTs
+        total_a0_error = calculate_error(
+            window, decays, a0_diff, reading_time, estimate_reaction_time, weights)
+        total_a1_error = calculate_error(
+            window, decays, a1_diff, reading_time, estimate_reaction_time, weights)
+
+        # Adjust the search area based on the lowest total error
+        ac = (a0 + a1) / 2
+        if total_a0_error < total_a1_error:
+            a1 = ac
+        else:
+            a0 = ac
+
+    # The new alpha estimate is the average value in the remaining bracket
+    return (a0 + a1) / 2
+
+
+def calculate_predicted_reaction_time_error(window: List[tuple], decays: List[float], adjustment: float, reading_time: float, estimate_reaction_time: Callable[[float, float], float], weights: List[float] = None) -> float:
+    """
+    Return the total difference between the observed reaction times of the window of estimate_alpha and the reaction times predicted with decays adjusted by `adjustment`.
+    Each entry of the window holds the observed reaction time of an encounter, the encounters before it and the elapsed times since those encounters in seconds.
+    """
+    total_error = 0.0
+    for (rt, included, elapsed) in window:
+        if len(included) == 0:
+            activation = -float("inf")
+        elif weights is None:
+            activation = math.log(sum([math.pow(e, -(decays[j] + adjustment))
+                                       for (j, e) in zip(included, elapsed)]))
+        else:
+            activation = math.log(sum([weights[j] * math.pow(e, -(decays[j] + adjustment))
+                                       for (j, e) in zip(included, elapsed)]))
+        total_error += abs(rt - estimate_reaction_time(activation, reading_time))
+    return total_error
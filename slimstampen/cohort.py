@@ -0,0 +1,199 @@
+"""cohort"""
+from typing import Iterable, List, Tuple, Union
+import numpy as np
+import slimstampen.alphaestimator as ae
+import slimstampen.spacingmodel as sp
+from slimstampen.responselog import ResponseLog
+
+
+class Cohort(object):
+    """
+    A group of learners studying the same deck, scheduled together.
+    The facts, their reading times and the model constants are shared through a single SpacingModel; each learner has their own replay engine and response log for the alpha estimates.
+    The encounter times and decays are kept in shared arrays of learners x slots x encounters, where the slots of a learner are the facts they have studied, in the order in which they were first presented.
+    The next fact of many learners is selected in one vectorised pass that only covers the studied facts.
+    Responses have to be registered in chronological order per learner.
+    Models in the bounded activation mode are not supported, since the encounters of a cohort are not weighted.
+    """
+
+    def __init__(self, learners: int, facts: Union[str, Iterable] = None, model: sp.SpacingModel = None):
+        """
+        `facts` is loaded into `model`, or into a new SpacingModel if no model is given. The deck cannot be changed afterwards.
+        """
+        self.model = model if model is not None else sp.SpacingModel()
+        if facts is not None:
+            self.model.load_facts(facts)
+
+        model = self.model
+        if model.activation_epsilon is not None:
+            raise RuntimeError(
+                "Error while creating cohort: Models in the bounded activation mode are not supported, since the encounters of a cohort are not weighted")
+        self.engines = [sp.ReplayEngine(model, model.DEFAULT_ALPHA, model.engine.key, ResponseLog())
+                        for _ in range(learners)]
+        self.latest_start_times = np.full(learners, -float("inf"))
+        self.last_positions = np.full(learners, -1, dtype=np.int64)
+
+        # Slot of each fact per learner (-1 if not studied), the fact in each slot, and the first fact in the fact list each learner has not studied
+        self.slots = np.full((learners, len(model.facts)), -1, dtype=np.int64)
+        self.slot_positions = np.zeros((learners, 4), dtype=np.int64)
+        self.slot_counts = np.zeros(learners, dtype=np.int64)
+        self.first_unseen = np.zeros(learners, dtype=np.int64)
+
+        # Encounters per learner and slot, padded to a common width; the capacity of both axes doubles when it runs out
+        self.times = np.zeros((learners, 4, 4))
+        self.decays = np.zeros((learners, 4, 4))
+        self.counts = np.zeros((learners, 4), dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.engines)
+
+    def reserve(self, slots: int, width: int) -> None:
+        """
+        Make room for at least `slots` slots per learner and `width` encounters per slot.
+        """
+        capacity = self.times.shape[1:]
+        if slots <= capacity[0] and width <= capacity[1]:
+            return
+
+        if slots > capacity[0]:
+            slots = max(slots, min(2 * capacity[0], len(self.model.facts)))
+        if width > capacity[1]:
+            width = max(width, 2 * capacity[1])
+        shape = (len(self), max(slots, capacity[0]), max(width, capacity[1]))
+        for name in ("times", "decays"):
+            grown = np.zeros(shape)
+            grown[:, :capacity[0], :capacity[1]] = getattr(self, name)
+            setattr(self, name, grown)
+        for name in ("counts", "slot_positions"):
+            grown = np.zeros(shape[:2], dtype=np.int64)
+            grown[:, :capacity[0]] = getattr(self, name)
+            setattr(self, name, grown)
+
+    def register_response(self, learner: int, response: sp.Response) -> None:
+        """
+        Register the response of a learner.
+        """
+        model = self.model
+        position = model.fact_index.get(response.fact.fact_id)
+        if position is None:
+            raise RuntimeError(
+                f"Error while registering response: There is no fact with ID: {response.fact.fact_id} in the deck of the cohort")
+        if response.start_time <= self.latest_start_times[learner]:
+            raise RuntimeError(
+                f"Error while registering response: The responses of learner {learner} have to be registered in chronological order, but {response.start_time} is not after {self.latest_start_times[learner]}")
+
+        engine = self.engines[learner]
+        state = engine.register_response(
+            response, engine.responses.append(response))
+        self.latest_start_times[learner] = response.start_time
+        self.last_positions[learner] = position
+
+        # Give a newly studied fact the next slot of the learner
+        slot = self.slots[learner, position]
+        count = len(state.times)
+        if slot < 0:
+            slot = self.slot_counts[learner]
+            self.reserve(slot + 1, count)
+            self.slots[learner, position] = slot
+            self.slot_positions[learner, slot] = position
+            self.slot_counts[learner] += 1
+            while self.first_unseen[learner] < len(model.facts) and self.slots[learner, self.first_unseen[learner]] >= 0:
+                self.first_unseen[learner] += 1
+        else:
+            self.reserve(slot + 1, count)
+
+        # Copy the encounters of the fact into the shared arrays
+        self.times[learner, slot, :count] = state.times
+        self.decays[learner, slot, :count] = state.decays
+        self.counts[learner, slot] = count
+
+    def register_responses(self, learners: Iterable[int], responses: Iterable[sp.Response]) -> None:
+        for learner, response in zip(learners, responses):
+            self.register_response(learner, response)
+
+    def calculate_slot_activations(self, learners: np.ndarray, times: np.ndarray) -> np.ndarray:
+        """
+        Calculate the activation of the studied facts of a batch of learners, each at their own time.
+        Returns an array of learners x slots, with -inf for empty slots and for facts without encounters before that time.
+        """
+        learners = np.asarray(learners, dtype=np.int64)
+        slots = max(int(self.slot_counts[learners].max(initial=0)), 1)
+        counts = self.counts[learners, :slots]
+        width = max(int(counts.max(initial=0)), 1)
+        encounter_times = self.times[learners, :slots, :width]
+        decays = self.decays[learners, :slots, :width]
+        times = np.asarray(times, dtype=float)[:, None, None]
+
+        included = (np.arange(width) < counts[:, :, None]) & (encounter_times < times)
+        elapsed = np.where(included, (times - encounter_times) / 1000, 1.0)
+        contributions = np.where(included, np.power(elapsed, -decays), 0.0)
+
+        with np.errstate(divide="ignore"):
+            return np.log(contributions.sum(axis=2))
+
+    def calculate_activations(self, learners: np.ndarray, times: np.ndarray) -> np.ndarray:
+        """
+        Calculate the activation of every fact for a batch of learners, each at their own time.
+        Returns an array of learners x facts, with -inf for facts without encounters before that time.
+        """
+        learners = np.asarray(learners, dtype=np.int64)
+        slot_activations = self.calculate_slot_activations(learners, times)
+        rows, slots = np.nonzero(
+            np.arange(slot_activations.shape[1]) < self.slot_counts[learners, None])
+
+        activations = np.full((len(learners), len(self.model.facts)), -np.inf)
+        activations[rows, self.slot_positions[learners[rows], slots]] = slot_activations[rows, slots]
+        return activations
+
+    def get_next_positions(self, learners: np.ndarray, current_times: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return the position in the fact list of the next fact of each learner in a batch, and whether that fact is new.
+        The choice is the one of SpacingModel.get_next_fact: the weakest studied fact if one is below the forgetting threshold or there are no new facts left, and the first new fact otherwise.
+        The fact of a learner's last response is not repeated right away once more than two facts have been studied.
+        """
+        model = self.model
+        learners = np.asarray(learners, dtype=np.int64)
+        times = np.asarray(current_times, dtype=float) + model.LOOKAHEAD_TIME
+        slot_activations = self.calculate_slot_activations(learners, times)
+        positions = self.slot_positions[learners, :slot_activations.shape[1]]
+        first_new = self.first_unseen[learners]
+
+        # For a learner with responses after the lookahead time, the activations follow from the states before that time, and studied facts without encounters before it count as new, as in SpacingModel.get_next_fact_per_fact
+        for i in np.flatnonzero(self.latest_start_times[learners] >= times):
+            engine = self.engines[learners[i]]
+            for slot in range(self.slot_counts[learners[i]]):
+                state = engine.get_state(times[i], model.facts[positions[i, slot]].fact_id)
+                slot_activations[i, slot] = ae.calculate_activation(state.times, state.decays, times[i])
+            studied = np.zeros(len(model.facts), dtype=bool)
+            studied[positions[i][slot_activations[i] > -np.inf]] = True
+            first_new[i] = np.argmin(studied) if not studied.all() else len(model.facts)
+
+        # Prevent an immediate repetition of the same fact
+        seen = slot_activations > -np.inf
+        candidates = seen.copy()
+        last_positions = self.last_positions[learners]
+        repeating = np.flatnonzero((seen.sum(axis=1) > 2) & (last_positions >= 0))
+        candidates[repeating, self.slots[learners[repeating], last_positions[repeating]]] = False
+
+        # Reinforce the weakest fact with an activation below the threshold, ties are resolved in the order of the fact list
+        candidate_activations = np.where(candidates, slot_activations, np.inf)
+        lowest = candidate_activations.min(axis=1)
+        weakest = np.where(candidate_activations == lowest[:, None], positions, len(model.facts)).min(axis=1)
+        below_threshold = lowest < model.FORGET_THRESHOLD
+
+        # Otherwise present the first new fact
+        new = (first_new < len(model.facts)) & ~below_threshold
+        return np.where(new, first_new, weakest), new
+
+    def get_next_facts(self, learners: np.ndarray, current_times: np.ndarray) -> List[Tuple[sp.Fact, bool]]:
+        """
+        Return the next fact of each learner in a batch, and whether it is new, as get_next_fact does for a single model.
+        """
+        positions, new = self.get_next_positions(learners, current_times)
+        return [(self.model.facts[p], bool(n)) for (p, n) in zip(positions, new)]
+
+    def get_next_fact(self, learner: int, current_time: int) -> Tuple[sp.Fact, bool]:
+        return self.get_next_facts([learner], [current_time])[0]
+
+    def get_rate_of_forgetting(self, learner: int, time: int, fact: sp.Fact) -> float:
+        return self.engines[learner].get_state(time, fact.fact_id).alpha
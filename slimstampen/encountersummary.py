@@ -0,0 +1,206 @@
+"""encountersummary"""
+import math
+from collections import namedtuple
+from typing import List, Tuple
+
+# Width of the activation bands in which encounters are merged. The activation-dependent parts of the decays in a band differ by at most a factor exp(BAND_WIDTH).
+BAND_WIDTH = 0.25
+
+# Encounters are only merged with others that are at most this fraction of their age apart
+SPAN_RATIO = 0.5
+
+# Encounters with a lower activation decay at almost exactly alpha and share a single band
+LOWEST_BAND = -4.0
+
+# Encounters with a higher activation share the highest band, so that the number of bands is bounded
+HIGHEST_BAND = 1.0
+
+# Largest number of merged encounters per band; when a band has more groups, its oldest groups are merged together
+MAX_GROUPS = 8
+
+# Bounds on the summed contribution of the merged encounters of one band at `time`, with the range of their times and of their decays at rate of forgetting `alpha`
+Summary = namedtuple(
+    "Summary", "band, time, low, high, first_time, last_time, min_decay, max_decay, alpha")
+
+
+def get_band(activation: float) -> int:
+    if activation < LOWEST_BAND:
+        return None
+    return int(math.floor(min(activation, HIGHEST_BAND) / BAND_WIDTH))
+
+
+def propagate(summary: Summary, time: float, alpha: float) -> Tuple[float, float]:
+    """
+    Return bounds on the summed contribution of the merged encounters at another time and rate of forgetting.
+    Each contribution ((t - t_j) / 1000) ^ -d_j changes by a factor exp(-d_j * (L_j(t) - L_j(t_s)) - (alpha - alpha_s) * L_j(t)), with L_j(t) = log((t - t_j) / 1000).
+    The factor is bounded using the ranges of the times and decays of the merged encounters.
+    """
+    if time <= summary.last_time:
+        return 0.0, float("inf")
+
+    shift = alpha - summary.alpha
+    elapsed = [math.log((time - t) / 1000)
+               for t in (summary.first_time, summary.last_time)]
+    changes = [math.log((time - t) / (summary.time - t))
+               for t in (summary.first_time, summary.last_time)]
+
+    exponents = [-d * c - shift * e for d in (summary.min_decay, summary.max_decay)
+                 for c in changes for e in elapsed]
+    return summary.low * math.exp(min(exponents)), summary.high * math.exp(max(exponents))
+
+
+def merge(members: List[int], merged: int, summaries: List[Summary], times: List[float], decays: List[float], weights: List[float], contributions: List[float], band: int, time: float, alpha: float, C: float) -> Tuple[tuple, Summary]:
+    """
+    Merge encounters and earlier merged encounters, given by their indices, into a single weighted encounter.
+    Returns its time, activation, decay and weight, and the summary of what it stands for.
+    """
+    total = sum(contributions[j] for j in members)
+    weight = sum(weights[j] for j in members)
+    decay = sum(contributions[j] * decays[j] for j in members) / total
+
+    low = high = 0.0
+    first_time = min_decay = float("inf")
+    last_time = max_decay = -float("inf")
+    for j in members:
+        if j < merged:
+            previous = summaries[j]
+            previous_low, previous_high = propagate(previous, time, alpha)
+            shift = alpha - previous.alpha
+            low += previous_low
+            high += previous_high
+            first_time = min(first_time, previous.first_time)
+            last_time = max(last_time, previous.last_time)
+            min_decay = min(min_decay, previous.min_decay + shift)
+            max_decay = max(max_decay, previous.max_decay + shift)
+        else:
+            low += contributions[j]
+            high += contributions[j]
+            first_time = min(first_time, times[j])
+            last_time = max(last_time, times[j])
+            min_decay = min(min_decay, decays[j])
+            max_decay = max(max_decay, decays[j])
+
+    # A single encounter with the mean decay contributes the mean contribution at this time, kept within the range of the merged encounters
+    merged_time = time - 1000 * math.pow(total / weight, -1 / decay)
+    merged_time = min(max(merged_time, first_time), last_time)
+
+    # Encounters in the lowest band decay at (nearly) exactly alpha, like a first encounter
+    merged_activation = math.log(
+        (decay - alpha) / C) if decay > alpha else -float("inf")
+
+    return (merged_time, merged_activation, decay, weight), Summary(band, time, low, high, first_time, last_time, min_decay, max_decay, alpha)
+
+
+def compress(state, time: float, alpha: float, epsilon: float, min_kept: int, max_kept: int, C: float) -> None:
+    """
+    Merge the encounters of a fact state whose contributions at `time` are below `epsilon` times the total into weighted encounters, one per activation band.
+    A merged encounter stands for all encounters merged into it: its weight is their number, its decay the contribution-weighted mean of theirs, and its time is chosen so that it contributes as much as they do at `time`.
+    As the encounters in a band have nearly the same decay, the merged encounter keeps following their summed contribution afterwards.
+    The last `min_kept` encounters are never merged, and the bounds on what the merged encounters contribute are kept in `state.summary`.
+    At most `max_kept` encounters are left unmerged: beyond that, the encounters with the smallest contributions are merged as well.
+    As a band holds at most MAX_GROUPS merged encounters, a state that is compressed after each encounter has at most max_entries(max_kept) entries.
+    """
+    times = state.times
+    decays = state.decays
+    summaries = state.summary or []
+    weights = state.weights or [1.0] * len(times)
+    merged = len(summaries)
+
+    contributions = [w * math.pow((time - t) / 1000, -d) if t < time else 0.0
+                     for (t, d, w) in zip(times, decays, weights)]
+    limit = epsilon * sum(contributions)
+
+    candidates = [j for j in range(merged, len(times) - min_kept) if times[j] < time]
+    selected = [j for j in candidates if contributions[j] < limit]
+
+    # Keep at most `max_kept` encounters unmerged
+    excess = len(times) - merged - len(selected) - max_kept
+    if excess > 0:
+        remaining = sorted((j for j in candidates if contributions[j] >= limit),
+                           key=lambda j: contributions[j])
+        selected = sorted(selected + remaining[:excess])
+    if len(selected) == 0:
+        return
+
+    # Encounters are merged per activation band, into groups whose times lie close together compared to how long ago they were
+    bands = {}
+    for i, summary in enumerate(summaries):
+        bands.setdefault(summary.band, []).append(
+            (summary.first_time, summary.last_time, i))
+    for j in selected:
+        bands.setdefault(get_band(state.activations[j]), []).append(
+            (times[j], times[j], j))
+
+    entries = []
+    new_summaries = []
+    for band, items in bands.items():
+        items.sort()
+        groups = [[items[0]]]
+        for item in items[1:]:
+            first_time = groups[-1][0][0]
+            last_time = max(max(i[1] for i in groups[-1]), item[1])
+            if last_time - first_time <= SPAN_RATIO * (time - last_time):
+                groups[-1].append(item)
+            else:
+                groups.append([item])
+        if len(groups) > MAX_GROUPS:
+            groups[:len(groups) - MAX_GROUPS + 1] = [
+                [i for group in groups[:len(groups) - MAX_GROUPS + 1] for i in group]]
+
+        for group in groups:
+            members = [i[2] for i in group]
+
+            # Groups that were merged before and did not change are kept as they are
+            if len(members) == 1 and members[0] < merged:
+                i = members[0]
+                entries.append(
+                    (times[i], state.activations[i], decays[i], weights[i]))
+                new_summaries.append(summaries[i])
+                continue
+
+            entry, summary = merge(members, merged, summaries, times, decays,
+                                   weights, contributions, band, time, alpha, C)
+            entries.append(entry)
+            new_summaries.append(summary)
+
+    selected = set(selected)
+    kept = [j for j in range(merged, len(times)) if j not in selected]
+
+    state.times = [e[0] for e in entries] + [times[j] for j in kept]
+    state.activations = [e[1] for e in entries] + \
+        [state.activations[j] for j in kept]
+    state.decays = [e[2] for e in entries] + [decays[j] for j in kept]
+    state.reaction_times = [float("nan")] * len(entries) + \
+        [state.reaction_times[j] for j in kept]
+    state.weights = [e[3] for e in entries] + [weights[j] for j in kept]
+    state.summary = new_summaries
+
+
+def max_entries(max_kept: int) -> int:
+    """
+    Return the largest number of entries of a state compressed by `compress` after each encounter: the merged encounters of every band and the encounters that are left unmerged.
+    """
+    bands = int(math.floor(HIGHEST_BAND / BAND_WIDTH)) - int(math.floor(LOWEST_BAND / BAND_WIDTH)) + 2
+    return bands * MAX_GROUPS + max_kept
+
+
+def error_bound(state, time: float) -> float:
+    """
+    Return the largest possible difference between the activation of a compressed state at `time` and the activation of the same encounters without merging, with the same decays.
+    """
+    if state.summary is None:
+        return 0.0
+
+    merged = len(state.summary)
+    contributions = [w * math.pow((time - t) / 1000, -d) if t < time else 0.0
+                     for (t, d, w) in zip(state.times, state.decays, state.weights)]
+    kept = sum(contributions[merged:])
+    bounds = [propagate(s, time, state.alpha) for s in state.summary]
+    low = kept + sum(b[0] for b in bounds)
+    high = kept + sum(b[1] for b in bounds)
+
+    if low <= 0 or math.isinf(high):
+        return float("inf")
+
+    approximate = math.log(kept + sum(contributions[:merged]))
+    return max(abs(approximate - math.log(low)), abs(approximate - math.log(high)))
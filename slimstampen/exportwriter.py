@@ -0,0 +1,318 @@
+"""exportwriter"""
+import csv
+import io
+import json
+import math
+import os
+import struct
+import sys
+import zlib
+from abc import ABC, abstractmethod
+from array import array
+from typing import Dict, List, Tuple, Union
+
+COLUMNAR_MAGIC = b"SLIMCOLS"
+COLUMNAR_HEADER = struct.Struct("<8sI")
+CHUNK_HEADER = struct.Struct("<II")
+BLOCK_HEADER = struct.Struct("<I")
+
+# Column types of the columnar format, as array typecodes: 64-bit floats and integers, booleans as single bytes and UTF-8 strings
+COLUMN_TYPECODES = {"d": "d", "t": "d", "q": "q", "?": "B"}
+
+# Types of the columns of an exported DataFrame
+FRAME_DTYPES = {"d": "float64", "t": "float64", "q": "int64", "?": "bool", "s": object}
+
+
+class ExportWriter(ABC):
+    """
+    Writes the rows of an export while the session is running, one row per registered response.
+    Rows are buffered and written every `buffer_size` rows, so that a crash loses at most the rows in the buffer. With `fsync` set, each write is also forced to disk.
+    A writer is a context manager that is closed at the end of the with block.
+    `columns` lists the name and type of each column: "d" for floats, "t" for times, which are floats written as integers when they are integral, "q" for integers, "?" for booleans and "s" for strings. `index` names the column that is the index of the exported DataFrame.
+    """
+
+    def __init__(self, path: str, columns: List[Tuple[str, str]], index: str, buffer_size: int = 100, fsync: bool = False):
+        self.path = path
+        self.columns = columns
+        self.index = index
+        self.buffer_size = buffer_size
+        self.fsync = fsync
+        self.rows = []
+
+        self.file = self.open()
+        self.flush()
+
+    def __enter__(self) -> "ExportWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @abstractmethod
+    def open(self):
+        """
+        Open the export file, write its header and return the file.
+        """
+
+    @abstractmethod
+    def write_rows(self, rows: List[list]) -> None:
+        """
+        Write rows to the export file.
+        """
+
+    @property
+    def closed(self) -> bool:
+        return self.file.closed
+
+    def append(self, row: list) -> None:
+        self.rows.append(row)
+        if len(self.rows) >= self.buffer_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.rows:
+            self.write_rows(self.rows)
+            self.rows = []
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+
+    def close(self) -> None:
+        if not self.closed:
+            self.flush()
+            self.file.close()
+
+
+class CSVExportWriter(ExportWriter):
+    """
+    Export writer for CSV files in the layout of export_data.
+    """
+
+    def open(self):
+        file = open(self.path, "w", encoding="utf-8", newline="")
+        self.writer = csv.writer(file, lineterminator=os.linesep)
+        self.writer.writerow([name for (name, _) in self.columns])
+        return file
+
+    def write_rows(self, rows: List[list]) -> None:
+        # Missing values are written as empty fields, as pandas does. Rows are written before the later values of a column are known, so each integral time is written as an integer
+        kinds = [kind for (_, kind) in self.columns]
+        self.writer.writerows([["" if isinstance(v, float) and math.isnan(v) else int(v) if kind == "t" and float(v).is_integer() else v
+                                for (v, kind) in zip(row, kinds)]
+                               for row in rows])
+
+
+class ColumnarExportWriter(ExportWriter):
+    """
+    Export writer for compressed columnar files.
+    The file starts with a JSON header describing the columns, followed by one zlib-compressed chunk per flush that holds each column as a contiguous block.
+    A chunk that was not completely written, e.g. after a crash, is ignored when the file is read.
+    """
+
+    def open(self):
+        header = json.dumps(
+            {"columns": self.columns, "index": self.index}).encode("utf-8")
+        file = open(self.path, "wb")
+        file.write(COLUMNAR_HEADER.pack(COLUMNAR_MAGIC, len(header)))
+        file.write(header)
+        return file
+
+    def write_rows(self, rows: List[list]) -> None:
+        blocks = []
+        for i, (_, kind) in enumerate(self.columns):
+            values = [row[i] for row in rows]
+            if kind == "s":
+                block = "\0".join(str(v) for v in values).encode("utf-8")
+            else:
+                block = pack_values(values, kind)
+            blocks.append(BLOCK_HEADER.pack(len(block)) + block)
+
+        chunk = zlib.compress(b"".join(blocks))
+        self.file.write(CHUNK_HEADER.pack(len(rows), len(chunk)))
+        self.file.write(chunk)
+
+
+def pack_values(values: list, kind: str) -> bytes:
+    values = array(COLUMN_TYPECODES[kind], [bool(v) for v in values] if kind == "?" else values)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tobytes()
+
+
+def unpack_values(block: bytes, kind: str) -> list:
+    values = array(COLUMN_TYPECODES[kind])
+    values.frombytes(block)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return [bool(v) for v in values] if kind == "?" else values.tolist()
+
+
+# Export writer per format
+EXPORT_WRITERS = {
+    "csv": CSVExportWriter,
+    "columnar": ColumnarExportWriter,
+}
+
+
+def read_columnar(path: str) -> Tuple[List[Tuple[str, str]], Dict[str, list]]:
+    """
+    Read a columnar export into its columns and a list of values per column.
+    """
+    with open(path, "rb") as file:
+        data = file.read()
+
+    magic, length = COLUMNAR_HEADER.unpack_from(data)
+    if magic != COLUMNAR_MAGIC:
+        raise RuntimeError(
+            f"Error while reading export: {path} is not a columnar export file")
+    header = json.loads(data[COLUMNAR_HEADER.size:COLUMNAR_HEADER.size + length])
+    columns = [tuple(c) for c in header["columns"]]
+
+    values = {name: [] for (name, _) in columns}
+    offset = COLUMNAR_HEADER.size + length
+    while offset + CHUNK_HEADER.size <= len(data):
+        rows, size = CHUNK_HEADER.unpack_from(data, offset)
+        offset += CHUNK_HEADER.size
+        if offset + size > len(data):
+            break
+        payload = zlib.decompress(data[offset:offset + size])
+        offset += size
+
+        position = 0
+        for name, kind in columns:
+            (block_size,) = BLOCK_HEADER.unpack_from(payload, position)
+            block = payload[position + BLOCK_HEADER.size:position + BLOCK_HEADER.size + block_size]
+            position += BLOCK_HEADER.size + block_size
+            if kind == "s":
+                values[name].extend(block.decode("utf-8").split("\0") if rows else [])
+            else:
+                values[name].extend(unpack_values(block, kind))
+
+    return columns, values
+
+
+def read_complete_lines(path: str) -> str:
+    """
+    Return the text of a CSV export without a last row that was not completely written, e.g. after a crash.
+    """
+    with open(path, encoding="utf-8", newline="") as file:
+        text = file.read()
+    if not text.endswith("\n"):
+        text = text[:text.rfind("\n") + 1]
+    return text
+
+
+def read_csv(path: str, columns: List[Tuple[str, str]]) -> Dict[str, list]:
+    """
+    Read a CSV export with the given columns into a list of values per column.
+    """
+    parsers = {"d": lambda v: float(v) if v else float("nan"), "t": lambda v: float(v) if v else float("nan"), "q": int,
+               "?": lambda v: v == "True", "s": str}
+    rows = list(csv.reader(io.StringIO(read_complete_lines(path))))[1:]
+    return {name: [parsers[kind](row[i]) for row in rows] for (i, (name, kind)) in enumerate(columns)}
+
+
+def read_export_values(path: str, columns: List[Tuple[str, str]]) -> Tuple[List[Tuple[str, str]], Dict[str, list]]:
+    """
+    Read an export written by a CSV or columnar export writer with the given columns, without pandas.
+    """
+    with open(path, "rb") as file:
+        columnar = file.read(len(COLUMNAR_MAGIC)) == COLUMNAR_MAGIC
+
+    if columnar:
+        return read_columnar(path)
+    return columns, read_csv(path, columns)
+
+
+def read_export(path: str, columns: List[Tuple[str, str]] = None) -> "pd.DataFrame":
+    """
+    Read an export written by a CSV or columnar export writer into the DataFrame that export_data returns.
+    Rows that were not completely written are ignored.
+    The column types of a CSV export are taken from `columns` if given, and otherwise inferred by pandas.
+    """
+    with open(path, "rb") as file:
+        columnar = file.read(len(COLUMNAR_MAGIC)) == COLUMNAR_MAGIC
+
+    if columnar or columns is not None:
+        return to_frame(*read_export_values(path, columns))
+
+    import pandas as pd
+
+    dat = pd.read_csv(io.StringIO(read_complete_lines(path)), index_col=0, keep_default_na=False,
+                      na_values=[""], float_precision="round_trip")
+    if dat.index.name == "":
+        dat.index.name = None
+    return dat
+
+
+def get_column_values(values: list, kind: str) -> list:
+    """
+    Return the values of a column as they are exported: a column of times is exported as integers if all of them are integral, as in the logs written before the response log stored them as floats.
+    """
+    if kind == "t" and all(float(v).is_integer() for v in values):
+        return [int(v) for v in values]
+    return values
+
+
+def to_frame(columns: List[Tuple[str, str]], values: Dict[str, list]) -> "pd.DataFrame":
+    """
+    Return the values of an export as a pandas DataFrame, indexed by the first column.
+    """
+    import pandas as pd
+
+    index = columns[0][0]
+    columns_values = {name: get_column_values(values[name], kind) for (name, kind) in columns}
+    dat = pd.DataFrame({name: pd.Series(columns_values[name], dtype="int64" if kind == "t" and all(isinstance(v, int) for v in columns_values[name]) else FRAME_DTYPES[kind])
+                        for (name, kind) in columns}).set_index(index)
+    if index == "":
+        dat.index.name = None
+    return dat
+
+
+def export_csv(columns: List[Tuple[str, str]], values: Dict[str, list], path: str = None) -> str:
+    """
+    Export backend that writes the CSV layout of export_data with the csv module.
+    Returns the path, or the CSV-formatted data if no path is given.
+    """
+    file = open(path, "w", encoding="utf-8", newline="") if path is not None else io.StringIO()
+    with file:
+        writer = csv.writer(file, lineterminator=os.linesep)
+        writer.writerow([name for (name, _) in columns])
+        writer.writerows(["" if isinstance(v, float) and math.isnan(v) else v for v in row]
+                         for row in zip(*(get_column_values(values[name], kind) for (name, kind) in columns)))
+        return path if path is not None else file.getvalue()
+
+
+def export_pandas(columns: List[Tuple[str, str]], values: Dict[str, list], path: str = None) -> Union["pd.DataFrame", str]:
+    """
+    Export backend that builds a pandas DataFrame. It is saved as CSV file and returned if a path is given, and otherwise returned as CSV-formatted data.
+    """
+    dat = to_frame(columns, values)
+    if path is not None:
+        dat.to_csv(path, encoding="UTF-8")
+        return dat
+    return dat.to_csv()
+
+
+def export_columnar(columns: List[Tuple[str, str]], values: Dict[str, list], path: str = None) -> str:
+    """
+    Export backend that writes a columnar export file, and returns its path.
+    """
+    if path is None:
+        raise RuntimeError(
+            "Error while exporting data: The columnar format can only be written to a file")
+
+    rows = [list(row) for row in zip(*(values[name] for (name, _) in columns))]
+    writer = ColumnarExportWriter(path, columns, columns[0][0])
+    if rows:
+        writer.write_rows(rows)
+    writer.close()
+    return path
+
+
+# Export backends per name. Each is called with the columns, the values per column and an optional path; pandas is only imported when the pandas backend is used.
+EXPORT_BACKENDS = {
+    "csv": export_csv,
+    "pandas": export_pandas,
+    "columnar": export_columnar,
+}
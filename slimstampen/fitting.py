@@ -0,0 +1,337 @@
+"""fitting"""
+import argparse
+import itertools
+import json
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Tuple
+import numpy as np
+import slimstampen.spacingmodel as sp
+import slimstampen.flippingmodel as fm
+from slimstampen.rescore import find_session_logs, read_session_log
+
+# Constants that change the learner states of the replay engine, and their default search grid
+MODEL_GRID = {
+    "DEFAULT_ALPHA": [0.2, 0.3, 0.4],
+    "C": [0.15, 0.25, 0.35],
+    "F": [0.6, 0.8, 1.0, 1.2, 1.4],
+}
+
+FLIP_GRID = {
+    "FLIPPING_ALPHA": [0.2, 0.25, 0.3, 0.35, 0.4],
+}
+
+
+@lru_cache(maxsize=None)
+def load_responses(path: str) -> Tuple[sp.Response, ...]:
+    """
+    Read the responses of a session log, with each fact in the orientation in which it was presented.
+    Logs are read once per process.
+    """
+    responses = []
+    for values in read_session_log(path):
+        fact = fm.Fact(values["fact_id"], values["question"],
+                       values["answer"], values["flipped"] == "True")
+        responses.append(sp.Response(fact, float(values["start_time"]), float(
+            values["rt"]), values["correct"] == "True"))
+    return tuple(responses)
+
+
+def replay(path: str, constants: Dict[str, float], flipping: bool = False) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, sp.SpacingModel]:
+    """
+    Register the responses of a session log with a model using the given constants.
+    Only the replay engines are updated, as the facts are not added to the schedule.
+    Returns the activation at the start of each response, its reading time, reaction time and correctness, and the model.
+    With `flipping`, the activations are those of the fact in its presented orientation.
+    """
+    model = type("FittingModel", (fm.FlippingModel if flipping else sp.SpacingModel,), constants)()
+    engine = model.flip_engine if flipping else model.engine
+
+    responses = load_responses(path)
+    activations = np.empty(len(responses))
+    reading_times = np.empty(len(responses))
+    for i, response in enumerate(responses):
+        model.register_response(response)
+
+        # The activation at the start of a response is stored with the encounter it added
+        activations[i] = engine.states[engine.key(response)].activations[-1]
+        reading_times[i] = model.get_fact_timing(response.fact.question)[0]
+
+    rts = np.array([r.rt for r in responses])
+    correct = np.array([r.correct for r in responses], dtype=bool)
+    return activations, reading_times, rts, correct, model
+
+
+def calculate_errors(activations: np.ndarray, reading_times: np.ndarray, rts: np.ndarray, correct: np.ndarray, F: float) -> np.ndarray:
+    """
+    Return the absolute differences between the observed reaction times and those predicted from the activations, with the formula of estimate_reaction_time_from_activation.
+    Only correct responses to facts that were seen before and with a finite reaction time are compared.
+    """
+    included = correct & np.isfinite(activations) & np.isfinite(rts)
+    predicted = (F * np.exp(-activations[included]) +
+                 reading_times[included] / 1000) * 1000
+    return np.abs(rts[included] - predicted)
+
+
+def evaluate_session(path: str, points: List[Dict[str, float]], flipping: bool = False) -> np.ndarray:
+    """
+    Return the summed reaction time error and the number of compared responses of a session log for each set of constants.
+    The responses are replayed once for all sets of constants together: the encounters of each fact hold a column per set of constants, and the alpha estimates of all columns are bisected at once, in the same steps as slimstampen.alphaestimator.estimate_alpha.
+    """
+    model_type = fm.FlippingModel if flipping else sp.SpacingModel
+    model = model_type()
+
+    def column(name):
+        return np.array([point.get(name, getattr(model_type, name)) for point in points], dtype=float)
+
+    default_alpha = column("FLIPPING_ALPHA" if flipping else "DEFAULT_ALPHA")
+    C, F, forget_threshold = column("C"), column("F"), column("FORGET_THRESHOLD")
+
+    def estimate_reaction_time(activation, reading_time):
+        return (F * np.exp(-activation) + (reading_time / 1000)) * 1000
+
+    responses = load_responses(path)
+    activations = np.empty((len(responses), len(points)))
+    reading_times = np.empty(len(responses))
+
+    # Encounter times, and activations, normalised reaction times and decays per set of constants, of each fact
+    states = {}
+    for i, response in enumerate(responses):
+        key = (response.fact.fact_id, response.fact.flipped) if flipping else response.fact.fact_id
+        times, encounter_activations, reaction_times, decays, alpha = states.get(
+            key, ([], [], [], [], default_alpha))
+        time = response.start_time
+
+        included = [j for (j, t) in enumerate(times) if t < time]
+        if len(included) == 0:
+            activation = np.full(len(points), -np.inf)
+        else:
+            elapsed = np.array([(time - times[j]) / 1000 for j in included])
+            activation = np.log(np.sum(np.power(
+                elapsed[:, None], -np.array([decays[j] for j in included])), axis=0))
+
+        reading_time = model.get_reading_time(response.fact.question)
+        max_rt = 1.5 * estimate_reaction_time(forget_threshold, reading_time)
+        reaction_time = np.minimum(response.rt if response.correct else 60000, max_rt)
+        activations[i] = activation
+        reading_times[i] = reading_time
+
+        times.append(time)
+        encounter_activations.append(activation)
+        reaction_times.append(reaction_time)
+        decays.append(default_alpha)
+        alpha = estimate_alphas(times, decays, reaction_times, activation, reaction_time,
+                                reading_time, alpha, default_alpha, estimate_reaction_time)
+
+        # Update decay estimates of previous encounters
+        decays[:] = list(C * np.exp(np.array(encounter_activations)) + alpha)
+        states[key] = (times, encounter_activations, reaction_times, decays, alpha)
+
+    rts = np.array([r.rt for r in responses])
+    correct = np.array([r.correct for r in responses], dtype=bool)
+    results = np.zeros((len(points), 2))
+    for p in range(len(points)):
+        errors = calculate_errors(activations[:, p], reading_times, rts, correct, F[p])
+        results[p] = (errors.sum(), len(errors))
+    return results
+
+
+def estimate_alphas(times: List[float], decays: List[np.ndarray], reaction_times: List[np.ndarray], activation: np.ndarray, observed_rt: np.ndarray, reading_time: float, previous_alpha: np.ndarray, default_alpha: np.ndarray, estimate_reaction_time) -> np.ndarray:
+    """
+    Estimate the rate of forgetting of a fact for each set of constants at once, with the bisection of slimstampen.alphaestimator.estimate_alpha.
+    The decays and normalised reaction times of the encounters hold a value per set of constants.
+    """
+    if len(times) < 3:
+        return default_alpha
+
+    # Estimated RT too short (activation too high) means a larger decay, and the other way around
+    too_short = estimate_reaction_time(activation, reading_time) - observed_rt < 0
+    a0 = np.where(too_short, previous_alpha, previous_alpha - 0.05)
+    a1 = np.where(too_short, previous_alpha + 0.05, previous_alpha)
+
+    window = []
+    for w in range(max(1, len(times) - 5), len(times)):
+        test_time = times[w] - 100
+        included = [j for j in range(len(times)) if times[j] < test_time]
+        elapsed = np.array([(test_time - times[j]) / 1000 for j in included])
+        window.append((reaction_times[w], elapsed[:, None], np.array([decays[j] for j in included])))
+
+    # Binary search between previous fit and proposed alpha
+    for _ in range(6):
+        a0_diff = a0 - previous_alpha
+        a1_diff = a1 - previous_alpha
+        total_a0_error = total_a1_error = 0.0
+        for (rt, elapsed, window_decays) in window:
+            if len(elapsed) == 0:
+                activation_a0 = activation_a1 = np.full(len(a0), -np.inf)
+            else:
+                activation_a0 = np.log(np.sum(np.power(elapsed, -(window_decays + a0_diff)), axis=0))
+                activation_a1 = np.log(np.sum(np.power(elapsed, -(window_decays + a1_diff)), axis=0))
+            total_a0_error = total_a0_error + np.abs(rt - estimate_reaction_time(activation_a0, reading_time))
+            total_a1_error = total_a1_error + np.abs(rt - estimate_reaction_time(activation_a1, reading_time))
+
+        # Adjust the search area based on the lowest total error
+        ac = (a0 + a1) / 2
+        lower = total_a0_error < total_a1_error
+        a1 = np.where(lower, ac, a1)
+        a0 = np.where(lower, a0, ac)
+
+    return (a0 + a1) / 2
+
+
+def fit_threshold(activations: np.ndarray, correct: np.ndarray) -> float:
+    """
+    Return the activation threshold that best separates correct (above) from incorrect (below) responses.
+    """
+    included = np.isfinite(activations)
+    order = np.argsort(activations[included])
+    values = activations[included][order]
+    correct = correct[included][order]
+    if len(values) == 0:
+        return float("nan")
+
+    # Number of correct classifications when the threshold lies below each value, and above all of them
+    incorrect_below = np.concatenate(([0], np.cumsum(~correct)))
+    correct_above = np.concatenate(
+        (np.cumsum(correct[::-1])[::-1], [0]))
+    best = int(np.argmax(incorrect_below + correct_above))
+
+    if best == 0:
+        return float(values[0])
+    if best == len(values):
+        return float(values[-1])
+    return float((values[best - 1] + values[best]) / 2)
+
+
+def make_points(grid: Dict[str, List[float]], base: Dict[str, float] = None) -> List[Dict[str, float]]:
+    return [{**(base or {}), **dict(zip(grid, values))} for values in itertools.product(*grid.values())]
+
+
+def replay_outcomes(path: str, constants: Dict[str, float]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return the flip activation at the start of each response of a session log and whether the response was correct.
+    """
+    activations, _, _, correct, _ = replay(path, constants, True)
+    return activations, correct
+
+
+def search(executor: Executor, logs: List[str], points: List[Dict[str, float]], flipping: bool) -> List[Future]:
+    """
+    Submit the evaluation of every set of constants on every session log to a process pool, as one task per session that evaluates all sets of constants at once.
+    """
+    return [executor.submit(evaluate_session, log, points, flipping) for log in logs]
+
+
+def gather(futures: List[Future], points: List[Dict[str, float]]) -> np.ndarray:
+    """
+    Wait for the tasks of a search and return an array of sessions x points x (summed error, count).
+    """
+    results = np.zeros((len(futures), len(points), 2))
+    for i, future in enumerate(futures):
+        results[i] = future.result()
+    return results
+
+
+def best_point(points: List[Dict[str, float]], results: np.ndarray) -> Tuple[Dict[str, float], float]:
+    with np.errstate(invalid="ignore", divide="ignore"):
+        errors = results[:, 0] / results[:, 1]
+    if np.all(np.isnan(errors)):
+        return dict(points[0]), float("nan")
+    best = int(np.nanargmin(errors))
+    return dict(points[best]), float(errors[best])
+
+
+def fit(paths: List[str], model_grid: Dict[str, List[float]] = None, flip_grid: Dict[str, List[float]] = None, workers: int = None) -> dict:
+    """
+    Fit the model constants to the session logs in the given files and directories.
+    The constants of the replay engine are fitted first, by the mean absolute error of the predicted reaction times of correct responses.
+    The flipping alpha is then fitted in the same way on the activations per orientation, starting from the best model constants.
+    FLIPPING_THRESHOLD does not affect a replay of logged responses, so it is fitted as the flip activation that best separates correct from incorrect responses.
+    Returns the best constants and their error for each session and for all sessions pooled.
+    """
+    logs = [str(log) for log in find_session_logs(paths)]
+    model_points = make_points(model_grid or MODEL_GRID)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        model_results = gather(search(executor, logs, model_points, False), model_points)
+
+        fits = {log: dict(zip(("constants", "error"), best_point(model_points, results)))
+                for (log, results) in zip(logs, model_results)}
+        fits["pooled"] = dict(zip(("constants", "error"),
+                              best_point(model_points, model_results.sum(axis=0))))
+
+        # Flipping alpha, starting from the best model constants of each session and of the pooled fit. The searches of all fits are submitted at once.
+        flip_searches = {}
+        for name, result in fits.items():
+            flip_logs = logs if name == "pooled" else [name]
+            flip_points = make_points(flip_grid or FLIP_GRID, result["constants"])
+            flip_searches[name] = (flip_logs, flip_points, search(executor, flip_logs, flip_points, True))
+
+        threshold_replays = {}
+        for name, result in fits.items():
+            flip_logs, flip_points, futures = flip_searches[name]
+            result["constants"], result["flip_error"] = best_point(
+                flip_points, gather(futures, flip_points).sum(axis=0))
+            threshold_replays[name] = [executor.submit(replay_outcomes, log, result["constants"])
+                                       for log in flip_logs]
+
+        for name, result in fits.items():
+            outcomes = [future.result() for future in threshold_replays[name]]
+            result["constants"]["FLIPPING_THRESHOLD"] = fit_threshold(np.concatenate(
+                [o[0] for o in outcomes]), np.concatenate([o[1] for o in outcomes]))
+
+    return fits
+
+
+def parse_grid(text: str) -> Tuple[str, List[float]]:
+    """
+    Parse NAME=start:stop:count into evenly spaced values, or NAME=v1,v2,... into a list of values.
+    """
+    name, values = text.split("=", 1)
+    name = name.strip()
+    if not hasattr(fm.FlippingModel, name):
+        raise argparse.ArgumentTypeError(f"Unknown model constant: {name}")
+    if name not in MODEL_GRID and name not in FLIP_GRID:
+        raise argparse.ArgumentTypeError(
+            f"{name} does not change a replay of logged responses and cannot be fitted with a grid, only {', '.join([*MODEL_GRID, *FLIP_GRID])} can")
+    if ":" in values:
+        start, stop, count = values.split(":")
+        return name, list(np.linspace(float(start), float(stop), int(count)))
+    return name, [float(v) for v in values.split(",")]
+
+
+parser = argparse.ArgumentParser(prog="Slimstampen parameter fitting",
+                                 description="fits the model constants to logged sessions by the error of the predicted reaction times")
+parser.add_argument("paths", nargs="+",
+                    help="Session logs or directories containing them")
+parser.add_argument("--output", "-O", type=str,
+                    help="A JSON file the fitted constants are written to")
+parser.add_argument("--grid", "-G", type=parse_grid, action="append", default=[], metavar="NAME=START:STOP:COUNT",
+                    help="Search grid of a constant, e.g. F=0.5:1.5:11 or C=0.2,0.25,0.3. Replaces the default grid of that constant.")
+parser.add_argument("--workers", "-W", type=int,
+                    help="The number of worker processes (default: number of CPUs)")
+
+if __name__ == "__main__":
+
+    options = parser.parse_args()
+
+    model_grid = dict(MODEL_GRID)
+    flip_grid = dict(FLIP_GRID)
+    for name, values in options.grid:
+        if name in flip_grid:
+            flip_grid[name] = values
+        else:
+            model_grid[name] = values
+
+    start = time.perf_counter()
+    fits = fit(options.paths, model_grid, flip_grid, options.workers)
+
+    for name, result in fits.items():
+        constants = ", ".join(f"{k}={v:.3g}" for (k, v) in result["constants"].items())
+        print(f"{name}: {constants} (RT error {result['error']:.0f} ms, flip RT error {result['flip_error']:.0f} ms)")
+    print(f"Fitted {len(fits) - 1} logs in {time.perf_counter() - start:.2f} s")
+
+    if options.output:
+        with open(options.output, "w", encoding="utf-8") as file:
+            json.dump(fits, file, indent=2)
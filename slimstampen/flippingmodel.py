@@ -1,10 +1,9 @@
 """flippingmodel"""
 import math
 import slimstampen.spacingmodel as sp
+import slimstampen.alphaestimator as ae
 from collections import namedtuple
-from typing import Tuple, List, Union
-import pandas as pd
-import io
+from typing import Dict, Tuple, List
 import random
 
 Fact = namedtuple("Fact", sp.Fact._fields + ("flipped",), defaults=(False,))
@@ -20,6 +19,19 @@ class FlippingModel(sp.SpacingModel):
     FLIPPING_THRESHOLD = -0.75
     FLIPPING_ALPHA = 0.3
 
+    FACT_TYPE = Fact
+
+    def __init__(self, use_forgetting_queue: bool = False, activation_epsilon: float = None):
+        super().__init__(use_forgetting_queue, activation_epsilon)
+
+        # Learner states per fact and orientation, starting from the flipping constants
+        self.flip_engine = sp.ReplayEngine(
+            self, self.FLIPPING_ALPHA, lambda r: (r.fact.fact_id, r.fact.flipped))
+
+    def update_engines(self, response: Response, row: int) -> None:
+        super().update_engines(response, row)
+        self.flip_engine.register_response(response, row)
+
     def get_next_fact(self, current_time: int, use_flipping: bool = True) -> Tuple[Fact, bool]:
         """
         Returns a tuple containing the fact that needs to be repeated most urgently and a boolean indicating whether this fact is new (True) or has been presented before (False).
@@ -33,6 +45,44 @@ class FlippingModel(sp.SpacingModel):
         else:
             return next_fact, new
 
+    def get_next_fact_after(self, response: Response, current_time: int, use_flipping: bool = True) -> Tuple[Fact, bool]:
+        """
+        Return what get_next_fact would return at the specified time if the response was registered first, without changing the model.
+        A fact that would be flipped is returned flipped, but it is not stored that way.
+        """
+        next_fact, new = super().get_next_fact_after(response, current_time)
+
+        if not use_flipping or new:
+            return next_fact, new
+
+        key = (next_fact.fact_id, next_fact.flipped)
+        state = self.flip_engine.get_state(current_time, key)
+        if key == (response.fact.fact_id, response.fact.flipped) and response.start_time < current_time:
+            state = self.flip_engine.get_state(response.start_time, key).copy()
+            self.flip_engine.update_state(state, response)
+
+        if ae.calculate_activation(state.times, state.decays, current_time, state.weights) > self.FLIPPING_THRESHOLD:
+            return next_fact._replace(question=next_fact.answer, answer=next_fact.question, flipped=not next_fact.flipped), new
+        return next_fact, new
+
+    def plan_orientation(self, fact: Fact, new: bool, time: int, view: sp.PlanView) -> Tuple[Fact, bool]:
+        """
+        Flip a planned fact that is not new when its flipping threshold is reached, as get_next_fact does, but only in the view.
+        """
+        if new:
+            return fact, False
+
+        state = view.get_state(self.flip_engine, time, (fact.fact_id, fact.flipped))
+        if ae.calculate_activation(state.times, state.decays, time, state.weights) > self.FLIPPING_THRESHOLD:
+            fact = fact._replace(question=fact.answer, answer=fact.question, flipped=not fact.flipped)
+            view.facts[fact.fact_id] = fact
+            return fact, True
+        return fact, False
+
+    def plan_response(self, response: Response, view: sp.PlanView) -> None:
+        super().plan_response(response, view)
+        view.register_response(self.flip_engine, response)
+
     def flip_fact(self, fact: Fact, time: int) -> Fact:
         """decide if the fact needs to be flipped or not"""
 
@@ -40,7 +90,7 @@ class FlippingModel(sp.SpacingModel):
 
             new_fact = fact._replace(
                 question=fact.answer, answer=fact.question, flipped=not fact.flipped)
-            self.facts[self.facts.index(fact)] = new_fact
+            self.facts[self.fact_index[fact.fact_id]] = new_fact
 
             return new_fact
         else:
@@ -53,7 +103,7 @@ class FlippingModel(sp.SpacingModel):
         The `flip_ratio` parameter determines how many of the returned facts are flipped.
         """
 
-        dist_resp = set([r.fact.fact_id for r in self.responses])
+        dist_resp = self.response_rows.keys()
 
         studied_facts = []
 
@@ -64,7 +114,7 @@ class FlippingModel(sp.SpacingModel):
             flip_ratio = 0
 
         for idx in dist_resp:
-            fact = [f for f in self.facts if f.fact_id == idx][0]
+            fact = self.facts[self.fact_index[idx]]
             if fact.flipped:
                 # normalize facts
                 fact = fact._replace(question=fact.answer,
@@ -89,127 +139,41 @@ class FlippingModel(sp.SpacingModel):
 
     def calculate_flip_activation(self, time: int, fact: Fact) -> float:
         """calculate the flipping activation of a fact"""
-        encounters = []
-
-        responses_for_fact = [
-            r for r in self.responses if r.fact.fact_id == fact.fact_id and r.start_time < time and r.fact.flipped == fact.flipped]
-
-        alpha = self.FLIPPING_ALPHA
-
-        # Calculate the activation by running through the sequence of previous responses
-        for response in responses_for_fact:
-            activation = self.calculate_activation_from_encounters(
-                encounters, response.start_time)
-            encounters.append(Encounter(activation, response.start_time,
-                              self.normalise_reaction_time(response), self.FLIPPING_ALPHA))
-            alpha = self.estimate_flip_alpha(
-                encounters, activation, response, alpha)
-
-            # Update decay estimates of previous encounters
-            encounters = [encounter._replace(decay=self.calculate_decay(
-                encounter.activation, alpha)) for encounter in encounters]
-
-        return self.calculate_activation_from_encounters(encounters, time)
+        state = self.flip_engine.get_state(time, (fact.fact_id, fact.flipped))
+        return ae.calculate_activation(state.times, state.decays, time, state.weights)
 
     def get_flip_alpha(self, time: int, fact: Fact) -> float:
         """
         Return the estimated flip alpha of the fact at the specified time
         """
-        encounters = []
-
-        responses_for_fact = [
-            r for r in self.responses if r.fact.fact_id == fact.fact_id and r.start_time < time and r.fact.flipped == fact.flipped]
-        alpha = self.FLIPPING_ALPHA
-
-        # Calculate the activation by running through the sequence of previous responses
-        for response in responses_for_fact:
-            activation = self.calculate_activation_from_encounters(
-                encounters, response.start_time)
-            encounters.append(Encounter(activation, response.start_time,
-                              self.normalise_reaction_time(response), self.FLIPPING_ALPHA))
-            alpha = self.estimate_flip_alpha(
-                encounters, activation, response, alpha)
-
-            # Update decay estimates of previous encounters
-            encounters = [encounter._replace(decay=self.calculate_decay(
-                encounter.activation, alpha)) for encounter in encounters]
-
-        return alpha
+        return self.flip_engine.get_state(time, (fact.fact_id, fact.flipped)).alpha
 
     def estimate_flip_alpha(self, encounters: List[Encounter], activation: float, response: Response, previous_alpha: float) -> float:
         """
         Estimate the alpha parameter for an item.
         """
-        if len(encounters) < 3:
-            return self.FLIPPING_ALPHA
-
-        a_fit = previous_alpha
-        reading_time = self.get_reading_time(response.fact.question)
-        estimated_rt = self.estimate_reaction_time_from_activation(
-            activation, reading_time)
-        est_diff = estimated_rt - self.normalise_reaction_time(response)
-
-        if est_diff < 0:
-            # Estimated RT was too short (estimated activation too high), so actual decay was larger
-            a0 = a_fit
-            a1 = a_fit + 0.05
-
-        else:
-            # Estimated RT was too long (estimated activation too low), so actual decay was smaller
-            a0 = a_fit - 0.05
-            a1 = a_fit
-
-        # Binary search between previous fit and proposed alpha
-        for _ in range(6):
-            # Adjust all decays to use the new alpha
-            a0_diff = a0 - a_fit
-            a1_diff = a1 - a_fit
-            d_a0 = [e._replace(decay=e.decay + a0_diff) for e in encounters]
-            d_a1 = [e._replace(decay=e.decay + a1_diff) for e in encounters]
+        return ae.estimate_alpha([e.time for e in encounters], [e.decay for e in encounters], [e.reaction_time for e in encounters], activation, self.normalise_reaction_time(response), self.get_reading_time(response.fact.question), previous_alpha, self.FLIPPING_ALPHA, self.estimate_reaction_time_from_activation)
 
-            # Calculate the reaction times from activation and compare against observed RTs
-            encounter_window = encounters[max(1, len(encounters) - 5):]
-            total_a0_error = self.calculate_predicted_reaction_time_error(
-                encounter_window, d_a0, reading_time)
-            total_a1_error = self.calculate_predicted_reaction_time_error(
-                encounter_window, d_a1, reading_time)
+    def get_export_columns(self) -> List[Tuple[str, str]]:
+        return [("", "q")] + super().get_export_columns() + [("flip_alpha", "d"), ("flip_activation", "d")]
 
-            # Adjust the search area based on the lowest total error
-            ac = (a0 + a1) / 2
-            if total_a0_error < total_a1_error:
-                a1 = ac
-            else:
-                a0 = ac
-
-        # The new alpha estimate is the average value in the remaining bracket
-        return (a0 + a1) / 2
-
-    def export_data(self, path: str = None) -> Union[pd.DataFrame, str]:
+    def get_export_row(self, response: Response, row: int) -> list:
         """
-        Save the response data to the specified csv file, and return a copy of the pandas DataFrame.
-        If no path is specified, return a CSV-formatted copy of the data instead.
+        Return the export row of a response that was just registered, extended with the flip alpha and flip activation of the orientation in which the fact was presented.
         """
+        state = self.flip_engine.states[self.flip_engine.key(response)]
+        return [row] + super().get_export_row(response, row) + [state.alpha, state.activations[-1]]
 
-        df_string = super().export_data()
-
-        df = pd.read_csv(io.StringIO(df_string))
-
-        def get_fact(fact_id):
-            return [f for f in self.facts if f.fact_id == str(fact_id)][0]
-
-        def calc_flip_rof(row):
-            return self.get_flip_alpha(row["start_time"] + 1, get_fact(row["fact_id"]))
-
-        def calc_flip_act(row):
-            return self.calculate_flip_activation(row["start_time"], get_fact(row["fact_id"]))
-
-        # Add column for rate of forgetting estimate after each observation
-        df["flip_alpha"] = df.apply(calc_flip_rof, axis=1)
-        df["flip_activation"] = df.apply(calc_flip_act, axis=1)
+    def get_export_values(self) -> Dict[str, list]:
+        """
+        Return the response data as a list of values per export column, extended with the flip alpha and flip activation of each response.
+        The flip estimates are those of the orientation in which each fact was presented, as in a streamed export.
+        """
+        values = {"": list(range(len(self.responses)))}
+        values.update(super().get_export_values())
 
-        # Save to CSV file if a path was specified, otherwise return the CSV-formatted output
-        if path is not None:
-            df.to_csv(path, encoding="UTF-8")
-            return df
+        # Add column for flip alpha estimate after each observation
+        values["flip_alpha"], values["flip_activation"] = self.flip_engine.estimate_response_log(
+            self.responses, self.flip_engine.key)
 
-        return df.to_csv()
+        return values
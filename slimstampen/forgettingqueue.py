@@ -0,0 +1,83 @@
+"""forgettingqueue"""
+import heapq
+from typing import List, Tuple
+import slimstampen.alphaestimator as ae
+
+
+def predict_forgetting_time(times: List[float], decays: List[float], threshold: float, weights: List[float] = None) -> float:
+    """
+    Return the earliest time after the last encounter at which the activation has dropped below the threshold, to within half a millisecond.
+    The activation only decreases over time if all decays are positive; otherwise the last encounter time is returned so that the fact is always checked.
+    """
+    last_time = max(times)
+    if min(decays) <= 0:
+        return last_time
+
+    # Double the step until the activation is below the threshold
+    lower = last_time
+    step = 1000
+    while ae.calculate_activation(times, decays, last_time + step, weights) >= threshold:
+        lower = last_time + step
+        step *= 2
+        if step > 2 ** 50:
+            return float("inf")
+    upper = last_time + step
+
+    # Binary search for the crossing point
+    while upper - lower > 0.5:
+        middle = (lower + upper) / 2
+        if ae.calculate_activation(times, decays, middle, weights) < threshold:
+            upper = middle
+        else:
+            lower = middle
+
+    return upper
+
+
+class ForgettingQueue(object):
+    """
+    Priority queue of studied facts, ordered by the predicted time at which their activation drops below the forgetting threshold.
+    Entries are replaced lazily: an update pushes a new entry and older entries of the same fact are skipped when they come up.
+    """
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self.heap = []
+        self.entries = {}
+        self.counter = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def update(self, fact_id, times: List[float], decays: List[float], weights: List[float] = None) -> None:
+        """
+        Predict the forgetting time of a fact from its encounters and (re)insert it into the queue.
+        """
+        self.counter += 1
+        self.entries[fact_id] = self.counter
+        heapq.heappush(self.heap, (predict_forgetting_time(
+            times, decays, self.threshold, weights), self.counter, fact_id))
+
+        # Drop outdated entries once they make up most of the heap
+        if len(self.heap) > 2 * len(self.entries) + 64:
+            self.heap = [e for e in self.heap if self.entries[e[2]] == e[1]]
+            heapq.heapify(self.heap)
+
+    def pop_due(self, time: float) -> List[Tuple[float, int, object]]:
+        """
+        Remove and return the entries of all facts that are predicted to be forgotten before the given time.
+        """
+        due = []
+        while self.heap and self.heap[0][0] < time:
+            entry = heapq.heappop(self.heap)
+            if self.entries.get(entry[2]) == entry[1]:
+                due.append(entry)
+        return due
+
+    def restore(self, entries: List[Tuple[float, int, object]]) -> None:
+        """
+        Put entries returned by pop_due back into the queue.
+        """
+        for entry in entries:
+            if self.entries.get(entry[2]) == entry[1]:
+                heapq.heappush(self.heap, entry)
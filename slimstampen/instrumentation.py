@@ -0,0 +1,195 @@
+"""instrumentation"""
+import functools
+import json
+import math
+import os
+import threading
+import time
+from typing import Callable, Dict, List
+import slimstampen.spacingmodel as sp
+
+# Latency histogram buckets are a quarter of a power of two wide, starting at 1 microsecond
+BUCKETS_PER_OCTAVE = 4
+BUCKET_COUNT = 128
+
+
+def count_table_encounters(model, args, result) -> int:
+    if model.forgetting_queue is not None:
+        return 0
+    table = model.activation_table
+    return int(table.counts[:table.size].sum())
+
+
+def count_fact_encounters(model, args, result) -> int:
+    time, fact = args[:2]
+    return sum(1 for row in model.response_rows.get(fact.fact_id, ()) if model.responses.start_times[row] < time)
+
+
+def count_responses(model, args, result) -> int:
+    return len(model.responses)
+
+
+def count_alpha_encounters(args) -> int:
+    return len(args[0])
+
+
+def count_error_encounters(args) -> int:
+    return sum(len(included) for (_, included, _) in args[0])
+
+
+# Instrumented model methods, with the number of encounters each call processes
+MODEL_METHODS = {
+    "get_next_fact": count_table_encounters,
+    "calculate_activation": count_fact_encounters,
+    "export_data": count_responses,
+}
+
+# Instrumented alpha estimation per replay engine
+ENGINE_NAMES = {
+    "engine": "estimate_alpha",
+    "flip_engine": "estimate_flip_alpha",
+}
+
+
+class Timer(object):
+    """
+    Call count, cumulative time, latency histogram and number of processed encounters of one method.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.encounters = 0
+        self.histogram = [0] * BUCKET_COUNT
+
+    def add(self, duration_ns: int, encounters: int) -> None:
+        self.calls += 1
+        self.total_ns += duration_ns
+        self.max_ns = max(self.max_ns, duration_ns)
+        self.encounters += encounters
+
+        micros = duration_ns / 1000
+        bucket = int(math.log2(micros) * BUCKETS_PER_OCTAVE) + 1 if micros >= 1 else 0
+        self.histogram[min(bucket, BUCKET_COUNT - 1)] += 1
+
+    def percentile(self, fraction: float) -> float:
+        """
+        Return the upper bound in milliseconds of the histogram bucket that contains the given fraction of the calls.
+        """
+        target = fraction * self.calls
+        seen = 0
+        for bucket, count in enumerate(self.histogram):
+            seen += count
+            if count and seen >= target:
+                return min(bucket_bound(bucket), self.max_ns / 1e6)
+        return self.max_ns / 1e6
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "total_ms": self.total_ns / 1e6,
+            "mean_ms": self.total_ns / 1e6 / self.calls if self.calls else 0.0,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": self.max_ns / 1e6,
+            "encounters": self.encounters,
+            "histogram": {f"{bucket_bound(b):.6g}": count for (b, count) in enumerate(self.histogram) if count},
+        }
+
+
+def bucket_bound(bucket: int) -> float:
+    """
+    Return the upper bound of a histogram bucket in milliseconds.
+    """
+    return 2 ** (bucket / BUCKETS_PER_OCTAVE) / 1000
+
+
+class Instrumentation(object):
+    """
+    Collects timings of the hot paths of a model.
+    Nothing is measured until `attach` wraps the methods of a model instance, and `detach` restores them, so a model without instrumentation runs the plain methods.
+    With `trace` set, every call is also kept as an event for a Chrome trace file, up to `max_events` events.
+    """
+
+    def __init__(self, trace: bool = False, max_events: int = 1000000):
+        self.timers: Dict[str, Timer] = {}
+        self.trace = trace
+        self.max_events = max_events
+        self.events: List[dict] = []
+        self.origin_ns = time.perf_counter_ns()
+
+    def wrap(self, name: str, function: Callable, count_encounters: Callable) -> Callable:
+        timer = self.timers.setdefault(name, Timer())
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter_ns()
+            result = function(*args, **kwargs)
+            end = time.perf_counter_ns()
+
+            encounters = count_encounters(args, result)
+            timer.add(end - start, encounters)
+            if self.trace and len(self.events) < self.max_events:
+                self.events.append({"name": name, "ph": "X", "ts": (start - self.origin_ns) / 1000, "dur": (end - start) / 1000,
+                                    "pid": os.getpid(), "tid": threading.get_ident(), "args": {"encounters": encounters}})
+            return result
+
+        wrapper.instrumented = function
+        return wrapper
+
+    def attach(self, model: sp.SpacingModel) -> "Instrumentation":
+        """
+        Instrument a model by wrapping its methods on the instance.
+        """
+        for name, count in MODEL_METHODS.items():
+            setattr(model, name, self.wrap(name, getattr(model, name),
+                                           lambda args, result, count=count: count(model, args, result)))
+
+        for attribute, engine in vars(model).items():
+            if isinstance(engine, sp.ReplayEngine):
+                name = ENGINE_NAMES.get(attribute, f"{attribute}.estimate_alpha")
+                engine.estimate_alpha = self.wrap(
+                    name, engine.estimate_alpha, lambda args, result: count_alpha_encounters(args))
+                engine.calculate_predicted_reaction_time_error = self.wrap(
+                    "calculate_predicted_reaction_time_error", engine.calculate_predicted_reaction_time_error, lambda args, result: count_error_encounters(args))
+
+        return self
+
+    def detach(self, model: sp.SpacingModel) -> None:
+        """
+        Restore the plain methods of an instrumented model.
+        """
+        for name in MODEL_METHODS:
+            if hasattr(getattr(model, name), "instrumented"):
+                delattr(model, name)
+
+        for engine in vars(model).values():
+            if isinstance(engine, sp.ReplayEngine) and hasattr(engine.estimate_alpha, "instrumented"):
+                engine.estimate_alpha = engine.estimate_alpha.instrumented
+            if isinstance(engine, sp.ReplayEngine) and hasattr(engine.calculate_predicted_reaction_time_error, "instrumented"):
+                engine.calculate_predicted_reaction_time_error = engine.calculate_predicted_reaction_time_error.instrumented
+
+    def to_dict(self) -> dict:
+        return {name: timer.to_dict() for (name, timer) in self.timers.items() if timer.calls}
+
+    def summary(self) -> str:
+        """
+        Return a table with the latency of each instrumented method.
+        """
+        lines = [f"{'method':<40} {'calls':>8} {'total ms':>10} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'encounters':>11}"]
+        for name, stats in self.to_dict().items():
+            lines.append(f"{name:<40} {stats['calls']:>8} {stats['total_ms']:>10.2f} {stats['mean_ms']:>9.3f} {stats['p50_ms']:>9.3f} {stats['p95_ms']:>9.3f} {stats['p99_ms']:>9.3f} {stats['max_ms']:>9.3f} {stats['encounters']:>11}")
+        return "\n".join(lines)
+
+    def dump_json(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.to_dict(), file, indent=2)
+
+    def dump_chrome_trace(self, path: str) -> None:
+        """
+        Write the recorded calls in the Chrome trace event format, which can be opened in chrome://tracing or Perfetto.
+        """
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, file)
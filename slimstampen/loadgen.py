@@ -0,0 +1,129 @@
+"""loadgen"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from statistics import mean
+
+
+class Client(object):
+    """
+    Minimal HTTP/1.1 client for the session server, using one keep-alive connection.
+    """
+
+    def __init__(self, address: str, port: int):
+        self.address = address
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method: str, path: str, body: dict = None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.address, self.port)
+
+        payload = json.dumps(body).encode("utf-8") if body is not None else b""
+        self.writer.write(
+            f"{method} {path} HTTP/1.1\r\nHost: {self.address}\r\nContent-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n".encode("latin-1") + payload)
+        await self.writer.drain()
+
+        status = int((await self.reader.readline()).split()[1])
+        headers = {}
+        while True:
+            line = (await self.reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+        data = await self.reader.readexactly(int(headers["content-length"]))
+
+        if headers.get("content-type") == "application/json":
+            data = json.loads(data)
+        return status, data
+
+    async def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            await self.writer.wait_closed()
+
+
+async def run_learner(options: argparse.Namespace, seed: int, latencies: dict, errors: dict) -> None:
+    """
+    Simulate one learner: open a session, answer `trials` questions and export the data.
+    """
+    rng = random.Random(seed)
+    client = Client(options.address, options.port)
+
+    async def timed(name, method, path, body=None):
+        start = time.perf_counter()
+        status, data = await client.request(method, path, body)
+        latencies.setdefault(name, []).append(time.perf_counter() - start)
+        if status != 200:
+            errors[status] = errors.get(status, 0) + 1
+        return status, data
+
+    try:
+        status, data = await timed("create", "POST", "/sessions", {"deck": options.deck, "flipping": not options.no_flipping})
+        if status != 200:
+            return
+        session = data["session"]
+
+        # Use simulated session time so that the load generator does not have to wait for real reaction times
+        now = 0
+        for _ in range(options.trials):
+            status, fact = await timed("next", "POST", f"/sessions/{session}/next", {"time": now})
+            if status != 200:
+                continue
+            rt = rng.lognormvariate(7.5, 0.5)
+            await timed("submit", "POST", f"/sessions/{session}/responses", {"fact_id": fact["fact_id"], "start_time": now, "rt": rt, "correct": rng.random() < 0.8})
+            now += int(rt) + rng.randint(300, 3000)
+            if options.think:
+                await asyncio.sleep(options.think / 1000)
+
+        if options.export:
+            await timed("export", "GET", f"/sessions/{session}/export")
+        await timed("close", "DELETE", f"/sessions/{session}")
+    finally:
+        await client.close()
+
+
+async def main(options: argparse.Namespace) -> None:
+    latencies = {}
+    errors = {}
+
+    start = time.perf_counter()
+    await asyncio.gather(*[run_learner(options, options.seed + i, latencies, errors) for i in range(options.learners)])
+    duration = time.perf_counter() - start
+
+    total = sum(len(v) for v in latencies.values())
+    print(f"{options.learners} learners, {total} requests in {duration:.2f} s ({total / duration:.0f} requests/s)")
+    for name, values in latencies.items():
+        values = sorted(values)
+        print(f"{name:>8}: n={len(values)} mean={mean(values) * 1000:.2f} ms p50={values[len(values) // 2] * 1000:.2f} ms p99={values[int(len(values) * 0.99)] * 1000:.2f} ms max={values[-1] * 1000:.2f} ms")
+    if errors:
+        print("errors:", errors)
+
+
+parser = argparse.ArgumentParser(prog="Slimstampen load generator",
+                                 description="simulates many concurrent learners against the slimstampen session server")
+parser.add_argument("--address", type=str, default="127.0.0.1",
+                    help="The address of the server (default: 127.0.0.1)")
+parser.add_argument("--port", "-P", type=int, default=8080,
+                    help="The port of the server (default: 8080)")
+parser.add_argument("--deck", "-D", type=str, default="swahili",
+                    help="The deck to study (default: swahili)")
+parser.add_argument("--learners", "-N", type=int, default=100,
+                    help="The number of concurrent learners (default: 100)")
+parser.add_argument("--trials", "-R", type=int, default=50,
+                    help="The number of trials per learner (default: 50)")
+parser.add_argument("--think", type=float, default=0,
+                    help="Milliseconds to wait between trials (default: 0)")
+parser.add_argument("--no-flipping", action="store_true",
+                    help="Use the basic spacing model instead of the flipping model")
+parser.add_argument("--export", action="store_true",
+                    help="Export the data of each session at the end")
+parser.add_argument("--seed", type=int, default=0,
+                    help="Seed for the simulated responses (default: 0)")
+
+if __name__ == "__main__":
+    asyncio.run(main(parser.parse_args()))
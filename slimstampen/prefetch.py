@@ -0,0 +1,108 @@
+"""prefetch"""
+import threading
+from collections import namedtuple
+from typing import Callable, Tuple
+import slimstampen.spacingmodel as sp
+
+Candidate = namedtuple("Candidate", "time, fact, new, depends_on_rt")
+
+
+class Prefetcher(object):
+    """
+    Computes the next fact in a background thread while the learner is answering the current one.
+    After the question is shown, the thread repeatedly predicts the next fact for a correct and for an incorrect answer given right now, using get_next_fact_after.
+    When the response is registered, the candidate for its outcome is used if it was computed at most `tolerance` milliseconds before the next fact is requested.
+    Otherwise, the next fact is computed as usual.
+    The model must not be used by other threads between `start` and `register_response`.
+    """
+
+    def __init__(self, model: sp.SpacingModel, clock: Callable[[], float], interval: float = 50, tolerance: float = 100, use_flipping: bool = None):
+        """
+        `clock` returns the current session time in milliseconds, `interval` is the time in milliseconds between predictions.
+        """
+        self.model = model
+        self.clock = clock
+        self.interval = interval
+        self.tolerance = tolerance
+        self.use_flipping = use_flipping
+
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.candidates = {}
+        self.pending = None
+
+        self.hits = 0
+        self.misses = 0
+
+    def predict(self, response: sp.Response, current_time: float) -> Candidate:
+        model = self.model
+        if self.use_flipping is None:
+            fact, new = model.get_next_fact_after(response, current_time)
+        else:
+            fact, new = model.get_next_fact_after(
+                response, current_time, use_flipping=self.use_flipping)
+
+        # The reaction time of a correct answer only matters while the answered fact can be repeated right away, i.e. with at most two studied facts
+        fact_id = response.fact.fact_id
+        studied = len(model.fact_states) + (fact_id not in model.fact_states)
+        depends_on_rt = response.correct and studied <= 2
+        return Candidate(current_time, fact, new, depends_on_rt)
+
+    def run(self, fact: sp.Fact, start_time: float) -> None:
+        while not self.stop_event.is_set():
+            now = self.clock()
+            try:
+                for correct in (True, False):
+                    response = sp.Response(
+                        fact, start_time, max(now - start_time, 1), correct)
+                    self.candidates[correct] = self.predict(response, now)
+            except Exception:
+                # Without candidates the next fact is computed as usual, which reports the error if it persists
+                self.candidates = {}
+                return
+            self.stop_event.wait(self.interval / 1000)
+
+    def start(self, fact: sp.Fact, start_time: float) -> None:
+        """
+        Start predicting the next fact after the learner answers `fact`, which was presented at `start_time`.
+        """
+        self.stop()
+        self.candidates = {}
+        self.stop_event.clear()
+        self.thread = threading.Thread(
+            target=self.run, args=(fact, start_time), daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        if self.thread is not None:
+            self.stop_event.set()
+            self.thread.join()
+            self.thread = None
+
+    def register_response(self, response: sp.Response) -> None:
+        """
+        Stop predicting and register the response with the model.
+        """
+        self.stop()
+        self.model.register_response(response)
+        self.pending = self.candidates.get(response.correct)
+
+    def get_next_fact(self, current_time: float) -> Tuple[sp.Fact, bool]:
+        """
+        Return the candidate for the outcome of the last response if it is still valid, and compute the next fact otherwise.
+        """
+        model = self.model
+        candidate, self.pending = self.pending, None
+
+        if candidate is not None and not candidate.depends_on_rt and 0 <= current_time - candidate.time <= self.tolerance:
+            self.hits += 1
+
+            # Store the orientation in which the fact is presented, as get_next_fact does
+            position = model.fact_index[candidate.fact.fact_id]
+            model.facts[position] = candidate.fact
+            return candidate.fact, candidate.new
+
+        self.misses += 1
+        if self.use_flipping is None:
+            return model.get_next_fact(current_time)
+        return model.get_next_fact(current_time, use_flipping=self.use_flipping)
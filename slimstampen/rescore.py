@@ -0,0 +1,157 @@
+"""rescore"""
+import argparse
+import csv
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+import slimstampen.flippingmodel as fm
+
+LOG_COLUMNS = ["", "trial", "start_time", "rt", "correct", "fact_id", "question",
+               "answer", "flipped", "alpha", "activation", "flip_alpha", "flip_activation"]
+
+
+def read_session_log(path: str) -> Iterator[dict]:
+    """
+    Stream the responses of a session log in the layout written by FlippingModel.export_data.
+    Some logs contain the export of every trial one after the other; each of these blocks repeats the previous one, so only the rows that extend the session are returned.
+    Reading stops at the first block with a different layout, e.g. the test results appended to a log.
+    """
+    trials = 0
+    header = None
+
+    with open(path, encoding="utf-8", newline="") as file:
+        for row in csv.reader(line.replace("\r", "") for line in file):
+            if not row or not any(row):
+                continue
+
+            if not row[0].isdigit():
+                if row != LOG_COLUMNS:
+                    if header is None:
+                        raise RuntimeError(
+                            f"Error while reading session log: {path} does not have the layout written by export_data")
+                    return
+                header = row
+                continue
+
+            values = dict(zip(header, row))
+            trial = int(values["trial"])
+            if trial <= trials:
+                continue
+            if trial != trials + 1:
+                raise RuntimeError(
+                    f"Error while reading session log: trial {trial} in {path} does not follow trial {trials}")
+            trials = trial
+            yield values
+
+
+def make_model(constants: Dict[str, float]) -> fm.FlippingModel:
+    """
+    Create a FlippingModel, with the given model constants replacing the defaults.
+    """
+    if not constants:
+        return fm.FlippingModel()
+
+    model_type = type("RescoringModel", (fm.FlippingModel,), constants)
+    return model_type()
+
+
+def rebuild_model(path: str, constants: Dict[str, float] = None) -> fm.FlippingModel:
+    """
+    Rebuild a model from a session log by registering its responses one by one.
+    """
+    model = make_model(constants)
+
+    for values in read_session_log(path):
+        fact_id = values["fact_id"]
+        flipped = values["flipped"] == "True"
+
+        # Facts are added in their original orientation and stored in the orientation in which they were presented
+        if fact_id not in model.fact_index:
+            question, answer = (values["answer"], values["question"]) if flipped else (
+                values["question"], values["answer"])
+            model.add_fact(fm.Fact(fact_id, question, answer))
+        position = model.fact_index[fact_id]
+        fact = model.facts[position]
+        if fact.flipped != flipped:
+            fact = fact._replace(question=fact.answer,
+                                 answer=fact.question, flipped=flipped)
+            model.facts[position] = fact
+
+        model.register_response(fm.Response(fact, float(values["start_time"]), float(
+            values["rt"]), values["correct"] == "True"))
+
+    return model
+
+
+def rescore_file(path: str, output: str, constants: Dict[str, float] = None) -> Tuple[str, int, float]:
+    """
+    Recompute the derived columns of a session log and write the result to `output`.
+    Returns the input path, the number of responses and the time it took.
+    """
+    start = time.perf_counter()
+    model = rebuild_model(path, constants)
+    model.export_data(output, backend="csv")
+    return path, len(model.responses), time.perf_counter() - start
+
+
+def find_session_logs(paths: List[str]) -> List[Path]:
+    """
+    Return the session logs among the given files and directories, skipping test result files.
+    """
+    logs = []
+    for path in map(Path, paths):
+        files = sorted(path.glob("*.csv")) if path.is_dir() else [path]
+        for file in files:
+            with open(file, encoding="utf-8") as f:
+                first = f.readline().strip().split(",")
+            if first == LOG_COLUMNS:
+                logs.append(file)
+    return logs
+
+
+def rescore(paths: List[str], output: str, constants: Dict[str, float] = None, workers: int = None) -> List[Tuple[str, int, float]]:
+    """
+    Rescore all session logs in the given files and directories across a process pool.
+    Each result is written to `output` under the name of its parent directory and file.
+    """
+    logs = find_session_logs(paths)
+    outputs = []
+    for log in logs:
+        target = Path(output) / log.parent.name / log.name
+        target.parent.mkdir(parents=True, exist_ok=True)
+        outputs.append(str(target))
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(rescore_file, map(str, logs), outputs, [constants] * len(logs)))
+
+
+def parse_constant(text: str) -> Tuple[str, float]:
+    name, value = text.split("=", 1)
+    if not hasattr(fm.FlippingModel, name.strip()):
+        raise argparse.ArgumentTypeError(f"Unknown model constant: {name}")
+    return name.strip(), float(value)
+
+
+parser = argparse.ArgumentParser(prog="Slimstampen rescoring",
+                                 description="rebuilds models from logged sessions and recomputes the alpha, activation, flip_alpha and flip_activation columns")
+parser.add_argument("paths", nargs="+",
+                    help="Session logs or directories containing them")
+parser.add_argument("--output", "-O", type=str, required=True,
+                    help="The directory the rescored logs are written to")
+parser.add_argument("--set", "-S", type=parse_constant, action="append", default=[], metavar="NAME=VALUE",
+                    help="Override a model constant, e.g. FORGET_THRESHOLD=-0.7. Can be given multiple times.")
+parser.add_argument("--workers", "-W", type=int,
+                    help="The number of worker processes (default: number of CPUs)")
+
+if __name__ == "__main__":
+
+    options = parser.parse_args()
+
+    start = time.perf_counter()
+    results = rescore(options.paths, options.output,
+                      dict(options.set), options.workers)
+
+    for path, count, duration in results:
+        print(f"{path}: {count} responses in {duration:.2f} s")
+    print(f"Rescored {len(results)} logs in {time.perf_counter() - start:.2f} s")
@@ -0,0 +1,81 @@
+"""responselog"""
+from array import array
+from collections import namedtuple
+from typing import Iterator, List, Union
+
+Response = namedtuple("Response", "fact, start_time, rt, correct")
+
+
+class ResponseLog(object):
+    """
+    Columnar store of the responses registered with a model.
+    Each response is kept as the index of its fact in the fact table, an orientation flag, the start time, the reaction time and whether it was correct.
+    The columns are typed arrays, which grow in amortised steps as responses are appended.
+    Indexing and iterating return Response objects, whose facts are rebuilt from the fact table in the orientation of the response.
+    """
+
+    def __init__(self):
+        # Fact table: the first version of each fact that was seen, and its version with question and answer swapped
+        self.facts = []
+        self.fact_ids = {}
+        self.swapped_facts = {}
+
+        # Response columns
+        self.fact_indices = array("q")
+        self.flipped = array("b")
+        self.start_times = array("d")
+        self.rts = array("d")
+        self.correct = array("b")
+
+    def __len__(self) -> int:
+        return len(self.start_times)
+
+    def __iter__(self) -> Iterator[Response]:
+        for row in range(len(self)):
+            yield self.get_response(row)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Response, List[Response]]:
+        if isinstance(index, slice):
+            return [self.get_response(row) for row in range(len(self))[index]]
+        return self.get_response(range(len(self))[index])
+
+    def __repr__(self) -> str:
+        return f"ResponseLog({list(self)!r})"
+
+    def index_fact(self, fact) -> int:
+        """
+        Return the index of a fact in the fact table, adding it if its ID is new.
+        """
+        index = self.fact_ids.get(fact.fact_id)
+        if index is None:
+            index = len(self.facts)
+            self.fact_ids[fact.fact_id] = index
+            self.facts.append(fact)
+        return index
+
+    def get_fact(self, index: int, flipped: bool):
+        """
+        Return the fact with the given index in the fact table, in the given orientation.
+        """
+        fact = self.facts[index]
+        if bool(getattr(fact, "flipped", False)) == bool(flipped):
+            return fact
+
+        if index not in self.swapped_facts:
+            self.swapped_facts[index] = fact._replace(
+                question=fact.answer, answer=fact.question, flipped=not fact.flipped)
+        return self.swapped_facts[index]
+
+    def append(self, response: Response) -> int:
+        """
+        Add a response to the log and return its row number.
+        """
+        self.fact_indices.append(self.index_fact(response.fact))
+        self.flipped.append(bool(getattr(response.fact, "flipped", False)))
+        self.start_times.append(response.start_time)
+        self.rts.append(response.rt)
+        self.correct.append(bool(response.correct))
+        return len(self.start_times) - 1
+
+    def get_response(self, row: int) -> Response:
+        return Response(self.get_fact(self.fact_indices[row], self.flipped[row]), self.start_times[row], self.rts[row], bool(self.correct[row]))
@@ -0,0 +1,311 @@
+"""server"""
+import argparse
+import asyncio
+import csv
+import json
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List
+import slimstampen.flippingmodel as fm
+import slimstampen.spacingmodel as sm
+
+
+class SessionNotFound(KeyError):
+    pass
+
+
+class Session(object):
+    """
+    A learner model hosted by the SessionHost, together with its lock and bookkeeping.
+    """
+
+    def __init__(self, model: sm.SpacingModel, use_flipping: bool):
+        self.model = model
+        self.use_flipping = use_flipping
+        self.lock = asyncio.Lock()
+        self.created = time.monotonic()
+        self.last_used = self.created
+
+    def now(self) -> int:
+        """
+        Return the time in milliseconds since the session was created.
+        """
+        return int((time.monotonic() - self.created) * 1000)
+
+
+class SessionHost(object):
+    """
+    Hosts many learner models in one process.
+    Model operations run in a thread pool under a per-session lock, and each request is answered within the latency budget or fails with a timeout.
+    Sessions that have been idle for longer than `idle_timeout` seconds, or the least recently used ones beyond `max_sessions`, are evicted.
+    """
+
+    def __init__(self, decks: Dict[str, List[List[str]]], max_sessions: int = 10000, idle_timeout: float = 1800, latency_budget: float = 0.05, workers: int = 4):
+        self.decks = decks
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.latency_budget = latency_budget
+        self.sessions = OrderedDict()
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.stats = {"created": 0, "evicted": 0,
+                      "requests": 0, "over_budget": 0}
+
+    def create_session(self, deck: str, use_flipping: bool = True, use_forgetting_queue: bool = False) -> str:
+        """
+        Create a new learner model for one of the decks and return its session ID.
+        """
+        if deck not in self.decks:
+            raise SessionNotFound(f"Unknown deck: {deck}")
+
+        model = (fm.FlippingModel if use_flipping else sm.SpacingModel)(
+            use_forgetting_queue)
+        model.load_facts(self.decks[deck])
+
+        session_id = uuid.uuid4().hex
+        self.sessions[session_id] = Session(model, use_flipping)
+        self.stats["created"] += 1
+        self.evict()
+        return session_id
+
+    def close_session(self, session_id: str) -> None:
+        self.get_session(session_id)
+        del self.sessions[session_id]
+
+    def get_session(self, session_id: str) -> Session:
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise SessionNotFound(f"Unknown session: {session_id}")
+
+        session.last_used = time.monotonic()
+        self.sessions.move_to_end(session_id)
+        return session
+
+    def evict(self) -> None:
+        """
+        Remove idle sessions and, if there are still too many, the least recently used ones.
+        """
+        deadline = time.monotonic() - self.idle_timeout
+        while self.sessions:
+            session_id, session = next(iter(self.sessions.items()))
+            if session.last_used >= deadline and len(self.sessions) <= self.max_sessions:
+                break
+            del self.sessions[session_id]
+            self.stats["evicted"] += 1
+
+    async def run(self, session_id: str, operation: Callable[[Session], object]):
+        """
+        Run an operation on the model of a session within the latency budget, which includes the wait for the session lock.
+        An operation that has started still completes when the budget is exceeded, and the session stays locked until it has. A timeout therefore means that the result is unknown, not that the operation was not applied.
+        """
+        session = self.get_session(session_id)
+        self.stats["requests"] += 1
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.latency_budget
+
+        acquire = asyncio.ensure_future(session.lock.acquire())
+        await asyncio.wait({acquire}, timeout=self.latency_budget)
+        if not acquire.done():
+            # The lock is released again if it was acquired in the meantime
+            acquire.add_done_callback(
+                lambda f: session.lock.release() if not f.cancelled() else None)
+            acquire.cancel()
+            self.stats["over_budget"] += 1
+            raise asyncio.TimeoutError
+
+        future = loop.run_in_executor(self.executor, operation, session)
+        future.add_done_callback(lambda _: session.lock.release())
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), max(deadline - loop.time(), 0))
+        except asyncio.TimeoutError:
+            self.stats["over_budget"] += 1
+            raise
+
+    async def next_fact(self, session_id: str, current_time: int = None) -> dict:
+        """
+        Return the next fact to present in a session.
+        """
+        def operation(session):
+            now = session.now() if current_time is None else current_time
+            if session.use_flipping:
+                fact, new = session.model.get_next_fact(now, use_flipping=True)
+            else:
+                fact, new = session.model.get_next_fact(now)
+            return dict(fact._asdict(), new=new, time=now)
+
+        return await self.run(session_id, operation)
+
+    async def submit_response(self, session_id: str, fact_id, start_time: float, rt: float, correct: bool) -> None:
+        """
+        Register a response to a fact, in the orientation in which it was presented last.
+        Submitting a response to the same fact with the same start time again has no effect, so that a request that timed out can be retried.
+        """
+        def operation(session):
+            model = session.model
+            if fact_id not in model.fact_index:
+                raise SessionNotFound(f"Unknown fact: {fact_id}")
+            if any(model.responses.start_times[row] == start_time for row in model.response_rows.get(fact_id, ())):
+                return
+            fact = model.facts[model.fact_index[fact_id]]
+            model.register_response(sm.Response(
+                fact, start_time, rt, bool(correct)))
+
+        await self.run(session_id, operation)
+
+    async def export(self, session_id: str) -> str:
+        """
+        Return the response data of a session in CSV format.
+        """
+        return await self.run(session_id, lambda session: session.model.export_data(backend="csv"))
+
+    async def evict_periodically(self, interval: float = 10) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            self.evict()
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found",
+           405: "Method Not Allowed", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+async def handle_request(host: SessionHost, method: str, path: str, body: dict):
+    """
+    Dispatch a request to the session host and return the response body.
+
+    POST /sessions                      {"deck", "flipping", "forgetting_queue"} -> {"session"}
+    POST /sessions/<id>/next            {"time"} -> fact
+    POST /sessions/<id>/responses       {"fact_id", "start_time", "rt", "correct"}
+    GET /sessions/<id>/export           -> CSV
+    DELETE /sessions/<id>
+    GET /stats
+    """
+    parts = [p for p in path.split("/") if p]
+
+    if parts == ["stats"] and method == "GET":
+        return dict(host.stats, sessions=len(host.sessions))
+
+    if parts == ["sessions"] and method == "POST":
+        return {"session": host.create_session(body.get("deck", next(iter(host.decks))), body.get("flipping", True), body.get("forgetting_queue", False))}
+
+    if len(parts) < 2 or parts[0] != "sessions":
+        raise HTTPError(404, f"Unknown path: {path}")
+
+    session_id = parts[1]
+    action = (method, parts[2] if len(parts) > 2 else None)
+
+    if action == ("POST", "next"):
+        return await host.next_fact(session_id, body.get("time"))
+    if action == ("POST", "responses"):
+        await host.submit_response(session_id, body["fact_id"], body["start_time"], body["rt"], body["correct"])
+        return {}
+    if action == ("GET", "export"):
+        return await host.export(session_id)
+    if action == ("DELETE", None):
+        host.close_session(session_id)
+        return {}
+
+    raise HTTPError(405, f"Unsupported request: {method} {path}")
+
+
+async def serve_connection(host: SessionHost, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """
+    Serve HTTP/1.1 requests with JSON bodies on a keep-alive connection.
+    """
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            method, path, _ = request_line.decode("latin-1").split(" ", 2)
+
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line:
+                    break
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+
+            data = await reader.readexactly(int(headers.get("content-length", 0)))
+
+            status = 200
+            try:
+                result = await handle_request(host, method, path, json.loads(data) if data else {})
+            except HTTPError as e:
+                status, result = e.status, {"error": str(e)}
+            except SessionNotFound as e:
+                status, result = 404, {"error": str(e.args[0])}
+            except asyncio.TimeoutError:
+                status, result = 503, {"error": "Latency budget exceeded"}
+            except (KeyError, ValueError, RuntimeError) as e:
+                status, result = 400, {"error": str(e)}
+            except Exception as e:
+                status, result = 500, {"error": f"{type(e).__name__}: {e}"}
+
+            if isinstance(result, str):
+                content_type, payload = "text/csv", result.encode("utf-8")
+            else:
+                content_type, payload = "application/json", json.dumps(
+                    result).encode("utf-8")
+
+            writer.write(
+                f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: {content_type}\r\nContent-Length: {len(payload)}\r\n\r\n".encode("latin-1") + payload)
+            await writer.drain()
+
+            if headers.get("connection", "").lower() == "close":
+                break
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+def load_deck(path: str) -> List[List[str]]:
+    with open(path, encoding="utf-8") as file:
+        return [row for row in csv.reader(file)]
+
+
+async def serve(host: SessionHost, address: str, port: int) -> None:
+    server = await asyncio.start_server(lambda r, w: serve_connection(host, r, w), address, port)
+    eviction = asyncio.create_task(host.evict_periodically())
+    print(f"Serving {len(host.decks)} deck(s) on http://{address}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        eviction.cancel()
+
+
+parser = argparse.ArgumentParser(prog="Slimstampen session server",
+                                 description="hosts many slimstampen learner models in one process behind a small HTTP/JSON interface")
+parser.add_argument("--deck", "-F", type=str, action="append", required=True,
+                    help="Path to a csv file with facts; the file name without extension is the deck name. Can be given multiple times.")
+parser.add_argument("--address", type=str, default="127.0.0.1",
+                    help="The address to listen on (default: 127.0.0.1)")
+parser.add_argument("--port", "-P", type=int, default=8080,
+                    help="The port to listen on (default: 8080)")
+parser.add_argument("--max-sessions", type=int, default=10000,
+                    help="The maximal number of sessions kept in memory (default: 10000)")
+parser.add_argument("--idle-timeout", type=float, default=1800,
+                    help="Seconds after which an idle session is evicted (default: 1800)")
+parser.add_argument("--budget", type=float, default=50,
+                    help="Latency budget per request in milliseconds (default: 50)")
+
+if __name__ == "__main__":
+
+    options = parser.parse_args()
+
+    decks = {Path(path).stem: load_deck(path) for path in options.deck}
+    session_host = SessionHost(decks, options.max_sessions,
+                               options.idle_timeout, options.budget / 1000)
+
+    asyncio.run(serve(session_host, options.address, options.port))
@@ -0,0 +1,204 @@
+"""simulator"""
+import argparse
+import csv
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Tuple
+import numpy as np
+import slimstampen.spacingmodel as sp
+import slimstampen.flippingmodel as fm
+
+
+class SyntheticLearners(object):
+    """
+    Ground-truth learners following the same activation equations as the spacing model, one row per learner.
+    Every fact has a true rate of forgetting per learner, each encounter decays with C * exp(activation) + alpha, and reaction times follow estimate_reaction_time_from_activation with log-normal noise.
+    A fact is recalled with a probability that increases logistically with its activation around `retrieval_threshold`.
+    """
+
+    def __init__(self, learners: int, facts: int, rng: np.random.Generator, alpha_mean: float = 0.3, alpha_sd: float = 0.08, retrieval_threshold: float = -0.8, retrieval_noise: float = 0.25, rt_noise: float = 0.3, flip_penalty: float = 0.2, study_accuracy: float = 0.95, C: float = sp.SpacingModel.C, F: float = sp.SpacingModel.F):
+        self.rng = rng
+        self.alphas = np.clip(rng.normal(
+            alpha_mean, alpha_sd, (learners, facts)), 0.05, 1.0)
+        self.retrieval_threshold = retrieval_threshold
+        self.retrieval_noise = retrieval_noise
+        self.rt_noise = rt_noise
+        self.flip_penalty = flip_penalty
+        self.study_accuracy = study_accuracy
+        self.C = C
+        self.F = F
+
+        # Encounters per learner and fact, padded to a common capacity
+        self.times = np.zeros((learners, facts, 4))
+        self.decays = np.zeros((learners, facts, 4))
+        self.counts = np.zeros((learners, facts), dtype=np.int64)
+
+    def calculate_activations(self, learners: np.ndarray, positions: np.ndarray, times: np.ndarray) -> np.ndarray:
+        """
+        Return the true activation of one fact per learner at the given times.
+        """
+        encounter_times = self.times[learners, positions]
+        decays = self.decays[learners, positions]
+        elapsed = (times[:, None] - encounter_times) / 1000
+        mask = (np.arange(encounter_times.shape[1]) < self.counts[learners, positions, None]) & (
+            elapsed > 0)
+
+        terms = np.power(np.where(mask, elapsed, 1.0), -decays)
+        with np.errstate(divide="ignore"):
+            return np.log(np.where(mask, terms, 0.0).sum(axis=1))
+
+    def respond(self, activations: np.ndarray, reading_times: np.ndarray, new: np.ndarray, flipped: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return the reaction times in milliseconds and the correctness of the responses to facts with the given activations.
+        New facts are shown together with their answer, so they are copied correctly with probability `study_accuracy`.
+        """
+        rng = self.rng
+        activations = activations - self.flip_penalty * flipped
+
+        with np.errstate(over="ignore"):
+            recall = 1 / (1 + np.exp(-(activations - self.retrieval_threshold) / self.retrieval_noise))
+        recall = np.where(new, self.study_accuracy, recall)
+        correct = rng.random(len(activations)) < recall
+
+        # Failed retrievals take as long as a retrieval at the threshold, new facts as long as a well-known fact
+        activations = np.where(correct, activations, self.retrieval_threshold)
+        activations = np.where(new, 0.0, activations)
+        rts = (self.F * np.exp(-activations) + reading_times / 1000) * 1000
+        rts *= rng.lognormal(0.0, self.rt_noise, len(rts))
+
+        return np.maximum(np.rint(rts), 1), correct
+
+    def add_encounters(self, learners: np.ndarray, positions: np.ndarray, times: np.ndarray, activations: np.ndarray) -> None:
+        counts = self.counts[learners, positions]
+        if counts.max(initial=0) >= self.times.shape[2]:
+            padding = ((0, 0), (0, 0), (0, self.times.shape[2]))
+            self.times = np.pad(self.times, padding)
+            self.decays = np.pad(self.decays, padding)
+
+        with np.errstate(over="ignore"):
+            decays = self.C * np.exp(activations) + \
+                self.alphas[learners, positions]
+        self.times[learners, positions, counts] = times
+        self.decays[learners, positions, counts] = decays
+        self.counts[learners, positions] += 1
+
+
+def load_deck(path: str) -> List[List[str]]:
+    with open(path, encoding="utf-8") as file:
+        return [row[:3] for row in csv.reader(file) if row]
+
+
+def simulate_sessions(deck: list, learners: int, trials: int, seed=0, flipping: bool = True, use_forgetting_queue: bool = False, **learner_options) -> Tuple[List[sp.SpacingModel], SyntheticLearners]:
+    """
+    Simulate `trials` trials for a group of learners studying the same deck of facts or CSV rows, each with their own model.
+    All learners advance one trial at a time, so that the ground-truth responses are computed for the whole group at once.
+    Returns the models and the ground-truth learners.
+    """
+    rng = np.random.default_rng(seed)
+    population = SyntheticLearners(learners, len(deck), rng, **learner_options)
+
+    models = []
+    for _ in range(learners):
+        model = fm.FlippingModel(
+            use_forgetting_queue) if flipping else sp.SpacingModel(use_forgetting_queue)
+        model.load_facts(deck)
+        models.append(model)
+
+    everyone = np.arange(learners)
+    clock = np.zeros(learners)
+    for _ in range(trials):
+        chosen = [model.get_next_fact(t) for (model, t) in zip(models, clock)]
+        facts = [fact for (fact, _) in chosen]
+        new = np.array([n for (_, n) in chosen])
+        positions = np.array([model.fact_index[fact.fact_id]
+                             for (model, fact) in zip(models, facts)])
+        flipped = np.array([bool(getattr(fact, "flipped", False))
+                           for fact in facts])
+        reading_times = np.array([model.get_fact_timing(
+            fact.question)[0] for (model, fact) in zip(models, facts)])
+
+        activations = population.calculate_activations(
+            everyone, positions, clock)
+        rts, correct = population.respond(
+            activations, reading_times, new, flipped)
+        population.add_encounters(everyone, positions, clock, activations)
+
+        for (model, fact, start_time, rt, c) in zip(models, facts, clock, rts, correct):
+            model.register_response(
+                sp.Response(fact, int(start_time), int(rt), bool(c)))
+
+        # Incorrect answers are followed by feedback, all trials by a short pause
+        clock += rts + rng.uniform(300, 1000, learners) + \
+            np.where(correct, 0, 2000)
+
+    return models, population
+
+
+def simulate_batch(deck_path: str, output: str, first: int, learners: int, trials: int, seed: int, flipping: bool, use_forgetting_queue: bool) -> Tuple[int, float]:
+    """
+    Simulate a batch of learners and write the session log of each learner to `output`, together with their true rates of forgetting.
+    Returns the number of simulated trials and the time it took.
+    """
+    start = time.perf_counter()
+    deck = load_deck(deck_path)
+    models, population = simulate_sessions(
+        deck, learners, trials, [seed, first], flipping, use_forgetting_queue)
+
+    for i, model in enumerate(models):
+        model.export_data(str(Path(output) / f"learner_{first + i}.csv"), backend="csv")
+
+    with open(Path(output) / f"learner_{first}-{first + learners - 1}_alphas.csv", "w", encoding="utf-8", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["learner", "fact_id", "alpha"])
+        for i in range(learners):
+            for fact, alpha in zip(models[i].facts, population.alphas[i]):
+                writer.writerow([first + i, fact.fact_id, alpha])
+
+    return learners * trials, time.perf_counter() - start
+
+
+def simulate(deck_path: str, output: str, learners: int, trials: int, seed: int = 0, flipping: bool = True, use_forgetting_queue: bool = False, batch_size: int = 50, workers: int = None) -> List[Tuple[int, float]]:
+    """
+    Simulate many learners in batches spread over a process pool.
+    """
+    Path(output).mkdir(parents=True, exist_ok=True)
+    firsts = list(range(0, learners, batch_size))
+    sizes = [min(batch_size, learners - first) for first in firsts]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(simulate_batch, [deck_path] * len(firsts), [output] * len(firsts), firsts, sizes, [trials] * len(firsts), [seed] * len(firsts), [flipping] * len(firsts), [use_forgetting_queue] * len(firsts)))
+
+
+parser = argparse.ArgumentParser(prog="Slimstampen simulator",
+                                 description="simulates learners with known rates of forgetting studying with the slimstampen model and writes their session logs")
+parser.add_argument("--file", "-F", type=str, required=True,
+                    help="The path to the csv file that will be used to generate the facts")
+parser.add_argument("--output", "-O", type=str, required=True,
+                    help="The directory the session logs are written to")
+parser.add_argument("--learners", "-N", type=int, default=100,
+                    help="The number of simulated learners (default: 100)")
+parser.add_argument("--trials", "-R", type=int, default=200,
+                    help="The number of trials per learner (default: 200)")
+parser.add_argument("--batch-size", "-B", type=int, default=50,
+                    help="The number of learners simulated together in one process (default: 50)")
+parser.add_argument("--workers", "-W", type=int,
+                    help="The number of worker processes (default: number of CPUs)")
+parser.add_argument("--no-flipping", action="store_true",
+                    help="Use the basic spacing model instead of the flipping model")
+parser.add_argument("--forgetting-queue", action="store_true",
+                    help="Schedule facts with the forgetting queue")
+parser.add_argument("--seed", type=int, default=0,
+                    help="Seed for the simulated learners (default: 0)")
+
+if __name__ == "__main__":
+
+    options = parser.parse_args()
+
+    start = time.perf_counter()
+    results = simulate(options.file, options.output, options.learners, options.trials, options.seed,
+                       not options.no_flipping, options.forgetting_queue, options.batch_size, options.workers)
+
+    total = sum(count for (count, _) in results)
+    duration = time.perf_counter() - start
+    print(f"Simulated {total} trials of {options.learners} learners in {duration:.2f} s ({total / duration:.0f} trials/s)")
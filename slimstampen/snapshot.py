@@ -0,0 +1,287 @@
+"""snapshot"""
+import importlib
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections import namedtuple
+from typing import Iterator, Tuple
+import slimstampen.spacingmodel as sm
+
+MAGIC = b"SLIMSNAP"
+VERSION = 2
+HEADER = struct.Struct("<8sII")
+
+JOURNAL_MAGIC = b"SLIMJRNL"
+JOURNAL_HEADER = struct.Struct("<8sQ")
+JOURNAL_RECORD = struct.Struct("<q?dd?")
+
+
+def encode_key(key):
+    return list(key) if isinstance(key, tuple) else key
+
+
+def decode_key(key):
+    return tuple(key) if isinstance(key, list) else key
+
+
+def save_snapshot(model: sm.SpacingModel, path: str) -> None:
+    """
+    Save the facts, the response log and the derived learner states of a model to a binary snapshot file.
+    The file starts with a JSON header describing the model and the location of each array; the arrays follow as raw little-endian data aligned to 8 bytes, so that they can be used directly from a memory map.
+    """
+    if model.activation_epsilon is not None:
+        raise RuntimeError(
+            "Error while saving snapshot: models in the bounded activation mode cannot be saved")
+
+    log = model.responses
+    sections = [("fact_indices", log.fact_indices), ("flipped", log.flipped), ("start_times", log.start_times),
+                ("rts", log.rts), ("correct", log.correct)]
+
+    engines = {}
+    for name, engine in vars(model).items():
+        if not isinstance(engine, sm.ReplayEngine):
+            continue
+
+        keys = []
+        for key, state in engine.states.items():
+            keys.append([encode_key(key), len(state.times), len(engine.rows[key]),
+                         state.alpha, state.default_alpha, state.last_time, len(engine.alphas.get(key, ()))])
+        engines[name] = keys
+
+        for field in ("times", "activations", "reaction_times", "decays"):
+            sections.append((f"{name}.{field}", array(
+                "d", [v for state in engine.states.values() for v in getattr(state, field)])))
+        sections.append((f"{name}.rows", array(
+            "q", [row for rows in engine.rows.values() for row in rows])))
+        sections.append((f"{name}.alphas", array(
+            "d", [alpha for key in engine.states for alpha in engine.alphas.get(key, ())])))
+
+    meta = {
+        "model": f"{type(model).__module__}:{type(model).__qualname__}",
+        "use_forgetting_queue": model.forgetting_queue is not None,
+        "facts": [[list(f._fields), list(f)] for f in model.facts],
+        "log_facts": [[list(f._fields), list(f)] for f in log.facts],
+        "engines": engines,
+        "sections": {},
+    }
+
+    # Section offsets are relative to the start of the data, which follows the header at the next multiple of 8 bytes
+    offset = 0
+    for name, values in sections:
+        meta["sections"][name] = [values.typecode, offset, len(values)]
+        offset += (len(values) * values.itemsize + 7) // 8 * 8
+    header = json.dumps(meta).encode("utf-8")
+    data_start = (HEADER.size + len(header) + 7) // 8 * 8
+
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, len(header)))
+        file.write(header)
+        for name, values in sections:
+            file.seek(data_start + meta["sections"][name][1])
+            if sys.byteorder == "big":
+                values = array(values.typecode, values)
+                values.byteswap()
+            file.write(values.tobytes())
+        file.truncate(data_start + offset)
+
+
+class Snapshot(object):
+    """
+    A snapshot file opened as a read-only memory map.
+    The arrays can be inspected without copying through `column`, and `restore` builds a model from them.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, length = HEADER.unpack_from(self.map)
+        if magic != MAGIC:
+            raise RuntimeError(
+                f"Error while loading snapshot: {path} is not a snapshot file")
+        if version != VERSION:
+            raise RuntimeError(
+                f"Error while loading snapshot: {path} is a version {version} snapshot file, but only version {VERSION} can be loaded")
+        self.meta = json.loads(
+            bytes(self.map[HEADER.size:HEADER.size + length]))
+        self.data_start = (HEADER.size + length + 7) // 8 * 8
+
+    def column(self, name: str) -> memoryview:
+        """
+        Return a memoryview on one of the arrays in the file.
+        """
+        typecode, offset, count = self.meta["sections"][name]
+        start = self.data_start + offset
+        return memoryview(self.map)[start:start + count * array(typecode).itemsize].cast(typecode)
+
+    def copy_column(self, name: str) -> array:
+        values = array(self.meta["sections"][name][0])
+        with self.column(name) as view:
+            values.frombytes(view.cast("B"))
+        if sys.byteorder == "big":
+            values.byteswap()
+        return values
+
+    def close(self) -> None:
+        self.map.close()
+
+    def restore(self) -> sm.SpacingModel:
+        """
+        Build a model from the snapshot, without re-estimating any learner state.
+        """
+        module_name, class_name = self.meta["model"].split(":")
+        module = importlib.import_module(module_name)
+        model = getattr(module, class_name)(self.meta["use_forgetting_queue"])
+
+        def make_fact(fields, values):
+            for fact_type in (getattr(module, "Fact", sm.Fact), sm.Fact):
+                if tuple(fields) == fact_type._fields:
+                    return fact_type(*values)
+            return namedtuple("Fact", fields)(*values)
+
+        # Response log
+        log = model.responses
+        for fields, values in self.meta["log_facts"]:
+            log.index_fact(make_fact(fields, values))
+        for name in ("fact_indices", "flipped", "start_times", "rts", "correct"):
+            setattr(log, name, self.copy_column(name))
+        model.start_times = set(log.start_times)
+        model.latest_start_time = max(log.start_times, default=-float("inf"))
+
+        # Learner states
+        for name, keys in self.meta["engines"].items():
+            engine = getattr(model, name)
+            columns = {field: self.copy_column(f"{name}.{field}").tolist()
+                       for field in ("times", "activations", "reaction_times", "decays")}
+            rows = self.copy_column(f"{name}.rows")
+            alphas = self.copy_column(f"{name}.alphas")
+
+            encounter_offset = 0
+            row_offset = 0
+            alpha_offset = 0
+            for key, encounters, row_count, alpha, default_alpha, last_time, alpha_count in keys:
+                state = sm.FactState(default_alpha)
+                for field, values in columns.items():
+                    setattr(state, field, values[encounter_offset:encounter_offset + encounters])
+                state.alpha = alpha
+                state.last_time = last_time
+                engine.states[decode_key(key)] = state
+                engine.rows[decode_key(key)] = rows[row_offset:row_offset + row_count]
+
+                # States whose responses did not arrive in chronological order have no alpha history, and are replayed for historical queries
+                engine.alphas.pop(decode_key(key), None)
+                if alpha_count == encounters:
+                    engine.alphas[decode_key(key)] = alphas[alpha_offset:alpha_offset + encounters]
+                encounter_offset += encounters
+                row_offset += row_count
+                alpha_offset += alpha_count
+
+        # Facts, which also puts the studied facts back into the schedule
+        model.load_facts(make_fact(fields, values)
+                         for (fields, values) in self.meta["facts"])
+
+        return model
+
+
+def load_snapshot(path: str) -> sm.SpacingModel:
+    """
+    Restore a model from a snapshot file.
+    """
+    snapshot = Snapshot(path)
+    try:
+        return snapshot.restore()
+    finally:
+        snapshot.close()
+
+
+class ResponseJournal(object):
+    """
+    Append-only binary journal of the responses registered with a model.
+    Each record holds the position of the fact in the fact list, its orientation, the start time, the reaction time and whether the response was correct.
+    The header stores the number of responses that preceded the first record, so that a journal can be restarted after each snapshot.
+    """
+
+    def __init__(self, path: str, base: int = 0, fsync: bool = False):
+        self.path = path
+        self.fsync = fsync
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+
+        # Drop an incomplete record at the end, so that new records are appended at a record boundary
+        if exists:
+            size = os.path.getsize(path)
+            complete = JOURNAL_HEADER.size + \
+                (size - JOURNAL_HEADER.size) // JOURNAL_RECORD.size * JOURNAL_RECORD.size
+            if complete < size:
+                os.truncate(path, complete)
+
+        self.file = open(path, "ab")
+        if not exists:
+            self.file.write(JOURNAL_HEADER.pack(JOURNAL_MAGIC, base))
+            self.flush()
+
+    def append(self, position: int, flipped: bool, start_time: float, rt: float, correct: bool) -> None:
+        self.file.write(JOURNAL_RECORD.pack(
+            position, flipped, start_time, rt, correct))
+        self.flush()
+
+    def flush(self) -> None:
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def read_journal(path: str, start: int = 0) -> Iterator[Tuple[int, bool, float, float, bool]]:
+    """
+    Yield the journal records of the responses with number `start` and higher.
+    An incomplete record at the end, e.g. after a crash, is ignored.
+    """
+    with open(path, "rb") as file:
+        magic, base = JOURNAL_HEADER.unpack(file.read(JOURNAL_HEADER.size))
+        if magic != JOURNAL_MAGIC:
+            raise RuntimeError(
+                f"Error while reading journal: {path} is not a journal file")
+        if start < base:
+            raise RuntimeError(
+                f"Error while reading journal: {path} starts at response {base}, but response {start} was requested")
+
+        file.seek(JOURNAL_HEADER.size + (start - base) * JOURNAL_RECORD.size)
+        while True:
+            record = file.read(JOURNAL_RECORD.size)
+            if len(record) < JOURNAL_RECORD.size:
+                return
+            yield JOURNAL_RECORD.unpack(record)
+
+
+def restore(snapshot_path: str, journal_path: str = None) -> sm.SpacingModel:
+    """
+    Restore a model from a snapshot and replay the responses from the journal that are not in the snapshot yet.
+    If a journal is given, it is attached to the restored model so that new responses are appended to it.
+    """
+    model = load_snapshot(snapshot_path)
+
+    if journal_path is not None:
+        if os.path.exists(journal_path):
+            for position, flipped, start_time, rt, correct in read_journal(journal_path, len(model.responses)):
+                # The fact was stored in the orientation in which it was presented
+                fact = orient(model.facts[position], flipped)
+                model.facts[position] = fact
+                model.register_response(
+                    sm.Response(fact, start_time, rt, correct))
+        model.journal = ResponseJournal(journal_path, len(model.responses))
+
+    return model
+
+
+def orient(fact, flipped: bool):
+    """
+    Return a fact in the given orientation.
+    """
+    if bool(getattr(fact, "flipped", False)) == bool(flipped):
+        return fact
+    return fact._replace(question=fact.answer, answer=fact.question, flipped=bool(flipped))
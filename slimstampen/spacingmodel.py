@@ -1,15 +1,264 @@
 """spacingmodel"""
 from __future__ import division
+from array import array
+import bisect
 from collections import namedtuple
-from typing import Tuple, List, Union
+from typing import Callable, Dict, Iterable, Tuple, List, Union
+import csv
 import math
-import pandas as pd
+import os
+import numpy as np
+from slimstampen.activationtable import ActivationTable
+from slimstampen.exportwriter import CSVExportWriter, ColumnarExportWriter, ExportWriter, EXPORT_BACKENDS, EXPORT_WRITERS, read_export_values, to_frame
+from slimstampen.forgettingqueue import ForgettingQueue
+import slimstampen.alphaestimator as ae
+import slimstampen.encountersummary as es
+from slimstampen.responselog import Response, ResponseLog
 
 
 Fact = namedtuple("Fact", "fact_id, question, answer")
-Response = namedtuple("Response", "fact, start_time, rt, correct")
 Encounter = namedtuple("Encounter", "activation, time, reaction_time, decay")
 
+# A presentation planned by plan_next: the fact as it would be shown, whether it is new, when it is shown, its activation at that time and whether it was flipped for it
+PlannedTrial = namedtuple(
+    "PlannedTrial", "fact, new, start_time, activation, flipped")
+
+
+class FactState(object):
+    """
+    The learner state of a single fact: its encounters and the current rate of forgetting estimate
+    The encounters are stored as separate lists of times, activations, normalised reaction times and decays.
+    """
+
+    def __init__(self, alpha: float):
+        self.default_alpha = alpha
+        self.times = []
+        self.activations = []
+        self.reaction_times = []
+        self.decays = []
+        self.alpha = alpha
+        self.last_time = -float("inf")
+
+        # In the bounded activation mode, the number of encounters each entry stands for, and a summary of each entry of merged encounters, which come first
+        self.weights = None
+        self.summary = None
+
+    @property
+    def encounters(self) -> List[Encounter]:
+        return [Encounter(*e) for e in zip(self.activations, self.times, self.reaction_times, self.decays)]
+
+    def copy(self) -> "FactState":
+        state = FactState(self.default_alpha)
+        state.times = list(self.times)
+        state.activations = list(self.activations)
+        state.reaction_times = list(self.reaction_times)
+        state.decays = list(self.decays)
+        state.alpha = self.alpha
+        state.last_time = self.last_time
+        state.weights = None if self.weights is None else list(self.weights)
+        state.summary = None if self.summary is None else list(self.summary)
+        return state
+
+
+class ReplayEngine(object):
+    """
+    Keeps an incrementally updated learner state for each key of the registered responses, e.g. per fact or per fact and orientation.
+    The default alpha determines which set of model constants the states start from.
+    The rows of the responses refer to the model's response log, unless the engine is given a response log of its own.
+    """
+
+    def __init__(self, model: "SpacingModel", default_alpha: float, key: Callable[[Response], object], responses: ResponseLog = None):
+        self.model = model
+        self.default_alpha = default_alpha
+        self.key = key
+        self.responses = responses
+        self.states = {}
+        self.rows = {}
+
+        # Rate of forgetting after each encounter per key, kept as long as the responses of the key arrive in chronological order
+        self.alphas = {}
+
+        # Looked up on the instance, so that they can be wrapped, see slimstampen.instrumentation
+        self.estimate_alpha = ae.estimate_alpha
+        self.calculate_predicted_reaction_time_error = ae.calculate_predicted_reaction_time_error
+
+        # Largest possible activation error at the start of a response in the bounded activation mode
+        self.max_error_bound = 0.0
+
+    def register_response(self, response: Response, row: int) -> FactState:
+        """
+        Add a response, stored at the given row of the response log, to the state of its key and return the updated state.
+        """
+        key = self.key(response)
+        if key not in self.states:
+            self.states[key] = FactState(self.default_alpha)
+            self.rows[key] = array("q")
+            if self.model.activation_epsilon is None:
+                self.alphas[key] = array("d")
+        state = self.states[key]
+
+        # The stored encounters are only a history of the key if they are in chronological order
+        if key in self.alphas and response.start_time < state.last_time:
+            del self.alphas[key]
+
+        self.rows[key].append(row)
+        self.update_state(state, response)
+        if key in self.alphas:
+            self.alphas[key].append(state.alpha)
+        return state
+
+    def get_state(self, time: float, key) -> FactState:
+        """
+        Return the state of a key, based on all its responses that occurred before the specified time.
+        The incrementally maintained state is used whenever it covers exactly those responses, otherwise the state is rebuilt from the responses.
+        """
+        state = self.states.get(key)
+
+        if state is None:
+            return FactState(self.default_alpha)
+
+        if state.last_time < time:
+            return state
+
+        if key in self.alphas:
+            return self.get_checkpoint(time, key)
+
+        return self.replay_state(time, key)
+
+    def get_checkpoint(self, time: float, key) -> FactState:
+        """
+        Return the state of a key before the specified time from its stored history, without replaying its responses.
+        The encounters before that time are located by bisection, and the decays follow from their activations and the rate of forgetting after the last of them.
+        """
+        state = self.states[key]
+        count = bisect.bisect_left(state.times, time)
+
+        checkpoint = FactState(self.default_alpha)
+        if count == 0:
+            return checkpoint
+
+        checkpoint.times = state.times[:count]
+        checkpoint.activations = state.activations[:count]
+        checkpoint.reaction_times = state.reaction_times[:count]
+        checkpoint.alpha = self.alphas[key][count - 1]
+        checkpoint.decays = [self.model.calculate_decay(
+            a, checkpoint.alpha) for a in checkpoint.activations]
+        checkpoint.last_time = checkpoint.times[-1]
+        return checkpoint
+
+    def replay_state(self, time: float, key) -> FactState:
+        """
+        Rebuild the state of a key by running through the sequence of its responses before the specified time.
+        """
+        state = FactState(self.default_alpha)
+        log = self.responses if self.responses is not None else self.model.responses
+
+        for row in self.rows.get(key, []):
+            if log.start_times[row] < time:
+                self.update_state(state, log.get_response(row))
+
+        return state
+
+    def update_state(self, state: FactState, response: Response) -> None:
+        """
+        Add a response to a state and update the alpha and decay estimates.
+        """
+        model = self.model
+        activation = ae.calculate_activation(
+            state.times, state.decays, response.start_time, state.weights)
+        if state.summary is not None:
+            self.max_error_bound = max(
+                self.max_error_bound, es.error_bound(state, response.start_time))
+        reaction_time = model.normalise_reaction_time(response)
+        state.times.append(response.start_time)
+        state.activations.append(activation)
+        state.reaction_times.append(reaction_time)
+        state.decays.append(state.default_alpha)
+        if state.weights is not None:
+            state.weights.append(1.0)
+        state.alpha = self.estimate_alpha(state.times, state.decays, state.reaction_times, activation, reaction_time, model.get_fact_timing(
+            response.fact.question)[0], state.alpha, state.default_alpha, model.estimate_reaction_time_from_activation, state.weights, self.calculate_predicted_reaction_time_error)
+
+        # Update decay estimates of previous encounters
+        state.decays = [model.calculate_decay(
+            a, state.alpha) for a in state.activations]
+        state.last_time = max(state.last_time, response.start_time)
+
+        # Merge encounters that hardly contribute anymore in the bounded activation mode
+        if model.activation_epsilon is not None:
+            es.compress(state, response.start_time, state.alpha,
+                        model.activation_epsilon, model.MIN_EXACT_ENCOUNTERS, model.MAX_EXACT_ENCOUNTERS, model.C)
+
+    def estimate_response_log(self, responses: ResponseLog, selected_key: Callable[[Response], object]) -> Tuple[List[float], List[float]]:
+        """
+        Return the rate of forgetting just after and the activation at the start of each response in the log.
+        The log is run through once with fresh states, and each row reports the state of the key chosen by `selected_key`.
+        """
+        alphas = []
+        activations = []
+
+        # The running states only match the per-response estimates if the log is in chronological order
+        start_times = responses.start_times
+        if any(t1 <= t0 for (t0, t1) in zip(start_times, start_times[1:])):
+            for response in responses:
+                key = selected_key(response)
+                alphas.append(self.get_state(
+                    response.start_time + 1, key).alpha)
+                state = self.get_state(response.start_time, key)
+                activations.append(ae.calculate_activation(
+                    state.times, state.decays, response.start_time, state.weights))
+            return alphas, activations
+
+        states = {}
+        for i, response in enumerate(responses):
+            update_key = self.key(response)
+            if update_key not in states:
+                states[update_key] = FactState(self.default_alpha)
+            state = states.get(selected_key(response),
+                               FactState(self.default_alpha))
+
+            activations.append(ae.calculate_activation(
+                state.times, state.decays, response.start_time, state.weights))
+            self.update_state(states[update_key], response)
+            alphas.append(state.alpha)
+
+            # The rate of forgetting is reported one millisecond after the response, which can include the next response
+            if i + 1 < len(start_times) and start_times[i + 1] < response.start_time + 1:
+                alphas[-1] = self.get_state(
+                    response.start_time + 1, selected_key(response)).alpha
+
+        return alphas, activations
+
+
+class PlanView(object):
+    """
+    Copy-on-write view of the learner states of a model, to which planned responses are applied without changing the model.
+    A state is copied from its engine the first time a planned response changes it; all other states are read from the engines.
+    """
+
+    def __init__(self):
+        self.states = {}
+
+        # Facts whose orientation changed during the plan, per fact ID
+        self.facts = {}
+
+    def get_states(self, engine: ReplayEngine) -> dict:
+        return self.states.get(engine, {})
+
+    def get_state(self, engine: ReplayEngine, time: float, key) -> FactState:
+        state = self.get_states(engine).get(key)
+        return state if state is not None else engine.get_state(time, key)
+
+    def register_response(self, engine: ReplayEngine, response: Response) -> None:
+        states = self.states.setdefault(engine, {})
+        key = engine.key(response)
+        if key not in states:
+            states[key] = engine.get_state(response.start_time, key).copy()
+        engine.update_state(states[key], response)
+
+    def get_fact(self, fact: Fact) -> Fact:
+        return self.facts.get(fact.fact_id, fact)
+
 
 class SpacingModel(object):
     """
@@ -22,40 +271,362 @@ class SpacingModel(object):
     C = 0.25
     F = 1.0
 
-    def __init__(self):
+    # Type of the facts created from CSV rows
+    FACT_TYPE = Fact
+
+    # Number of most recent encounters that are never merged in the bounded activation mode, and the largest number of encounters per fact that are left unmerged
+    MIN_EXACT_ENCOUNTERS = 8
+    MAX_EXACT_ENCOUNTERS = 64
+
+    def __init__(self, use_forgetting_queue: bool = False, activation_epsilon: float = None):
+        """
+        If `use_forgetting_queue` is set, get_next_fact selects facts from a priority queue of predicted forgetting times instead of evaluating the activation of every studied fact.
+        If `activation_epsilon` is set, the older encounters of a fact whose contributions to its activation are below this fraction of the total are merged into weighted summary encounters, which bounds the number of encounters per fact.
+        The activations are then approximate; `get_activation_error_bound` reports how far they can be off from those of the same encounters without merging.
+        """
+        self.activation_epsilon = activation_epsilon
         self.facts = []
-        self.responses = []
+        self.responses = ResponseLog()
+        self.engine = ReplayEngine(
+            self, self.DEFAULT_ALPHA, lambda r: r.fact.fact_id)
+
+        # Indexes on the facts and responses
+        self.fact_index = {}
+        self.fact_timings = {}
+        self.start_times = set()
+        self.fact_states = self.engine.states
+        self.response_rows = self.engine.rows
+
+        # Encounters of the studied facts for the vectorised activation calculation
+        self.activation_table = ActivationTable()
+        self.table_rows = {}
+        self.latest_start_time = -float("inf")
+        self.first_unseen = 0
+
+        # Studied facts ordered by the time their activation is predicted to drop below the forgetting threshold
+        self.forgetting_queue = ForgettingQueue(
+            self.FORGET_THRESHOLD) if use_forgetting_queue else None
+
+        # Optional append-only journal of the responses, see slimstampen.snapshot
+        self.journal = None
+
+        # Optional writer that exports each response as it is registered, see start_export
+        self.export_writer = None
 
     def add_fact(self, fact: Fact) -> None:
         """
         Add a fact to the list of study items.
         """
         # Ensure that a fact with this ID does not exist already
-        if next((f for f in self.facts if f.fact_id == fact.fact_id), None):
+        if fact.fact_id in self.fact_index:
             raise RuntimeError(
                 f"Error while adding fact: There is already a fact with the same ID: {fact.fact_id}. Each fact must have a unique ID")
 
+        self.append_fact(fact)
+
+    def append_fact(self, fact: Fact) -> None:
+        self.fact_index[fact.fact_id] = len(self.facts)
         self.facts.append(fact)
+        self.get_fact_timing(fact.question)
+        self.get_fact_timing(fact.answer)
+
+        if fact.fact_id in self.fact_states:
+            self.update_schedule(fact.fact_id)
+
+    def load_facts(self, facts: Union[str, os.PathLike, Iterable]) -> int:
+        """
+        Add many facts at once, from a CSV file with one fact per row or from an iterable of facts or rows.
+        The IDs of all facts are checked before any of them is added. Returns the number of added facts.
+        """
+        if isinstance(facts, (str, os.PathLike)):
+            with open(facts, encoding="utf-8") as file:
+                facts = [row for row in csv.reader(file) if row]
+
+        facts = [f if hasattr(f, "fact_id") else self.FACT_TYPE(*f)
+                 for f in facts]
+
+        # Ensure that the IDs are unique among the new facts and the existing ones
+        new_ids = set()
+        for fact in facts:
+            if fact.fact_id in self.fact_index or fact.fact_id in new_ids:
+                raise RuntimeError(
+                    f"Error while loading facts: There is already a fact with the same ID: {fact.fact_id}. Each fact must have a unique ID")
+            new_ids.add(fact.fact_id)
+
+        for fact in facts:
+            self.append_fact(fact)
+
+        return len(facts)
+
+    def get_fact_timing(self, text: str) -> Tuple[float, float]:
+        """
+        Return the reading time and the highest reasonable response time for a question, computed once per text.
+        The timings of the questions and answers of all facts are computed when they are added, so that both orientations are covered.
+        """
+        timing = self.fact_timings.get(text)
+        if timing is None:
+            reading_time = self.get_reading_time(text)
+            timing = (reading_time, 1.5 * self.estimate_reaction_time_from_activation(
+                self.FORGET_THRESHOLD, reading_time))
+            self.fact_timings[text] = timing
+        return timing
 
     def register_response(self, response: Response) -> None:
         """
         Register a response.
         """
         # Prevent duplicate responses
-        if next((r for r in self.responses if r.start_time == response.start_time), None):
+        if response.start_time in self.start_times:
             raise RuntimeError(
                 f"Error while registering response: A response has already been logged at this start_time: {response.start_time}. Each response must occur at a unique start_time.")
 
-        self.responses.append(response)
+        if self.journal is not None:
+            if response.fact.fact_id not in self.fact_index:
+                raise RuntimeError(
+                    f"Error while registering response: Only responses to facts in the fact list can be journaled, but there is no fact with ID: {response.fact.fact_id}")
+            self.journal.append(self.fact_index[response.fact.fact_id], bool(getattr(
+                response.fact, "flipped", False)), response.start_time, response.rt, bool(response.correct))
+
+        row = self.responses.append(response)
+        self.start_times.add(response.start_time)
+
+        # Keep the learner state of the fact up to date
+        fact_id = response.fact.fact_id
+        self.update_engines(response, row)
+
+        self.latest_start_time = max(self.latest_start_time, response.start_time)
+        if fact_id in self.fact_index:
+            self.update_schedule(fact_id)
+
+        if self.get_export_writer() is not None:
+            self.export_writer.append(self.get_export_row(response, row))
+
+    def update_engines(self, response: Response, row: int) -> None:
+        """
+        Add a response, stored at the given row of the response log, to the learner states.
+        """
+        self.engine.register_response(response, row)
+
+    def update_schedule(self, fact_id) -> None:
+        """
+        Copy the encounters of a fact into the activation table, or re-predict its forgetting time when the forgetting queue is used.
+        """
+        state = self.fact_states[fact_id]
+
+        if self.forgetting_queue is not None:
+            self.forgetting_queue.update(
+                fact_id, state.times, state.decays, state.weights)
+            return
+
+        if fact_id not in self.table_rows:
+            self.table_rows[fact_id] = self.activation_table.add_row(
+                self.fact_index[fact_id])
+
+        self.activation_table.set_row(
+            self.table_rows[fact_id], state.times, state.decays, state.weights)
+
+    def has_not_seen_facts(self) -> bool:
+        """
+        Move the pointer to the first fact without responses forward and return whether there is such a fact.
+        """
+        while self.first_unseen < len(self.facts) and self.facts[self.first_unseen].fact_id in self.fact_states:
+            self.first_unseen += 1
+        return self.first_unseen < len(self.facts)
 
     def get_next_fact(self, current_time: int) -> Tuple[Fact, bool]:
         """
         Returns a tuple containing the fact that needs to be repeated most urgently and a boolean indicating whether this fact is new (True) or has been presented before (False).
         If none of the previously studied facts needs to be repeated right now, return a new fact instead.
         """
+        if self.forgetting_queue is not None:
+            return self.get_next_fact_from_queue(current_time)
+
+        time = current_time + self.LOOKAHEAD_TIME
+
+        # The activation table only holds the right encounters if all responses occurred before the lookahead time
+        if self.latest_start_time >= time:
+            return self.get_next_fact_per_fact(current_time)
+
+        table = self.activation_table
+        fact_activations = table.calculate_activations(time)
+        positions = table.positions[:table.size]
+        has_not_seen_facts = self.has_not_seen_facts()
+
+        # Prevent an immediate repetition of the same fact
+        if table.size > 2:
+            last_row = self.table_rows.get(self.responses[-1].fact.fact_id)
+            if last_row is not None:
+                fact_activations[last_row] = float("inf")
+
+        if table.size == 0 and not has_not_seen_facts:
+            return self.get_next_fact_per_fact(current_time)
+
+        return self.choose_fact(fact_activations, positions, self.first_unseen if has_not_seen_facts else None)
+
+    def choose_fact(self, fact_activations: np.ndarray, positions: np.ndarray, first_unseen: Union[int, None]) -> Tuple[Fact, bool]:
+        """
+        Choose between the studied facts, with their activations at the lookahead time and their positions in the fact list, and the first new fact.
+        """
+        # Reinforce the weakest fact with an activation below the threshold
+        if first_unseen is None or np.any(fact_activations < self.FORGET_THRESHOLD):
+            # Ties are resolved in the order of the fact list
+            weakest_rows = np.flatnonzero(
+                fact_activations == fact_activations.min())
+            return ((self.facts[positions[weakest_rows].min()], False))
+
+        # If none of the previously seen facts has an activation below the threshold, return a new fact
+        return ((self.facts[first_unseen], True))
+
+    def get_next_fact_after(self, response: Response, current_time: int) -> Tuple[Fact, bool]:
+        """
+        Return what get_next_fact would return at the specified time if the response was registered first, without changing the model.
+        """
+        fact_id = response.fact.fact_id
+
+        # The learner state of the fact after the response
+        state = self.engine.get_state(response.start_time, fact_id).copy()
+        self.engine.update_state(state, response)
+
+        return self.get_next_fact_with_states(current_time, {fact_id: state}, fact_id)
+
+    def get_next_fact_with_states(self, current_time: int, states: dict, last_fact_id) -> Tuple[Fact, bool]:
+        """
+        Return what get_next_fact would return at the specified time if the learner states of some facts were replaced by `states`, and the last response was to the fact with ID `last_fact_id`, without changing the model.
+        """
+        time = current_time + self.LOOKAHEAD_TIME
+        last_time = max([self.latest_start_time] + [s.last_time for s in states.values()])
+
+        if self.forgetting_queue is not None or any(fact_id not in self.fact_index for fact_id in states) or last_time >= time:
+            return self.get_next_fact_per_fact(current_time, states, last_fact_id)
+
+        table = self.activation_table
+        fact_activations = table.calculate_activations(time)
+        positions = table.positions[:table.size]
+
+        rows = {}
+        for fact_id, state in states.items():
+            row = self.table_rows.get(fact_id)
+            if row is None:
+                row = len(positions)
+                fact_activations = np.append(fact_activations, 0.0)
+                positions = np.append(positions, self.fact_index[fact_id])
+            fact_activations[row] = ae.calculate_activation(
+                state.times, state.decays, time, state.weights)
+            rows[fact_id] = row
+
+        # Prevent an immediate repetition of the same fact
+        last_row = rows.get(last_fact_id, self.table_rows.get(last_fact_id))
+        if len(positions) > 2 and last_row is not None:
+            fact_activations[last_row] = float("inf")
+
+        first_unseen = self.first_unseen if self.has_not_seen_facts() else None
+        while first_unseen is not None and (self.facts[first_unseen].fact_id in states or self.facts[first_unseen].fact_id in self.fact_states):
+            first_unseen = first_unseen + \
+                1 if first_unseen + 1 < len(self.facts) else None
+
+        if len(positions) == 0 and first_unseen is None:
+            return self.get_next_fact_per_fact(current_time, states, last_fact_id)
+
+        return self.choose_fact(fact_activations, positions, first_unseen)
+
+    def plan_next(self, current_time: int, k: int, assumed_rt: float, assumed_correct: bool = True) -> List[PlannedTrial]:
+        """
+        Plan the next `k` presentations, as get_next_fact would choose them if each response took `assumed_rt` milliseconds, was correct or not according to `assumed_correct`, and the next presentation followed right after it.
+        The planned responses are applied to a copy-on-write view of the learner states, so that the model itself and its response log are not changed.
+        """
+        view = PlanView()
+        last_fact_id = self.responses[-1].fact.fact_id if len(self.responses) > 0 else None
+        plan = []
+
+        for _ in range(k):
+            fact, new = self.get_next_fact_with_states(
+                current_time, view.get_states(self.engine), last_fact_id)
+            fact, flipped = self.plan_orientation(view.get_fact(fact), new, current_time, view)
+
+            state = view.get_state(self.engine, current_time, fact.fact_id)
+            activation = ae.calculate_activation(
+                state.times, state.decays, current_time, state.weights)
+            plan.append(PlannedTrial(fact, new, current_time, activation, flipped))
+
+            self.plan_response(
+                Response(fact, current_time, assumed_rt, assumed_correct), view)
+            last_fact_id = fact.fact_id
+            current_time += assumed_rt
+
+        return plan
+
+    def plan_orientation(self, fact: Fact, new: bool, time: int, view: PlanView) -> Tuple[Fact, bool]:
+        """
+        Return the fact in the orientation in which a planned presentation shows it, and whether it was flipped for it.
+        """
+        return fact, False
+
+    def plan_response(self, response: Response, view: PlanView) -> None:
+        """
+        Apply a planned response to the learner states in the view.
+        """
+        view.register_response(self.engine, response)
+
+    def get_next_fact_from_queue(self, current_time: int) -> Tuple[Fact, bool]:
+        """
+        Implementation of get_next_fact on the forgetting queue.
+        Only the facts that are predicted to drop below the forgetting threshold before the lookahead time are evaluated, unless there are no new facts left.
+        """
+        time = current_time + self.LOOKAHEAD_TIME
+        queue = self.forgetting_queue
+
+        # The stored states only describe the activation at this time if all responses occurred before it
+        if self.latest_start_time >= time:
+            return self.get_next_fact_per_fact(current_time)
+
+        # Prevent an immediate repetition of the same fact
+        last_fact_id = self.responses[-1].fact.fact_id if len(
+            queue) > 2 else None
+
+        def activation(fact_id):
+            state = self.fact_states[fact_id]
+            return ae.calculate_activation(state.times, state.decays, time, state.weights)
+
+        # Reinforce the weakest fact with an activation below the threshold
+        due = queue.pop_due(time + 1)
+        queue.restore(due)
+        seen_facts_below_threshold = []
+        for (_, _, fact_id) in due:
+            if fact_id != last_fact_id:
+                a = activation(fact_id)
+                if a < self.FORGET_THRESHOLD:
+                    seen_facts_below_threshold.append(
+                        (a, self.fact_index[fact_id]))
+        if len(seen_facts_below_threshold) > 0:
+            return ((self.facts[min(seen_facts_below_threshold)[1]], False))
+
+        # If none of the previously seen facts has an activation below the threshold, return a new fact
+        if self.has_not_seen_facts():
+            return ((self.facts[self.first_unseen], True))
+
+        if len(queue) == 0:
+            return self.get_next_fact_per_fact(current_time)
+
+        # Without new facts left, reinforce the weakest of all seen facts
+        seen_facts = [(activation(fact_id), self.fact_index[fact_id])
+                      for fact_id in queue.entries if fact_id != last_fact_id]
+        return ((self.facts[min(seen_facts)[1]], False))
+
+    def get_next_fact_per_fact(self, current_time: int, states: dict = None, last_fact_id=None) -> Tuple[Fact, bool]:
+        """
+        Reference implementation of get_next_fact that calculates the activation of each fact separately.
+        `states` can replace the learner states of some facts, and `last_fact_id` the fact of the last response.
+        """
+        time = current_time + self.LOOKAHEAD_TIME
+
+        def activation(f):
+            if states and f.fact_id in states:
+                state = states[f.fact_id]
+                return ae.calculate_activation(state.times, state.decays, time, state.weights)
+            return self.calculate_activation(time, f)
+
         # Calculate all fact activations in the near future
-        fact_activations = [(f, self.calculate_activation(
-            current_time + self.LOOKAHEAD_TIME, f)) for f in self.facts]
+        fact_activations = [(f, activation(f)) for f in self.facts]
 
         seen_facts = [(f, a)
                       for (f, a) in fact_activations if a > -float("inf")]
@@ -64,9 +635,10 @@ class SpacingModel(object):
 
         # Prevent an immediate repetition of the same fact
         if len(seen_facts) > 2:
-            last_response = self.responses[-1]
+            if last_fact_id is None:
+                last_fact_id = self.responses[-1].fact.fact_id
             seen_facts = [(f, a) for (
-                f, a) in seen_facts if f.fact_id != last_response.fact.fact_id]
+                f, a) in seen_facts if f.fact_id != last_fact_id]
 
         # Reinforce the weakest fact with an activation below the threshold
         seen_facts_below_threshold = [(f, a) for (
@@ -82,52 +654,25 @@ class SpacingModel(object):
         """
         Return the estimated rate of forgetting of the fact at the specified time
         """
-        encounters = []
-
-        responses_for_fact = [
-            r for r in self.responses if r.fact.fact_id == fact.fact_id and r.start_time < time]
-        alpha = self.DEFAULT_ALPHA
-
-        # Calculate the activation by running through the sequence of previous responses
-        for response in responses_for_fact:
-            activation = self.calculate_activation_from_encounters(
-                encounters, response.start_time)
-            encounters.append(Encounter(activation, response.start_time,
-                              self.normalise_reaction_time(response), self.DEFAULT_ALPHA))
-            alpha = self.estimate_alpha(
-                encounters, activation, response, alpha)
-
-            # Update decay estimates of previous encounters
-            encounters = [encounter._replace(decay=self.calculate_decay(
-                encounter.activation, alpha)) for encounter in encounters]
-
-        return alpha
+        return self.engine.get_state(time, fact.fact_id).alpha
 
     def calculate_activation(self, time: int, fact: Fact) -> float:
         """
         Calculate the activation of a fact at the given time.
         """
+        state = self.engine.get_state(time, fact.fact_id)
+        return ae.calculate_activation(state.times, state.decays, time, state.weights)
 
-        encounters = []
-
-        responses_for_fact = [
-            r for r in self.responses if r.fact.fact_id == fact.fact_id and r.start_time < time]
-        alpha = self.DEFAULT_ALPHA
-
-        # Calculate the activation by running through the sequence of previous responses
-        for response in responses_for_fact:
-            activation = self.calculate_activation_from_encounters(
-                encounters, response.start_time)
-            encounters.append(Encounter(activation, response.start_time,
-                              self.normalise_reaction_time(response), self.DEFAULT_ALPHA))
-            alpha = self.estimate_alpha(
-                encounters, activation, response, alpha)
-
-            # Update decay estimates of previous encounters
-            encounters = [encounter._replace(decay=self.calculate_decay(
-                encounter.activation, alpha)) for encounter in encounters]
+    def get_activation_error_bound(self, time: int = None, fact: Fact = None) -> float:
+        """
+        Return the largest possible error of the activation of a fact at the specified time in the bounded activation mode, compared to the same encounters without merging.
+        Without a fact, return the largest possible error of the activations at the start of all registered responses.
+        The bound does not cover rate of forgetting estimates that differ from those of the exact model.
+        """
+        if fact is None:
+            return max(e.max_error_bound for e in vars(self).values() if isinstance(e, ReplayEngine))
 
-        return self.calculate_activation_from_encounters(encounters, time)
+        return es.error_bound(self.engine.get_state(time, fact.fact_id), time)
 
     def calculate_decay(self, activation: float, alpha: float) -> float:
         """
@@ -139,49 +684,7 @@ class SpacingModel(object):
         """
         Estimate the rate of forgetting parameter (alpha) for an item.
         """
-        if len(encounters) < 3:
-            return self.DEFAULT_ALPHA
-
-        a_fit = previous_alpha
-        reading_time = self.get_reading_time(response.fact.question)
-        estimated_rt = self.estimate_reaction_time_from_activation(
-            activation, reading_time)
-        est_diff = estimated_rt - self.normalise_reaction_time(response)
-
-        if est_diff < 0:
-            # Estimated RT was too short (estimated activation too high), so actual decay was larger
-            a0 = a_fit
-            a1 = a_fit + 0.05
-
-        else:
-            # Estimated RT was too long (estimated activation too low), so actual decay was smaller
-            a0 = a_fit - 0.05
-            a1 = a_fit
-
-        # Binary search between previous fit and proposed alpha
-        for _ in range(6):
-            # Adjust all decays to use the new alpha
-            a0_diff = a0 - a_fit
-            a1_diff = a1 - a_fit
-            d_a0 = [e._replace(decay=e.decay + a0_diff) for e in encounters]
-            d_a1 = [e._replace(decay=e.decay + a1_diff) for e in encounters]
-
-            # Calculate the reaction times from activation and compare against observed RTs
-            encounter_window = encounters[max(1, len(encounters) - 5):]
-            total_a0_error = self.calculate_predicted_reaction_time_error(
-                encounter_window, d_a0, reading_time)
-            total_a1_error = self.calculate_predicted_reaction_time_error(
-                encounter_window, d_a1, reading_time)
-
-            # Adjust the search area based on the lowest total error
-            ac = (a0 + a1) / 2
-            if total_a0_error < total_a1_error:
-                a1 = ac
-            else:
-                a0 = ac
-
-        # The new alpha estimate is the average value in the remaining bracket
-        return (a0 + a1) / 2
+        return ae.estimate_alpha([e.time for e in encounters], [e.decay for e in encounters], [e.reaction_time for e in encounters], activation, self.normalise_reaction_time(response), self.get_reading_time(response.fact.question), previous_alpha, self.DEFAULT_ALPHA, self.estimate_reaction_time_from_activation)
 
     def calculate_activation_from_encounters(self, encounters: List[Encounter], current_time: int) -> float:
         included_encounters = [e for e in encounters if e.time < current_time]
@@ -213,11 +716,7 @@ class SpacingModel(object):
         """
         Return the highest response time we can reasonably expect for a given fact
         """
-        reading_time = self.get_reading_time(fact.question)
-        max_rt = 1.5 * \
-            self.estimate_reaction_time_from_activation(
-                self.FORGET_THRESHOLD, reading_time)
-        return max_rt
+        return self.get_fact_timing(fact.question)[1]
 
     def get_reading_time(self, text: str) -> float:
         """
@@ -236,37 +735,115 @@ class SpacingModel(object):
         Cut off extremely long responses to keep the reaction time within reasonable bounds
         """
         rt = response.rt if response.correct else 60000
-        max_rt = self.get_max_reaction_time_for_fact(response.fact)
+        max_rt = self.get_fact_timing(response.fact.question)[1]
         return min(rt, max_rt)
 
-    def export_data(self, path: str=None) -> Union[pd.DataFrame, str]:
+    def get_export_values(self) -> Dict[str, list]:
         """
-        Save the response data to the specified csv file, and return a copy of the pandas DataFrame.
-        If no path is specified, return a CSV-formatted copy of the data instead.
+        Return the response data as a list of values per export column, including the rate of forgetting estimate after and the activation at the start of each response.
         """
+        log = self.responses
+        facts = [log.get_fact(index, flipped) for (
+            index, flipped) in zip(log.fact_indices, log.flipped)]
+
+        values = {
+            "trial": list(range(1, len(log) + 1)),
+            "start_time": log.start_times.tolist(),
+            "rt": log.rts.tolist(),
+            "correct": [bool(c) for c in log.correct],
+        }
+        for field in self.FACT_TYPE._fields:
+            values[field] = [getattr(f, field) for f in facts]
 
-        def calc_rof(row):
-            return self.get_rate_of_forgetting(row["start_time"] + 1, row["fact"])
+        # Add column for rate of forgetting estimate after each observation
+        values["alpha"], values["activation"] = self.engine.estimate_response_log(
+            self.responses, self.engine.key)
 
-        def calc_act(row):
-            return self.calculate_activation(row["start_time"], row["fact"])
+        return values
 
-        dat_resp = pd.DataFrame(self.responses)
-        dat_facts = pd.DataFrame([r.fact for r in self.responses])
-        dat = pd.concat([dat_resp, dat_facts], axis=1)
+    def get_export_frame(self) -> "pd.DataFrame":
+        """
+        Return the response data as a pandas DataFrame, see get_export_values.
+        """
+        return to_frame(self.get_export_columns(), self.get_export_values())
 
-        # Add column for rate of forgetting estimate after each observation
-        dat["alpha"] = dat.apply(calc_rof, axis=1)
-        dat["activation"] = dat.apply(calc_act, axis=1)
-        dat.drop(columns="fact", inplace=True)
+    def get_export_columns(self) -> List[Tuple[str, str]]:
+        """
+        Return the name and type of each column written by an export writer, see slimstampen.exportwriter.
+        """
+        fact_columns = [(field, "?" if field == "flipped" else "s")
+                        for field in self.FACT_TYPE._fields]
+        return [("trial", "q"), ("start_time", "t"), ("rt", "t"), ("correct", "?")] + fact_columns + [("alpha", "d"), ("activation", "d")]
+
+    def get_export_row(self, response: Response, row: int) -> list:
+        """
+        Return the export row of a response that was just registered, with the rate of forgetting after and the activation at the start of the response.
+        """
+        state = self.engine.states[self.engine.key(response)]
+        fact = self.responses.get_fact(
+            self.responses.fact_indices[row], self.responses.flipped[row])
+        return [row + 1, float(response.start_time), float(response.rt), bool(response.correct)] + list(fact) + [state.alpha, state.activations[-1]]
+
+    def start_export(self, path: str, format: str = "csv", buffer_size: int = 100, fsync: bool = False) -> ExportWriter:
+        """
+        Export each response to the specified file as soon as it is registered, in the layout of export_data ("csv") or in a compressed columnar format ("columnar").
+        Rows are written every `buffer_size` responses, and `fsync` forces each write to disk, so that a crash loses at most the buffered responses.
+        export_data then only has to flush the writer. The streamed estimates are those at the time of each response, so the rate of forgetting does not include a response registered within the next millisecond.
+        Returns the writer, which can be used as a context manager; the export stops when it is closed, or when stop_export is called.
+        """
+        if len(self.responses) > 0:
+            raise RuntimeError(
+                "Error while starting export: The export has to be started before the first response is registered")
+        if format not in EXPORT_WRITERS:
+            raise RuntimeError(
+                f"Error while starting export: Unknown export format: {format}. The supported formats are: {', '.join(EXPORT_WRITERS)}")
+
+        columns = self.get_export_columns()
+        self.export_writer = EXPORT_WRITERS[format](
+            path, columns, columns[0][0], buffer_size, fsync)
+        return self.export_writer
+
+    def stop_export(self) -> None:
+        """
+        Write the buffered rows of the export started by start_export and close its file.
+        """
+        if self.export_writer is not None:
+            self.export_writer.close()
+            self.export_writer = None
 
-        # Add trial number column
-        dat.index.name = "trial"
-        dat.index = dat.index + 1
+    def get_export_writer(self) -> Union[ExportWriter, None]:
+        """
+        Return the writer of the export started by start_export, or None if there is none or it has been closed.
+        """
+        if self.export_writer is not None and self.export_writer.closed:
+            self.export_writer = None
+        return self.export_writer
 
-        # Save to CSV file if a path was specified, otherwise return the CSV-formatted output
-        if path is not None:
-            dat.to_csv(path, encoding="UTF-8")
-            return dat
+    def export_data(self, path: str=None, backend: str = "pandas") -> Union["pd.DataFrame", str]:
+        """
+        Save the response data to the specified csv file, and return a copy of the pandas DataFrame.
+        If no path is specified, return a CSV-formatted copy of the data instead.
+        `backend` selects how the data is exported, see slimstampen.exportwriter: "pandas" as described above, "csv" writes the same CSV file with the csv module and returns its path, and "columnar" writes a columnar export file. Only the pandas backend imports pandas.
+        If the responses are streamed by start_export, the buffered rows are flushed and the data is read back from the export file.
+        """
+        if backend not in EXPORT_BACKENDS:
+            raise RuntimeError(
+                f"Error while exporting data: Unknown export backend: {backend}. The supported backends are: {', '.join(EXPORT_BACKENDS)}")
+
+        if self.get_export_writer() is None:
+            return EXPORT_BACKENDS[backend](self.get_export_columns(), self.get_export_values(), path)
+
+        writer = self.export_writer
+        writer.flush()
+        columns, values = read_export_values(writer.path, writer.columns)
+
+        # The stream already is the requested file
+        if path is not None and os.path.abspath(path) == os.path.abspath(writer.path):
+            if backend == "columnar" and isinstance(writer, ColumnarExportWriter):
+                return path
+            if backend != "columnar" and isinstance(writer, CSVExportWriter):
+                return to_frame(columns, values) if backend == "pandas" else path
+            raise RuntimeError(
+                f"Error while exporting data: The responses are streamed to {path} in another format")
 
-        return dat.to_csv()
+        return EXPORT_BACKENDS[backend](columns, values, path)
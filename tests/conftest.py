@@ -0,0 +1,106 @@
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).parent.parent.resolve()
+sys.path.insert(0, str(ROOT))
+
+import slimstampen.spacingmodel as sp  # noqa: E402
+
+
+def make_facts(model_type, count: int) -> list:
+    """
+    Return `count` facts of the fact type of the model, with questions of one to three words so that the reading times differ.
+    """
+    return [model_type.FACT_TYPE(str(i), " ".join([f"q{i}"] * (i % 3 + 1)), f"a{i}") for i in range(count)]
+
+
+def run_session(model, rng: random.Random, trials: int, current_time: float = 0.0, check=None) -> float:
+    """
+    Present `trials` facts chosen by the model with random reaction times, correctness and pauses, and return the time after the last response.
+    `check(model, current_time)` is called before each presentation.
+    """
+    for _ in range(trials):
+        if check is not None:
+            check(model, current_time)
+        fact, _ = model.get_next_fact(current_time)
+        rt = rng.uniform(500, 8000)
+        model.register_response(sp.Response(
+            fact, current_time, rt, rng.random() < 0.75))
+        current_time += rt + (rng.uniform(0, 3000) if rng.random() < 0.9 else rng.uniform(20000, 300000))
+    return current_time
+
+
+def reference_estimate_alpha(model, encounters, activation, observed_rt, reading_time, previous_alpha, default_alpha):
+    """
+    The original bisection of SpacingModel.estimate_alpha, on copies of the encounters with adjusted decays.
+    """
+    if len(encounters) < 3:
+        return default_alpha
+
+    a_fit = previous_alpha
+    estimated_rt = model.estimate_reaction_time_from_activation(activation, reading_time)
+    est_diff = estimated_rt - observed_rt
+
+    if est_diff < 0:
+        a0 = a_fit
+        a1 = a_fit + 0.05
+    else:
+        a0 = a_fit - 0.05
+        a1 = a_fit
+
+    for _ in range(6):
+        a0_diff = a0 - a_fit
+        a1_diff = a1 - a_fit
+        d_a0 = [e._replace(decay=e.decay + a0_diff) for e in encounters]
+        d_a1 = [e._replace(decay=e.decay + a1_diff) for e in encounters]
+
+        encounter_window = encounters[max(1, len(encounters) - 5):]
+        total_a0_error = model.calculate_predicted_reaction_time_error(
+            encounter_window, d_a0, reading_time)
+        total_a1_error = model.calculate_predicted_reaction_time_error(
+            encounter_window, d_a1, reading_time)
+
+        ac = (a0 + a1) / 2
+        if total_a0_error < total_a1_error:
+            a1 = ac
+        else:
+            a0 = ac
+
+    return (a0 + a1) / 2
+
+
+def reference_normalise_reaction_time(model, response) -> float:
+    """
+    The original SpacingModel.normalise_reaction_time, which derives the cut-off from the question text.
+    """
+    reading_time = model.get_reading_time(response.fact.question)
+    max_rt = 1.5 * model.estimate_reaction_time_from_activation(model.FORGET_THRESHOLD, reading_time)
+    return min(response.rt if response.correct else 60000, max_rt)
+
+
+def reference_replay(model, fact_id: str, time: float, default_alpha: float, flipped: bool = None):
+    """
+    The original full replay of get_rate_of_forgetting and calculate_activation: the whole response list is filtered for the responses to the fact before `time`, in one orientation if `flipped` is given, and run through from the first.
+    Returns the rate of forgetting and the activation at `time`.
+    """
+    responses = [r for r in model.responses if r.fact.fact_id == fact_id and r.start_time < time
+                 and (flipped is None or r.fact.flipped == flipped)]
+    encounters = []
+    alpha = default_alpha
+    for response in responses:
+        activation = model.calculate_activation_from_encounters(encounters, response.start_time)
+        reaction_time = reference_normalise_reaction_time(model, response)
+        encounters.append(sp.Encounter(activation, response.start_time, reaction_time, default_alpha))
+        alpha = reference_estimate_alpha(model, encounters, activation, reaction_time,
+                                         model.get_reading_time(response.fact.question), alpha, default_alpha)
+        encounters = [e._replace(decay=model.calculate_decay(e.activation, alpha)) for e in encounters]
+
+    return alpha, model.calculate_activation_from_encounters(encounters, time)
+
+
+@pytest.fixture
+def rng():
+    return random.Random(0)
@@ -0,0 +1,80 @@
+import random
+
+import numpy as np
+import pytest
+
+import slimstampen.alphaestimator as ae
+import slimstampen.flippingmodel as fm
+import slimstampen.spacingmodel as sp
+from slimstampen.activationtable import ActivationTable
+from conftest import make_facts, run_session
+
+
+def test_activations_match_per_fact_calculation(rng):
+    table = ActivationTable(rows=2, width=2)
+    encounters = []
+    for position in range(10):
+        times = sorted(rng.uniform(0, 100000) for _ in range(rng.randint(1, 12)))
+        decays = [rng.uniform(0.2, 0.8) for _ in times]
+        table.set_row(table.add_row(position), times, decays)
+        encounters.append((times, decays))
+
+    for time in (5000, 50000, 150000):
+        activations = table.calculate_activations(time)
+        expected = [ae.calculate_activation(times, decays, time) for (times, decays) in encounters]
+        assert activations.tolist() == pytest.approx(expected, rel=1e-12)
+    assert list(table.positions[:table.size]) == list(range(10))
+
+
+def test_rows_without_earlier_encounters_are_minus_infinity():
+    table = ActivationTable()
+    table.set_row(table.add_row(0), [1000.0], [0.3])
+    assert table.calculate_activations(500)[0] == -np.inf
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("model_type", [sp.SpacingModel, fm.FlippingModel])
+def test_get_next_fact_matches_per_fact_reference(model_type, seed):
+    rng = random.Random(seed)
+    model = model_type()
+    model.load_facts(make_facts(model_type, rng.randint(1, 40)))
+
+    def check(model, current_time):
+        assert sp.SpacingModel.get_next_fact(model, current_time) == model.get_next_fact_per_fact(current_time)
+
+    run_session(model, rng, 150, check=check)
+
+
+def test_ties_are_resolved_in_fact_list_order():
+    model = sp.SpacingModel()
+    model.load_facts(make_facts(sp.SpacingModel, 6))
+    for i, fact in enumerate(model.facts[:4]):
+        model.register_response(sp.Response(fact, i * 1000.0, 2000, True))
+
+    # Facts 2 and 1 get exactly the same state, older than that of any other fact, so fact 1 comes first in the fact list
+    state = model.fact_states["0"].copy()
+    state.times = [t - 500 for t in state.times]
+    for fact_id in ("2", "1"):
+        model.fact_states[fact_id] = state.copy()
+        model.update_schedule(fact_id)
+
+    current_time = 10 ** 7
+    assert model.get_next_fact(current_time) == (model.facts[1], False)
+    assert model.get_next_fact_per_fact(current_time) == (model.facts[1], False)
+
+    # The same through choose_fact directly, with the tied rows in reverse fact list order
+    assert model.choose_fact(np.array([-2.0, -1.0, -2.0]), np.array([3, 2, 1]), 4) == (model.facts[1], False)
+
+
+def test_responses_after_the_lookahead_time_fall_back_to_per_fact(rng):
+    model = sp.SpacingModel()
+    model.load_facts(make_facts(sp.SpacingModel, 10))
+    end_time = run_session(model, rng, 30)
+
+    # A response far in the future, so that the table does not describe the lookahead time
+    fact, _ = model.get_next_fact(end_time)
+    model.register_response(sp.Response(fact, end_time + 10 ** 6, 1500, True))
+    assert model.latest_start_time >= end_time + model.LOOKAHEAD_TIME
+
+    for current_time in (end_time, end_time + 5000, end_time + 10 ** 6 - model.LOOKAHEAD_TIME):
+        assert model.get_next_fact(current_time) == model.get_next_fact_per_fact(current_time)
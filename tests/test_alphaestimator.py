@@ -0,0 +1,41 @@
+import random
+
+import pytest
+
+import slimstampen.alphaestimator as ae
+import slimstampen.flippingmodel as fm
+import slimstampen.spacingmodel as sp
+from conftest import make_facts, reference_estimate_alpha, run_session
+
+
+@pytest.mark.parametrize("seed", range(10))
+@pytest.mark.parametrize("model_type", [sp.SpacingModel, fm.FlippingModel])
+def test_estimate_alpha_matches_original_bisection(model_type, seed):
+    rng = random.Random(seed)
+    model = model_type()
+    model.load_facts(make_facts(model_type, rng.randint(2, 15)))
+    calls = []
+
+    def estimate_alpha(times, decays, reaction_times, activation, observed_rt, reading_time, previous_alpha, default_alpha, estimate_reaction_time, weights=None, calculate_error=None):
+        alpha = ae.estimate_alpha(times, decays, reaction_times, activation, observed_rt, reading_time,
+                                  previous_alpha, default_alpha, estimate_reaction_time, weights, calculate_error)
+        encounters = [sp.Encounter(a, t, rt, d) for (a, t, rt, d) in zip(
+            [None] * len(times), times, reaction_times, decays)]
+        calls.append((alpha, reference_estimate_alpha(model, encounters, activation, observed_rt,
+                                                      reading_time, previous_alpha, default_alpha)))
+        return alpha
+
+    for engine in (model.engine, getattr(model, "flip_engine", None)):
+        if engine is not None:
+            engine.estimate_alpha = estimate_alpha
+    run_session(model, rng, 120)
+
+    assert len(calls) > 0
+    for alpha, expected in calls:
+        assert alpha == expected
+
+
+def test_reading_time_matches_original(rng):
+    model = sp.SpacingModel()
+    for text in ("a", "two words", "a somewhat longer question with many words"):
+        assert model.get_fact_timing(text)[0] == model.get_reading_time(text)
@@ -0,0 +1,110 @@
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+import analysis.analysis as analysis
+from conftest import ROOT
+
+EXPERIMENT_FOLDER = ROOT / "data" / "experiment"
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(analysis, "CACHE_FOLDER", tmp_path / "cache")
+    return tmp_path / "cache"
+
+
+@pytest.fixture
+def experiment(tmp_path):
+    folder = tmp_path / "experiment"
+    folder.mkdir()
+    for subject in ("subject_0", "subject_1", "subject_2"):
+        for suffix in ("", "_test"):
+            shutil.copy(EXPERIMENT_FOLDER / f"{subject}{suffix}.csv", folder)
+    return folder
+
+
+def test_cached_columns_match_the_csv_file(cache, experiment):
+    path = experiment / "subject_0.csv"
+    expected = pd.read_csv(path, header=0, index_col=0).reset_index(drop=True)
+
+    df = analysis.read_cached(path)
+    assert list(df.columns) == list(expected.columns)
+    assert str(df["fact_id"].dtype) == "category"
+    assert df["correct"].dtype == bool and df["flipped"].dtype == bool
+    assert df["trial"].dtype == "int64" and df["start_time"].dtype == "float64"
+    for column in expected.columns:
+        assert df[column].astype(object).tolist() == expected[column].tolist()
+
+    # Only the requested columns are loaded
+    assert list(analysis.read_cached(path, ["rt", "correct"]).columns) == ["rt", "correct"]
+
+
+def test_cache_is_invalidated_when_the_file_changes(cache, experiment):
+    path = experiment / "subject_0_test.csv"
+    folder = analysis.update_cache(path)
+    converted = os.stat(folder / "meta.json").st_mtime_ns
+
+    # An unchanged file is not converted again
+    assert analysis.update_cache(path) == folder
+    assert os.stat(folder / "meta.json").st_mtime_ns == converted
+
+    with open(path, encoding="utf-8") as file:
+        lines = file.readlines()
+    with open(path, "w", encoding="utf-8") as file:
+        file.writelines(lines[:-1])
+    assert len(analysis.read_cached(path)) == len(lines) - 2
+
+
+def test_load_data_limits_subjects_and_columns(cache, experiment):
+    test_df, experiment_df = analysis.load_data(["subject_0", "subject_2"], ["correct", "fact_id"], experiment)
+
+    assert list(experiment_df.columns) == ["correct", "fact_id", "subject"]
+    assert list(test_df.columns) == ["correct", "subject"]
+    assert set(experiment_df["subject"].cat.categories) == {"subject_0", "subject_2"}
+    assert str(experiment_df["fact_id"].dtype) == "category"
+
+    expected = pd.concat([pd.read_csv(experiment / f"{s}.csv", index_col=0) for s in ("subject_0", "subject_2")])
+    assert experiment_df["correct"].tolist() == expected["correct"].tolist()
+
+
+def test_statistics_match_the_original_grouped_computations(cache):
+    test_df, experiment_df = analysis.load_data()
+
+    # Aggregates of separate chunks of subjects add up to those of all subjects
+    subjects = list(experiment_df["subject"].cat.categories)
+    chunks = [experiment_df[experiment_df["subject"].isin(subjects[i::3])] for i in range(3)]
+    merged = analysis.merge_aggregates([analysis.get_aggregates(chunk) for chunk in chunks])
+    aggregates = analysis.get_aggregates(experiment_df)
+    assert merged.sort_index().equals(aggregates.sort_index())
+
+    grouped = experiment_df.groupby("subject", observed=True)["correct"]
+    scores = analysis.get_correct_scores(aggregates=merged)
+    expected = grouped.value_counts(normalize=True).xs(True, level=1)
+    assert scores["count"].sort_index().tolist() == grouped.value_counts().xs(True, level=1).sort_index().tolist()
+    assert scores["frequency"].sort_index().tolist() == pytest.approx(expected.sort_index().tolist())
+    assert scores["mean"] == pytest.approx(expected.mean())
+    assert scores["std"] == pytest.approx(expected.std())
+
+    trials = analysis.get_trial_stats(aggregates=merged)
+    expected = experiment_df["subject"].value_counts(sort=False)
+    assert trials["count"].sort_index().tolist() == expected.sort_index().tolist()
+    assert trials["std"] == pytest.approx(expected.std())
+
+    for df, is_test in ((experiment_df, False), (test_df, True)):
+        stats = analysis.get_flipping_stats(df, is_test)
+        flipped = analysis.get_flipped(df, is_test)
+        frequency = {s: len(group) / (df["subject"] == s).sum()
+                     for (s, group) in flipped.groupby("subject", observed=True)}
+        assert dict(zip(stats["frequency"]["subject"], stats["frequency"]["frequency"])) == pytest.approx(frequency)
+        assert stats["mean"] == pytest.approx(sum(frequency.values()) / len(frequency))
+
+
+@pytest.mark.parametrize("is_test", [False, True])
+def test_subjects_aggregated_in_parallel_match_one_pass(cache, is_test):
+    test_df, experiment_df = analysis.load_data()
+    expected = analysis.get_aggregates(test_df if is_test else experiment_df, is_test)
+    aggregates = analysis.aggregate_subjects(is_test=is_test, workers=2)
+    assert aggregates.sort_index().equals(expected.sort_index())
@@ -0,0 +1,89 @@
+import random
+
+import pytest
+
+import slimstampen.spacingmodel as sp
+from slimstampen.cohort import Cohort
+from conftest import make_facts
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_next_facts_match_separate_models(seed):
+    rng = random.Random(seed)
+    facts = make_facts(sp.SpacingModel, rng.randint(1, 25))
+    learners = 6
+    cohort = Cohort(learners, facts)
+    models = [sp.SpacingModel() for _ in range(learners)]
+    for model in models:
+        model.load_facts(facts)
+
+    # Learners answer at different paces, so their encounter counts diverge
+    current_times = [rng.uniform(0, 10000) for _ in range(learners)]
+    for _ in range(60):
+        batch = sorted(rng.sample(range(learners), rng.randint(1, learners)))
+        choices = cohort.get_next_facts(batch, [current_times[i] for i in batch])
+        for learner, choice in zip(batch, choices):
+            assert choice == models[learner].get_next_fact(current_times[learner])
+
+            rt = rng.uniform(500, 8000)
+            response = sp.Response(choice[0], current_times[learner], rt, rng.random() < 0.75)
+            cohort.register_response(learner, response)
+            models[learner].register_response(response)
+            current_times[learner] += rt + (rng.uniform(0, 3000) if rng.random() < 0.9 else rng.uniform(20000, 300000))
+
+    for learner, model in enumerate(models):
+        for fact in facts:
+            assert cohort.get_rate_of_forgetting(learner, current_times[learner], fact) == \
+                model.get_rate_of_forgetting(current_times[learner], fact)
+
+
+def test_next_facts_before_the_latest_response_match_separate_models():
+    rng = random.Random(7)
+    facts = make_facts(sp.SpacingModel, 6)
+    cohort = Cohort(1, facts)
+    model = sp.SpacingModel()
+    model.load_facts(facts)
+
+    current_time = 0.0
+    for _ in range(25):
+        fact, _ = model.get_next_fact(current_time)
+        response = sp.Response(fact, current_time, rng.uniform(500, 3000), rng.random() < 0.75)
+        model.register_response(response)
+        cohort.register_response(0, response)
+        current_time += response.rt + rng.uniform(0, 5000)
+
+    for time in sorted(rng.uniform(-10000, current_time) for _ in range(30)):
+        assert cohort.get_next_fact(0, time) == model.get_next_fact(time)
+
+
+def test_slots_only_cover_studied_facts():
+    facts = make_facts(sp.SpacingModel, 50)
+    cohort = Cohort(2, facts)
+    for i in range(20):
+        cohort.register_response(0, sp.Response(cohort.model.facts[i % 3], i * 5000.0, 1000, True))
+    cohort.register_response(1, sp.Response(cohort.model.facts[10], 0.0, 1000, True))
+
+    assert list(cohort.slot_counts) == [3, 1]
+    assert cohort.times.shape[1] == 4
+    assert cohort.times.shape[2] >= 7
+    assert list(cohort.slot_positions[1, :1]) == [10]
+    assert list(cohort.first_unseen) == [3, 0]
+
+
+def test_each_learner_replays_from_their_own_log():
+    facts = make_facts(sp.SpacingModel, 3)
+    cohort = Cohort(2, facts)
+    for i in range(6):
+        cohort.register_response(i % 2, sp.Response(cohort.model.facts[i % 3], i * 4000.0, 1000 + i, i % 4 != 0))
+
+    assert len(cohort.model.responses) == 0
+    for learner, engine in enumerate(cohort.engines):
+        assert len(engine.responses) == 3
+        for key, state in engine.states.items():
+            replayed = engine.replay_state(float("inf"), key)
+            assert (replayed.times, replayed.decays, replayed.alpha) == (state.times, state.decays, state.alpha)
+
+
+def test_bounded_models_are_rejected():
+    with pytest.raises(RuntimeError, match="bounded activation mode"):
+        Cohort(2, make_facts(sp.SpacingModel, 3), sp.SpacingModel(activation_epsilon=0.01))
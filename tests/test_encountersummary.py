@@ -0,0 +1,137 @@
+import math
+import random
+
+import pytest
+
+import slimstampen.alphaestimator as ae
+import slimstampen.encountersummary as es
+import slimstampen.flippingmodel as fm
+import slimstampen.spacingmodel as sp
+from slimstampen.fitting import load_responses
+from slimstampen.rescore import find_session_logs
+from conftest import ROOT, make_facts
+
+SESSION_FOLDERS = ["data/experiment", "subjectData", "subjectData-Ludwig", "subjectdata-eden"]
+
+# Rounding error allowed on top of the reported activation error bound
+TOLERANCE = 1e-9
+
+# There is no reported bound on alpha; on the recorded sessions it ends up at most one bisection step (0.1 / 2^7) from the exact estimate
+ALPHA_TOLERANCE = 0.1 / 2 ** 7 + 1e-12
+
+
+def compare(exact: sp.SpacingModel, bounded: sp.SpacingModel, response: sp.Response, engines=("engine",)) -> bool:
+    """
+    Register a response with both models, check the activation and alpha of its fact in the bounded model against the exact model and the error bound at its start, and return whether the bounded state is compressed.
+    """
+    bounds = {name: es.error_bound(getattr(bounded, name).get_state(response.start_time, getattr(bounded, name).key(response)), response.start_time)
+              for name in engines}
+    exact.register_response(response)
+    bounded.register_response(response)
+
+    compressed = False
+    for name in engines:
+        key = getattr(exact, name).key(response)
+        e = getattr(exact, name).states[key]
+        b = getattr(bounded, name).states[key]
+        if math.isfinite(e.activations[-1]):
+            assert abs(e.activations[-1] - b.activations[-1]) <= bounds[name] + TOLERANCE
+            assert bounds[name] <= bounded.get_activation_error_bound() + TOLERANCE
+        assert b.alpha == pytest.approx(e.alpha, abs=ALPHA_TOLERANCE)
+        compressed |= b.summary is not None
+    return compressed
+
+
+@pytest.mark.parametrize("epsilon, same_choices", [(1e-2, True), (5e-2, False)])
+def test_recorded_sessions_stay_within_error_bound(epsilon, same_choices):
+    logs = find_session_logs([str(ROOT / folder) for folder in SESSION_FOLDERS])
+    assert len(logs) > 0
+
+    compressed = 0
+    for log in logs:
+        responses = load_responses(str(log))
+        facts = list({r.fact.fact_id: r.fact for r in responses}.values())
+        exact = fm.FlippingModel()
+        bounded = fm.FlippingModel(activation_epsilon=epsilon)
+        exact.load_facts(facts)
+        bounded.load_facts(facts)
+
+        for response in responses:
+            if same_choices:
+                assert bounded.get_next_fact(response.start_time, use_flipping=False)[0].fact_id == \
+                    exact.get_next_fact(response.start_time, use_flipping=False)[0].fact_id
+            compressed += compare(exact, bounded, response, ("engine", "flip_engine"))
+
+    # The sessions are long enough for some encounters to be merged
+    assert compressed > 0
+
+
+@pytest.mark.parametrize("epsilon", [1e-3, 1e-2, 5e-2])
+def test_long_session_stays_within_error_bound_of_unmerged_encounters(epsilon):
+    rng = random.Random(0)
+    facts = make_facts(sp.SpacingModel, 8)
+    model = sp.SpacingModel(activation_epsilon=epsilon)
+    model.load_facts(facts)
+
+    # The encounters of each fact without merging, with the activations the bounded model estimated for them
+    encounters = {}
+    now = 0.0
+    checked = 0
+    for _ in range(1500):
+        fact, _ = model.get_next_fact(now)
+        state = model.engine.get_state(now, fact.fact_id)
+        bound = es.error_bound(state, now)
+        times, activations = encounters.setdefault(fact.fact_id, ([], []))
+        unmerged = ae.calculate_activation(
+            times, [model.calculate_decay(a, state.alpha) for a in activations], now)
+
+        rt = rng.uniform(500, 4000)
+        model.register_response(sp.Response(fact, now, rt, rng.random() < 0.8))
+        activation = model.engine.states[fact.fact_id].activations[-1]
+        if math.isfinite(unmerged):
+            assert abs(activation - unmerged) <= bound + TOLERANCE
+            checked += bound > 0
+        times.append(now)
+        activations.append(activation)
+        now += rt + rng.uniform(300, 1000)
+
+    assert checked > 0
+    assert max(len(s.times) for s in model.engine.states.values()) < max(len(e[0]) for e in encounters.values())
+
+
+def test_compression_reduces_stored_encounters():
+    fact = sp.Fact("0", "q", "a")
+    model = sp.SpacingModel(activation_epsilon=1e-2)
+    model.load_facts([fact])
+    for i in range(300):
+        model.register_response(sp.Response(fact, i * 3000.0, 1500, True))
+
+    state = model.engine.states["0"]
+    assert len(state.summary) > 0
+    assert len(state.times) < 300
+    assert sum(state.weights) == 300
+
+
+def test_entries_per_fact_stay_bounded_in_a_long_session():
+    rng = random.Random(1)
+    facts = make_facts(sp.SpacingModel, 4)
+    model = sp.SpacingModel(activation_epsilon=1e-3)
+    model.load_facts(facts)
+
+    now = 0.0
+    for _ in range(4000):
+        fact, _ = model.get_next_fact(now)
+        rt = rng.uniform(500, 4000)
+        model.register_response(sp.Response(fact, now, rt, rng.random() < 0.8))
+        now += rt + rng.uniform(300, 1000)
+
+        state = model.engine.states[fact.fact_id]
+        summary = state.summary or []
+        bands = [s.band for s in summary]
+        assert all(bands.count(band) <= es.MAX_GROUPS for band in set(bands))
+        assert len(state.times) - len(summary) <= model.MAX_EXACT_ENCOUNTERS
+        assert len(state.times) <= es.max_entries(model.MAX_EXACT_ENCOUNTERS)
+
+    # Hundreds of encounters per fact are represented by far fewer entries
+    assert max(len(rows) for rows in model.response_rows.values()) > 1000
+    assert max(len(s.times) for s in model.engine.states.values()) <= 2 * model.MAX_EXACT_ENCOUNTERS
@@ -0,0 +1,123 @@
+import random
+
+import pytest
+
+import slimstampen.flippingmodel as fm
+from conftest import make_facts, reference_replay, run_session
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_streamed_export_matches_export_data_after_flips(tmp_path, seed):
+    streamed = fm.FlippingModel()
+    streamed.start_export(tmp_path / "stream.csv", buffer_size=7)
+    exported = fm.FlippingModel()
+    for model in (streamed, exported):
+        model.load_facts(make_facts(fm.FlippingModel, 12))
+        run_session(model, random.Random(seed), 200)
+
+    # Facts have been answered in both orientations, and some end up stored in the other one
+    presented = {(r.fact.fact_id, r.fact.flipped) for r in exported.responses}
+    assert len(presented) > len({fact_id for (fact_id, _) in presented})
+    assert any(r.fact.flipped != exported.facts[exported.fact_index[r.fact.fact_id]].flipped
+               for r in exported.responses)
+
+    assert streamed.export_data(backend="csv") == exported.export_data(backend="csv")
+
+
+@pytest.mark.parametrize("chronological", [True, False])
+def test_exported_estimates_match_original_per_row_replay(chronological):
+    rng = random.Random(4)
+    model = fm.FlippingModel()
+    facts = make_facts(fm.FlippingModel, 6)
+    model.load_facts(facts)
+    end_time = run_session(model, rng, 120)
+
+    # A response within a millisecond of the previous one is included in its rate of forgetting
+    model.register_response(fm.Response(model.get_next_fact(end_time)[0], end_time, 1200, True))
+    model.register_response(fm.Response(model.get_next_fact(end_time + 0.5)[0], end_time + 0.5, 1300, False))
+    if not chronological:
+        model.register_response(fm.Response(facts[0], end_time / 2 + 0.25, 900, True))
+
+    values = model.get_export_values()
+    assert len(values["alpha"]) == len(model.responses)
+    for i, response in enumerate(model.responses):
+        fact_id, flipped = response.fact.fact_id, response.fact.flipped
+        assert values["alpha"][i] == reference_replay(model, fact_id, response.start_time + 1, model.DEFAULT_ALPHA)[0]
+        assert values["activation"][i] == reference_replay(model, fact_id, response.start_time, model.DEFAULT_ALPHA)[1]
+        assert values["flip_alpha"][i] == reference_replay(
+            model, fact_id, response.start_time + 1, model.FLIPPING_ALPHA, flipped)[0]
+        assert values["flip_activation"][i] == reference_replay(
+            model, fact_id, response.start_time, model.FLIPPING_ALPHA, flipped)[1]
+
+
+@pytest.mark.parametrize("backend", ["csv", "pandas"])
+def test_integral_times_are_exported_as_integers(tmp_path, backend):
+    model = fm.FlippingModel()
+    facts = make_facts(fm.FlippingModel, 3)
+    model.load_facts(facts)
+    for i, start_time in enumerate((0, 3608, 6201)):
+        model.register_response(fm.Response(model.get_next_fact(start_time)[0], start_time, 2500 + i, True))
+
+    rows = model.export_data(backend=backend).splitlines()
+    assert rows[1].startswith("0,1,0,2500,True,")
+    assert rows[3].startswith("2,3,6201,2502,True,")
+
+    # A column with a fractional time keeps the float format
+    model.register_response(fm.Response(facts[0], 9000.5, 1000, True))
+    assert model.export_data(backend=backend).splitlines()[1].startswith("0,1,0.0,2500,True,")
+
+
+def test_streamed_integral_times_are_written_as_integers(tmp_path):
+    model = fm.FlippingModel()
+    model.start_export(tmp_path / "stream.csv", buffer_size=1)
+    model.load_facts(make_facts(fm.FlippingModel, 3))
+    model.register_response(fm.Response(model.get_next_fact(0)[0], 0, 2500, True))
+    model.register_response(fm.Response(model.get_next_fact(3000.25)[0], 3000.25, 1500, True))
+
+    rows = (tmp_path / "stream.csv").read_text().splitlines()
+    assert rows[1].startswith("0,1,0,2500,True,")
+    assert rows[2].startswith("1,2,3000.25,1500,True,")
+
+
+def test_export_writer_is_abstract(tmp_path):
+    from slimstampen.exportwriter import ExportWriter
+    with pytest.raises(TypeError):
+        ExportWriter(tmp_path / "stream.csv", [("fact_id", "s")], "fact_id")
+
+
+def test_closing_the_writer_stops_the_export(tmp_path):
+    model = fm.FlippingModel()
+    model.load_facts(make_facts(fm.FlippingModel, 3))
+    with model.start_export(tmp_path / "stream.csv", buffer_size=10) as writer:
+        model.register_response(fm.Response(model.get_next_fact(0)[0], 0, 2500, True))
+    assert writer.closed
+    assert len((tmp_path / "stream.csv").read_text().splitlines()) == 2
+
+    # The model no longer streams, and exports from memory
+    model.register_response(fm.Response(model.get_next_fact(4000)[0], 4000, 2500, True))
+    assert model.export_writer is None
+    assert len(model.export_data(backend="csv").splitlines()) == 3
+    assert len((tmp_path / "stream.csv").read_text().splitlines()) == 2
+
+
+def test_stop_export_closes_the_file(tmp_path):
+    model = fm.FlippingModel()
+    model.load_facts(make_facts(fm.FlippingModel, 3))
+    writer = model.start_export(tmp_path / "stream.columnar", "columnar", buffer_size=10)
+    model.register_response(fm.Response(model.get_next_fact(0)[0], 0, 2500, True))
+    model.stop_export()
+    model.stop_export()
+
+    assert writer.closed and model.export_writer is None
+    assert len(model.export_data(backend="csv").splitlines()) == 2
+
+
+def test_csv_backend_writes_the_pandas_output(tmp_path):
+    model = fm.FlippingModel()
+    model.load_facts(make_facts(fm.FlippingModel, 8))
+    run_session(model, random.Random(6), 100)
+
+    assert model.export_data(backend="csv") == model.export_data(backend="pandas")
+    model.export_data(tmp_path / "csv.csv", backend="csv")
+    model.export_data(tmp_path / "pandas.csv", backend="pandas")
+    assert (tmp_path / "csv.csv").read_bytes() == (tmp_path / "pandas.csv").read_bytes()
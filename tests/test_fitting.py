@@ -0,0 +1,75 @@
+import argparse
+
+import numpy as np
+import pytest
+
+import slimstampen.fitting as fitting
+from conftest import ROOT
+
+LOG = str(ROOT / "subjectData" / "subject-10.csv")
+
+
+def replay_errors(path, points, flipping):
+    """
+    Reference evaluation: a full replay of the session per set of constants.
+    """
+    results = np.zeros((len(points), 2))
+    for i, constants in enumerate(points):
+        activations, reading_times, rts, correct, model = fitting.replay(path, constants, flipping)
+        errors = fitting.calculate_errors(activations, reading_times, rts, correct, model.F)
+        results[i] = (errors.sum(), len(errors))
+    return results
+
+
+def test_calculate_errors_compares_correct_responses_to_seen_facts():
+    activations = np.array([-np.inf, 0.0, -1.0, 0.5, 0.0])
+    reading_times = np.array([300.0, 300.0, 500.0, 0.0, 0.0])
+    rts = np.array([1000.0, 1500.0, 3000.0, 900.0, np.inf])
+    correct = np.array([True, True, True, False, True])
+
+    errors = fitting.calculate_errors(activations, reading_times, rts, correct, 0.8)
+    assert errors.tolist() == pytest.approx([abs(1500 - 1100), abs(3000 - (800 * np.e + 500))])
+
+
+def test_fit_threshold_separates_correct_from_incorrect():
+    activations = np.array([-2.0, -1.5, -1.0, -0.5, 0.0, -np.inf])
+    correct = np.array([False, False, True, True, True, False])
+    assert fitting.fit_threshold(activations, correct) == -1.25
+
+    assert fitting.fit_threshold(activations[:3], np.array([True, True, True])) == -2.0
+    assert fitting.fit_threshold(activations[:3], np.array([False, False, False])) == -1.0
+    assert np.isnan(fitting.fit_threshold(np.array([-np.inf]), np.array([True])))
+
+
+def test_parse_grid():
+    assert fitting.parse_grid("F=0.5:1.5:3") == ("F", [0.5, 1.0, 1.5])
+    assert fitting.parse_grid(" C =0.2,0.25") == ("C", [0.2, 0.25])
+    for text in ("UNKNOWN=1,2", "FLIPPING_THRESHOLD=-1,0", "FORGET_THRESHOLD=-1,-0.8", "LOOKAHEAD_TIME=1000"):
+        with pytest.raises(argparse.ArgumentTypeError):
+            fitting.parse_grid(text)
+
+
+@pytest.mark.parametrize("flipping", [False, True])
+def test_evaluate_session_matches_a_replay_per_point(flipping):
+    points = fitting.make_points({"DEFAULT_ALPHA": [0.2, 0.35], "C": [0.15, 0.35], "F": [0.6, 1.4], "FLIPPING_ALPHA": [0.25, 0.4]})
+    results = fitting.evaluate_session(LOG, points, flipping)
+    expected = replay_errors(LOG, points, flipping)
+
+    assert results[:, 1].tolist() == expected[:, 1].tolist()
+    assert results[:, 0] == pytest.approx(expected[:, 0], rel=1e-12)
+
+
+def test_fit_on_one_log():
+    fits = fitting.fit([LOG], {"DEFAULT_ALPHA": [0.2, 0.3], "C": [0.25], "F": [0.8, 1.0]},
+                       {"FLIPPING_ALPHA": [0.25, 0.35]}, workers=2)
+    assert set(fits) == {LOG, "pooled"}
+
+    model_points = fitting.make_points({"DEFAULT_ALPHA": [0.2, 0.3], "C": [0.25], "F": [0.8, 1.0]})
+    constants, error = fitting.best_point(model_points, replay_errors(LOG, model_points, False))
+    for result in fits.values():
+        assert result["error"] == pytest.approx(error)
+        assert {k: result["constants"][k] for k in constants} == constants
+        assert result["constants"]["FLIPPING_ALPHA"] in (0.25, 0.35)
+
+        activations, _, _, correct, _ = fitting.replay(LOG, result["constants"], True)
+        assert result["constants"]["FLIPPING_THRESHOLD"] == fitting.fit_threshold(activations, correct)
@@ -0,0 +1,59 @@
+import random
+
+import pytest
+
+import slimstampen.alphaestimator as ae
+import slimstampen.flippingmodel as fm
+import slimstampen.spacingmodel as sp
+from slimstampen.forgettingqueue import ForgettingQueue, predict_forgetting_time
+from conftest import make_facts, run_session
+
+
+def test_predicted_forgetting_time_is_the_threshold_crossing(rng):
+    for _ in range(50):
+        times = sorted(rng.uniform(0, 100000) for _ in range(rng.randint(1, 8)))
+        decays = [rng.uniform(0.2, 0.8) for _ in times]
+        crossing = predict_forgetting_time(times, decays, -0.8)
+
+        assert ae.calculate_activation(times, decays, crossing) < -0.8
+        assert crossing - 1 <= times[-1] or ae.calculate_activation(times, decays, crossing - 1) >= -0.8
+
+
+def test_queue_returns_due_facts_with_their_latest_prediction():
+    queue = ForgettingQueue(-0.8)
+    queue.update("a", [0.0], [0.5])
+    queue.update("b", [0.0, 5000.0], [0.5, 0.5])
+    queue.update("a", [0.0, 1000.0, 2000.0], [0.5, 0.5, 0.5])
+    assert len(queue) == 2
+
+    due = queue.pop_due(float("inf"))
+    assert sorted(e[2] for e in due) == ["a", "b"]
+    assert queue.pop_due(float("inf")) == []
+
+    queue.restore(due)
+    assert sorted(e[2] for e in queue.pop_due(float("inf"))) == ["a", "b"]
+
+
+@pytest.mark.parametrize("seed", range(15))
+@pytest.mark.parametrize("model_type", [sp.SpacingModel, fm.FlippingModel])
+def test_queue_scheduling_matches_per_fact_reference(model_type, seed):
+    rng = random.Random(seed)
+    model = model_type(use_forgetting_queue=True)
+    model.load_facts(make_facts(model_type, rng.randint(1, 40)))
+
+    def check(model, current_time):
+        assert sp.SpacingModel.get_next_fact(model, current_time) == model.get_next_fact_per_fact(current_time)
+
+    run_session(model, rng, 150, check=check)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_queue_and_table_produce_the_same_session(seed):
+    models = []
+    for use_forgetting_queue in (False, True):
+        model = fm.FlippingModel(use_forgetting_queue)
+        model.load_facts(make_facts(fm.FlippingModel, 25))
+        run_session(model, random.Random(seed), 200)
+        models.append(model)
+
+    assert models[0].export_data(backend="csv") == models[1].export_data(backend="csv")
@@ -0,0 +1,35 @@
+import random
+
+import slimstampen.alphaestimator as ae
+import slimstampen.flippingmodel as fm
+from slimstampen.instrumentation import Instrumentation
+from conftest import make_facts, run_session
+
+
+def test_error_evaluation_is_counted_inside_estimate_alpha():
+    facts = make_facts(fm.FlippingModel, 6)
+    plain = fm.FlippingModel()
+    instrumented = fm.FlippingModel()
+    instrumentation = Instrumentation().attach(instrumented)
+    for model in (plain, instrumented):
+        model.load_facts(facts)
+        run_session(model, random.Random(3), 80)
+
+    timers = instrumentation.timers
+    error_timer = timers["calculate_predicted_reaction_time_error"]
+    assert timers["estimate_alpha"].calls > 0
+    assert error_timer.calls > 0 and error_timer.encounters > 0
+
+    # Each bisection step evaluates both ends of the bracket, for estimates with at least three encounters
+    estimates = sum(len(state.times) - 2 for engine in (instrumented.engine, instrumented.flip_engine)
+                    for state in engine.states.values() if len(state.times) >= 3)
+    assert error_timer.calls == 2 * 6 * estimates
+
+    # The wrapped evaluation does not change the estimates
+    for name in ("engine", "flip_engine"):
+        assert {k: s.alpha for (k, s) in getattr(plain, name).states.items()} == \
+            {k: s.alpha for (k, s) in getattr(instrumented, name).states.items()}
+
+    instrumentation.detach(instrumented)
+    assert instrumented.engine.calculate_predicted_reaction_time_error is ae.calculate_predicted_reaction_time_error
+    assert instrumented.engine.estimate_alpha is ae.estimate_alpha
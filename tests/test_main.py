@@ -0,0 +1,47 @@
+import csv
+import subprocess
+import sys
+import time
+
+import pytest
+
+from conftest import ROOT
+
+
+PROMPTS = ("What is the translation", "Please type what")
+
+
+def run_main(cwd, answer, *args):
+    """
+    Run main.py in `cwd`, typing `answer` 50 milliseconds after each question so that each trial starts at a different time, and return the rows of the exported data.csv.
+    """
+    process = subprocess.Popen([sys.executable, str(ROOT / "main.py"), *args], cwd=cwd, stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    for line in process.stdout:
+        if line.startswith(PROMPTS):
+            time.sleep(0.05)
+            process.stdin.write(answer + "\n")
+            process.stdin.flush()
+    process.stdin.close()
+    assert process.wait(timeout=60) == 0, process.stderr.read()
+    process.stderr.close()
+    process.stdout.close()
+
+    with open(cwd / "data.csv", encoding="utf-8") as file:
+        return list(csv.DictReader(file))
+
+
+@pytest.mark.parametrize("prefetch", [False, True])
+def test_trials_limits_the_number_of_trials(tmp_path, prefetch):
+    args = ["--file", str(ROOT / "data" / "swahili.csv"), "--trials", "5"] + (["--prefetch"] if prefetch else [])
+    rows = run_main(tmp_path, "answer", *args)
+    assert [row["trial"] for row in rows] == ["1", "2", "3", "4", "5"]
+
+
+def test_limit_loads_the_first_non_empty_rows(tmp_path):
+    deck = tmp_path / "deck.csv"
+    deck.write_text("1,one,moja\n\n2,two,mbili\n\n\n3,three,tatu\n4,four,nne\n", encoding="utf-8")
+    rows = run_main(tmp_path, "answer", "--file", str(deck), "--limit", "3", "--trials", "8")
+
+    assert len(rows) == 8
+    assert {row["fact_id"] for row in rows} == {"1", "2", "3"}
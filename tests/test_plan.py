@@ -0,0 +1,52 @@
+import copy
+import random
+
+import pytest
+
+import slimstampen.flippingmodel as fm
+import slimstampen.spacingmodel as sp
+from conftest import make_facts, run_session
+
+
+def replay_plan(model, current_time, k, assumed_rt, assumed_correct):
+    """
+    The plan of get_next_fact and register_response on a deep copy of the model.
+    """
+    model = copy.deepcopy(model)
+    plan = []
+    for _ in range(k):
+        before = {f.fact_id: f for f in model.facts}
+        fact, new = model.get_next_fact(current_time)
+        flipped = fact != before[fact.fact_id]
+        plan.append(sp.PlannedTrial(fact, new, current_time, model.calculate_activation(current_time, fact), flipped))
+        model.register_response(sp.Response(fact, current_time, assumed_rt, assumed_correct))
+        current_time += assumed_rt
+    return plan
+
+
+@pytest.mark.parametrize("use_forgetting_queue", [False, True])
+@pytest.mark.parametrize("model_type", [sp.SpacingModel, fm.FlippingModel])
+def test_plan_matches_a_replay_on_a_copy(model_type, use_forgetting_queue):
+    rng = random.Random(1)
+    model = model_type(use_forgetting_queue)
+    model.load_facts(make_facts(model_type, 12))
+
+    plans = 0
+    flips = 0
+    for trials in (0, 1, 2, 3, 20, 60):
+        current_time = run_session(model, rng, trials, max((r.start_time + r.rt for r in model.responses), default=0.0))
+        facts = list(model.facts)
+        export = model.export_data(backend="csv")
+
+        for k, assumed_rt, assumed_correct in ((1, 2000, True), (10, 1500, True), (10, 4000, False), (20, 800, True)):
+            plan = model.plan_next(current_time, k, assumed_rt, assumed_correct)
+            assert plan == replay_plan(model, current_time, k, assumed_rt, assumed_correct)
+            plans += 1
+            flips += sum(trial.flipped for trial in plan)
+
+        # Planning does not change the model
+        assert model.facts == facts
+        assert model.export_data(backend="csv") == export
+
+    assert plans == 24
+    assert (flips > 0) == (model_type is fm.FlippingModel)
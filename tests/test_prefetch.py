@@ -0,0 +1,113 @@
+import copy
+import random
+import time
+
+import pytest
+
+import slimstampen.flippingmodel as fm
+from slimstampen.prefetch import Prefetcher
+from conftest import make_facts
+
+
+class Clock(object):
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def wait_for_candidates(prefetcher: Prefetcher) -> None:
+    deadline = time.monotonic() + 10
+    while len(prefetcher.candidates) < 2:
+        assert time.monotonic() < deadline, "no candidates were computed"
+        time.sleep(0.001)
+
+
+@pytest.mark.parametrize("use_flipping", [None, False])
+def test_candidates_match_the_next_fact_after_the_response(use_flipping):
+    rng = random.Random(0)
+    model = fm.FlippingModel()
+    model.load_facts(make_facts(fm.FlippingModel, 10))
+    prefetcher = Prefetcher(model, Clock(), use_flipping=use_flipping)
+    options = {} if use_flipping is None else {"use_flipping": use_flipping}
+
+    current_time = 0.0
+    checks = 0
+    for _ in range(80):
+        fact, _ = model.get_next_fact(current_time, **options)
+        rt = rng.uniform(500, 6000)
+
+        # Predictions while the learner is answering, for both outcomes
+        for now in (current_time + rt / 2, current_time + rt):
+            for correct in (True, False):
+                response = fm.Response(fact, current_time, max(now - current_time, 1), correct)
+                candidate = prefetcher.predict(response, now)
+                expected = copy.deepcopy(model)
+                expected.register_response(response)
+                assert (candidate.fact, candidate.new) == expected.get_next_fact(now, **options)
+                checks += 1
+
+        model.register_response(fm.Response(fact, current_time, rt, rng.random() < 0.75))
+        current_time += rt + rng.uniform(0, 3000)
+
+    assert checks == 80 * 4
+
+
+def run_trial(model, prefetcher, clock, fact, start_time, rt, correct, delay):
+    """
+    Show a fact, let the background thread predict the next fact at the time of the answer, and request the next fact `delay` milliseconds later.
+    """
+    clock.now = start_time + rt
+    prefetcher.start(fact, start_time)
+    wait_for_candidates(prefetcher)
+    prefetcher.register_response(fm.Response(fact, start_time, rt, correct))
+    return prefetcher.get_next_fact(start_time + rt + delay)
+
+
+def test_candidates_are_used_within_the_tolerance():
+    model = fm.FlippingModel()
+    model.load_facts(make_facts(fm.FlippingModel, 6))
+    clock = Clock()
+    prefetcher = Prefetcher(model, clock, interval=1, tolerance=100)
+
+    # With more than two studied facts, a candidate does not depend on the reaction time
+    start_time = 0.0
+    for _ in range(4):
+        fact, _ = model.get_next_fact(start_time)
+        model.register_response(fm.Response(fact, start_time, 2000, True))
+        start_time += 4000
+
+    fact, _ = model.get_next_fact(start_time)
+    expected = copy.deepcopy(model)
+    expected.register_response(fm.Response(fact, start_time, 1500, True))
+    assert run_trial(model, prefetcher, clock, fact, start_time, 1500, True, 100) == \
+        expected.get_next_fact(start_time + 1500)
+    assert (prefetcher.hits, prefetcher.misses) == (1, 0)
+    assert model.facts == expected.facts
+
+    # Too late, and requested before the prediction was made
+    start_time += 4000
+    fact, _ = model.get_next_fact(start_time)
+    run_trial(model, prefetcher, clock, fact, start_time, 1500, False, 101)
+    start_time += 4000
+    fact, _ = model.get_next_fact(start_time)
+    run_trial(model, prefetcher, clock, fact, start_time, 1500, True, -1)
+    assert (prefetcher.hits, prefetcher.misses) == (1, 2)
+
+
+def test_candidates_that_depend_on_the_reaction_time_are_not_used():
+    model = fm.FlippingModel()
+    facts = make_facts(fm.FlippingModel, 4)
+    model.load_facts(facts)
+    clock = Clock()
+    prefetcher = Prefetcher(model, clock, interval=1)
+
+    model.register_response(fm.Response(facts[0], 0.0, 2000, True))
+    run_trial(model, prefetcher, clock, facts[1], 4000.0, 1500, True, 0)
+    assert prefetcher.candidates[True].depends_on_rt
+    assert not prefetcher.candidates[False].depends_on_rt
+    assert (prefetcher.hits, prefetcher.misses) == (0, 1)
+
+    run_trial(model, prefetcher, clock, facts[1], 8000.0, 1500, False, 0)
+    assert (prefetcher.hits, prefetcher.misses) == (1, 1)
@@ -0,0 +1,105 @@
+import random
+
+import pytest
+
+import slimstampen.alphaestimator as ae
+import slimstampen.flippingmodel as fm
+from slimstampen.snapshot import load_snapshot, save_snapshot
+from conftest import make_facts, reference_replay, run_session
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_stored_states_match_replay(seed):
+    rng = random.Random(seed)
+    model = fm.FlippingModel()
+    model.load_facts(make_facts(fm.FlippingModel, 12))
+    end_time = run_session(model, rng, 150)
+
+    for engine in (model.engine, model.flip_engine):
+        for key in engine.states:
+            for time in [end_time] + [rng.uniform(0, end_time) for _ in range(10)]:
+                state = engine.get_state(time, key)
+                replayed = engine.replay_state(time, key)
+                assert state.times == replayed.times
+                assert state.alpha == replayed.alpha
+                assert state.decays == replayed.decays
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_states_match_original_full_replay(seed):
+    rng = random.Random(seed)
+    model = fm.FlippingModel()
+    model.load_facts(make_facts(fm.FlippingModel, 8))
+    end_time = run_session(model, rng, 150)
+
+    for engine, default_alpha in ((model.engine, model.DEFAULT_ALPHA), (model.flip_engine, model.FLIPPING_ALPHA)):
+        for key in engine.states:
+            fact_id, flipped = key if engine is model.flip_engine else (key, None)
+            for time in [end_time] + [rng.uniform(0, end_time) for _ in range(5)]:
+                state = engine.get_state(time, key)
+                alpha, activation = reference_replay(model, fact_id, time, default_alpha, flipped)
+                assert state.alpha == alpha
+                assert ae.calculate_activation(state.times, state.decays, time) == activation
+
+
+def test_flip_estimates_are_kept_per_orientation(rng):
+    model = fm.FlippingModel()
+    model.load_facts(make_facts(fm.FlippingModel, 8))
+    end_time = run_session(model, rng, 200)
+
+    flipped = {key for key in model.flip_engine.states if key[1]}
+    assert flipped, "the session should flip some facts"
+
+    for fact_id, orientation in model.flip_engine.states:
+        fact = model.facts[model.fact_index[fact_id]]
+        if fact.flipped != orientation:
+            fact = fact._replace(question=fact.answer, answer=fact.question, flipped=orientation)
+
+        # Only the responses in this orientation count, starting from the flipping constants
+        responses = [r for r in model.responses if r.fact.fact_id == fact_id and r.fact.flipped == orientation]
+        state = model.flip_engine.get_state(end_time, (fact_id, orientation))
+        assert state.times == [r.start_time for r in responses]
+        assert state.default_alpha == model.FLIPPING_ALPHA
+        assert model.get_flip_alpha(end_time, fact) == state.alpha
+        assert model.calculate_flip_activation(end_time, fact) == ae.calculate_activation(
+            state.times, state.decays, end_time)
+
+
+def test_checkpoints_answer_historical_queries_before_and_after_a_snapshot(tmp_path):
+    rng = random.Random(5)
+    model = fm.FlippingModel()
+    model.load_facts(make_facts(fm.FlippingModel, 6))
+    end_time = run_session(model, rng, 100)
+    save_snapshot(model, tmp_path / "model.snap")
+    restored = load_snapshot(tmp_path / "model.snap")
+
+    for name, default_alpha in (("engine", model.DEFAULT_ALPHA), ("flip_engine", model.FLIPPING_ALPHA)):
+        engine, restored_engine = getattr(model, name), getattr(restored, name)
+        for key, state in engine.states.items():
+            fact_id, flipped = key if name == "flip_engine" else (key, None)
+            assert list(restored_engine.alphas[key]) == list(engine.alphas[key])
+
+            # At, between, before and after the encounters of the key
+            times = state.times + [t + 0.5 for t in state.times] + [state.times[0] - 1, end_time]
+            for time in times:
+                alpha, activation = reference_replay(model, fact_id, time, default_alpha, flipped)
+                for checkpoint in (engine.get_checkpoint(time, key), restored_engine.get_checkpoint(time, key)):
+                    assert checkpoint.times == [t for t in state.times if t < time]
+                    assert checkpoint.alpha == alpha
+                    assert ae.calculate_activation(checkpoint.times, checkpoint.decays, time) == activation
+
+
+def test_out_of_order_responses_drop_the_checkpoints_of_their_fact():
+    model = fm.FlippingModel()
+    facts = make_facts(fm.FlippingModel, 2)
+    model.load_facts(facts)
+    for i in range(4):
+        model.register_response(fm.Response(facts[0], 10000.0 * (i + 1), 1500, True))
+    model.register_response(fm.Response(facts[1], 12000.0, 1500, True))
+    model.register_response(fm.Response(facts[0], 5000.0, 1500, True))
+
+    assert "0" not in model.engine.alphas and "1" in model.engine.alphas
+    for time in (7000.0, 25000.0, 50000.0):
+        alpha, activation = reference_replay(model, "0", time, model.DEFAULT_ALPHA)
+        assert model.get_rate_of_forgetting(time, facts[0]) == alpha
+        assert model.calculate_activation(time, facts[0]) == activation
@@ -0,0 +1,35 @@
+import random
+
+import slimstampen.flippingmodel as fm
+from slimstampen.rescore import read_session_log, rebuild_model, rescore_file
+from conftest import ROOT, make_facts, run_session
+
+
+def test_rescoring_an_export_reproduces_it(tmp_path):
+    model = fm.FlippingModel()
+    model.load_facts(make_facts(fm.FlippingModel, 15))
+    run_session(model, random.Random(4), 150)
+    model.export_data(tmp_path / "session.csv", backend="csv")
+
+    path, responses, _ = rescore_file(tmp_path / "session.csv", tmp_path / "rescored.csv")
+    assert responses == 150
+    assert (tmp_path / "rescored.csv").read_bytes() == (tmp_path / "session.csv").read_bytes()
+
+
+def test_changed_constants_change_the_estimates(tmp_path):
+    model = fm.FlippingModel()
+    model.load_facts(make_facts(fm.FlippingModel, 10))
+    run_session(model, random.Random(5), 80)
+    model.export_data(tmp_path / "session.csv", backend="csv")
+
+    rescored = rebuild_model(tmp_path / "session.csv", {"DEFAULT_ALPHA": 0.4})
+    assert rescored.DEFAULT_ALPHA == 0.4
+    assert list(rescored.responses) == list(model.responses)
+    assert rescored.export_data(backend="csv") != model.export_data(backend="csv")
+
+
+def test_recorded_logs_are_read_once_per_trial():
+    for path in sorted((ROOT / "subjectData").glob("subject-*.csv"))[:5]:
+        trials = [int(values["trial"]) for values in read_session_log(path)]
+        assert trials == list(range(1, len(trials) + 1))
+        assert len(rebuild_model(path).responses) == len(trials)
@@ -0,0 +1,83 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+import slimstampen.server as server
+
+
+def make_host(**options) -> server.SessionHost:
+    return server.SessionHost({"deck": [[str(i), f"q{i}", f"a{i}"] for i in range(5)]}, **options)
+
+
+def test_submitting_a_response_again_registers_it_once():
+    async def scenario():
+        host = make_host()
+        session_id = host.create_session("deck")
+        fact = await host.next_fact(session_id, 0)
+        for _ in range(2):
+            await host.submit_response(session_id, fact["fact_id"], 0, 1500, True)
+        return host.get_session(session_id).model
+
+    model = asyncio.run(scenario())
+    assert len(model.responses) == 1
+
+
+def test_waiting_for_the_session_lock_counts_towards_the_budget():
+    async def scenario():
+        host = make_host(latency_budget=0.05)
+        session_id = host.create_session("deck")
+        ran = []
+
+        slow = asyncio.ensure_future(host.run(session_id, lambda session: time.sleep(0.3)))
+        await asyncio.sleep(0.01)
+        start = time.monotonic()
+        with pytest.raises(asyncio.TimeoutError):
+            await host.run(session_id, lambda session: ran.append(True))
+        waited = time.monotonic() - start
+
+        with pytest.raises(asyncio.TimeoutError):
+            await slow
+        await asyncio.sleep(0.4)
+
+        # The lock is free again once the slow operation has completed
+        await host.run(session_id, lambda session: ran.append(True))
+        return waited, ran, host.stats
+
+    waited, ran, stats = asyncio.run(scenario())
+    assert waited < 0.2
+    assert ran == [True]
+    assert stats["over_budget"] == 2
+
+
+def test_unexpected_errors_are_answered_with_500():
+    async def scenario():
+        host = make_host()
+        session_id = host.create_session("deck")
+
+        async def fail(*args):
+            raise ZeroDivisionError("division by zero")
+        host.next_fact = fail
+
+        listener = await asyncio.start_server(lambda r, w: server.serve_connection(host, r, w), "127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        for _ in range(2):
+            writer.write(f"POST /sessions/{session_id}/next HTTP/1.1\r\nContent-Length: 2\r\n\r\n{{}}".encode("latin-1"))
+            status = (await reader.readline()).decode("latin-1")
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line:
+                    break
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+            body = json.loads(await reader.readexactly(int(headers["content-length"])))
+            assert status.split(" ")[1] == "500"
+            assert "ZeroDivisionError" in body["error"]
+        writer.close()
+        listener.close()
+        await listener.wait_closed()
+
+    asyncio.run(scenario())
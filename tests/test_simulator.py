@@ -0,0 +1,82 @@
+import csv
+
+import numpy as np
+import pytest
+
+import slimstampen.alphaestimator as ae
+import slimstampen.flippingmodel as fm
+from slimstampen.simulator import SyntheticLearners, load_deck, simulate, simulate_sessions
+from conftest import ROOT, make_facts
+
+DECK = str(ROOT / "data" / "swahili.csv")
+
+
+def test_true_activations_follow_the_encounters():
+    rng = np.random.default_rng(0)
+    population = SyntheticLearners(3, 4, rng)
+    everyone = np.arange(3)
+
+    # More encounters than the initial capacity, so that the arrays grow
+    for trial in range(7):
+        positions = np.array([trial % 2, trial % 4, 3])
+        times = np.array([trial * 4000.0, trial * 5000.0, trial * 6000.0])
+        activations = population.calculate_activations(everyone, positions, times)
+        population.add_encounters(everyone, positions, times, activations)
+
+    for learner in range(3):
+        for position in range(4):
+            count = population.counts[learner, position]
+            times = population.times[learner, position, :count].tolist()
+            decays = population.decays[learner, position, :count].tolist()
+            expected = ae.calculate_activation(times, decays, 50000.0)
+            actual = population.calculate_activations(np.array([learner]), np.array([position]), np.array([50000.0]))[0]
+            assert actual == pytest.approx(expected, rel=1e-12)
+
+
+def test_responses_follow_the_reaction_time_equation_without_noise():
+    rng = np.random.default_rng(1)
+    population = SyntheticLearners(4, 2, rng, rt_noise=0.0, study_accuracy=1.0)
+    activations = np.array([-0.5, 0.5, -np.inf, 0.2])
+    reading_times = np.array([300.0, 500.0, 300.0, 300.0])
+    new = np.array([False, False, True, True])
+    rts, correct = population.respond(activations, reading_times, new, np.zeros(4, dtype=bool))
+
+    assert correct[2] and correct[3]
+    assert rts[2] == rts[3] == np.rint(1000 * (population.F + 0.3))
+    for i in (0, 1):
+        activation = activations[i] if correct[i] else population.retrieval_threshold
+        assert rts[i] == np.rint((population.F * np.exp(-activation) + reading_times[i] / 1000) * 1000)
+
+
+def test_sessions_are_reproducible_and_scheduled_by_the_models():
+    deck = load_deck(DECK)
+    models, population = simulate_sessions(deck, 3, 60, seed=2)
+    again, _ = simulate_sessions(deck, 3, 60, seed=2)
+    assert [list(m.responses) for m in models] == [list(m.responses) for m in again]
+    assert population.counts.sum() == 3 * 60
+
+    # Replaying the responses into a fresh model presents the same facts at the same times
+    for model in models:
+        replayed = fm.FlippingModel()
+        replayed.load_facts(deck)
+        for response in model.responses:
+            fact, _ = replayed.get_next_fact(response.start_time)
+            assert fact == response.fact
+            replayed.register_response(response)
+
+
+def test_simulate_writes_logs_and_true_alphas(tmp_path):
+    deck = tmp_path / "deck.csv"
+    with open(deck, "w", encoding="utf-8", newline="") as file:
+        csv.writer(file).writerows(make_facts(fm.FlippingModel, 5))
+
+    results = simulate(str(deck), str(tmp_path / "out"), 3, 20, batch_size=2, workers=1)
+    assert [trials for (trials, _) in results] == [40, 20]
+
+    for learner in range(3):
+        with open(tmp_path / "out" / f"learner_{learner}.csv", encoding="utf-8") as file:
+            assert len(list(csv.reader(file))) == 21
+    with open(tmp_path / "out" / "learner_0-1_alphas.csv", encoding="utf-8") as file:
+        rows = list(csv.reader(file))
+    assert rows[0] == ["learner", "fact_id", "alpha"]
+    assert len(rows) == 1 + 2 * 5
@@ -0,0 +1,92 @@
+import random
+
+import pytest
+
+import slimstampen.flippingmodel as fm
+import slimstampen.spacingmodel as sp
+from slimstampen.snapshot import HEADER, ResponseJournal, load_snapshot, read_journal, restore, save_snapshot
+from conftest import make_facts, run_session
+
+
+def make_model(model_type, seed: int, trials: int, **options):
+    rng = random.Random(seed)
+    model = model_type(**options)
+    model.load_facts(make_facts(model_type, 20))
+    return model, rng, run_session(model, rng, trials)
+
+
+def assert_same_model(model, restored):
+    assert type(restored) is type(model)
+    assert restored.facts == model.facts
+    assert list(restored.responses) == list(model.responses)
+    for name in ("engine", "flip_engine"):
+        engine, restored_engine = getattr(model, name, None), getattr(restored, name, None)
+        if engine is None:
+            continue
+        assert restored_engine.states.keys() == engine.states.keys()
+        for key, state in engine.states.items():
+            other = restored_engine.states[key]
+            assert (other.times, other.decays, other.alpha, other.last_time) == (
+                state.times, state.decays, state.alpha, state.last_time)
+    assert restored.export_data(backend="csv") == model.export_data(backend="csv")
+
+
+@pytest.mark.parametrize("use_forgetting_queue", [False, True])
+@pytest.mark.parametrize("model_type", [sp.SpacingModel, fm.FlippingModel])
+def test_snapshot_round_trip(tmp_path, model_type, use_forgetting_queue):
+    model, rng, end_time = make_model(model_type, 1, 120, use_forgetting_queue=use_forgetting_queue)
+    save_snapshot(model, tmp_path / "model.snap")
+    restored = load_snapshot(tmp_path / "model.snap")
+    assert_same_model(model, restored)
+
+    # Both models continue with the same choices
+    for current_time in (end_time, end_time + 60000):
+        assert restored.get_next_fact(current_time) == model.get_next_fact(current_time)
+
+
+def test_journal_tail_is_replayed_after_the_snapshot(tmp_path):
+    model, rng, end_time = make_model(fm.FlippingModel, 2, 60)
+    save_snapshot(model, tmp_path / "model.snap")
+    model.journal = ResponseJournal(tmp_path / "model.journal", len(model.responses))
+    run_session(model, rng, 40, end_time)
+    model.journal.close()
+
+    restored = restore(tmp_path / "model.snap", tmp_path / "model.journal")
+    restored.journal.close()
+    assert_same_model(model, restored)
+
+
+def test_incomplete_journal_record_is_ignored(tmp_path):
+    journal = ResponseJournal(tmp_path / "model.journal")
+    journal.append(0, False, 0.0, 1500.0, True)
+    journal.append(1, True, 5000.0, 2500.0, False)
+    journal.close()
+    with open(tmp_path / "model.journal", "ab") as file:
+        file.write(b"\x01\x02\x03")
+
+    assert list(read_journal(tmp_path / "model.journal")) == [
+        (0, False, 0.0, 1500.0, True), (1, True, 5000.0, 2500.0, False)]
+
+    # A reopened journal appends at the record boundary
+    journal = ResponseJournal(tmp_path / "model.journal")
+    journal.append(2, False, 9000.0, 1000.0, True)
+    journal.close()
+    assert len(list(read_journal(tmp_path / "model.journal", 1))) == 2
+
+
+def test_bounded_models_cannot_be_saved(tmp_path):
+    model, _, _ = make_model(sp.SpacingModel, 3, 20, activation_epsilon=0.01)
+    with pytest.raises(RuntimeError):
+        save_snapshot(model, tmp_path / "model.snap")
+
+
+def test_snapshots_of_an_older_version_are_rejected(tmp_path):
+    model, _, _ = make_model(sp.SpacingModel, 4, 20)
+    save_snapshot(model, tmp_path / "model.snap")
+    with open(tmp_path / "model.snap", "r+b") as file:
+        magic, _, length = HEADER.unpack(file.read(HEADER.size))
+        file.seek(0)
+        file.write(HEADER.pack(magic, 1, length))
+
+    with pytest.raises(RuntimeError, match="version 1"):
+        load_snapshot(tmp_path / "model.snap")
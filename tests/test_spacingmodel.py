@@ -0,0 +1,99 @@
+import random
+
+import pytest
+
+import slimstampen.flippingmodel as fm
+import slimstampen.spacingmodel as sp
+from conftest import make_facts, reference_replay, run_session
+
+
+def reference_next_fact(model, current_time):
+    """
+    The original SpacingModel.get_next_fact, with the activation of every fact from a full replay.
+    """
+    fact_activations = [(f, reference_replay(model, f.fact_id, current_time + model.LOOKAHEAD_TIME, model.DEFAULT_ALPHA)[1])
+                        for f in model.facts]
+    seen_facts = [(f, a) for (f, a) in fact_activations if a > -float("inf")]
+    not_seen_facts = [(f, a) for (f, a) in fact_activations if a == -float("inf")]
+
+    if len(seen_facts) > 2:
+        last_response = model.responses[-1]
+        seen_facts = [(f, a) for (f, a) in seen_facts if f.fact_id != last_response.fact.fact_id]
+
+    seen_facts_below_threshold = [(f, a) for (f, a) in seen_facts if a < model.FORGET_THRESHOLD]
+    if len(not_seen_facts) == 0 or len(seen_facts_below_threshold) > 0:
+        return min(seen_facts, key=lambda t: t[1])[0], False
+    return not_seen_facts[0][0], True
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_incremental_state_matches_original_full_replay(seed):
+    rng = random.Random(seed)
+    model = sp.SpacingModel()
+    model.load_facts(make_facts(sp.SpacingModel, rng.randint(3, 10)))
+
+    def check(model, current_time):
+        assert model.get_next_fact(current_time) == reference_next_fact(model, current_time)
+
+    end_time = run_session(model, rng, 80, check=check)
+
+    for fact in model.facts:
+        for time in [end_time] + [rng.uniform(0, end_time) for _ in range(5)]:
+            alpha, activation = reference_replay(model, fact.fact_id, time, model.DEFAULT_ALPHA)
+            assert model.get_rate_of_forgetting(time, fact) == alpha
+            assert model.calculate_activation(time, fact) == activation
+
+
+def test_duplicate_fact_ids_and_start_times_are_rejected():
+    model = sp.SpacingModel()
+    facts = make_facts(sp.SpacingModel, 3)
+    for fact in facts:
+        model.add_fact(fact)
+    with pytest.raises(RuntimeError, match="already a fact with the same ID: 1"):
+        model.add_fact(sp.Fact("1", "other", "question"))
+
+    model.register_response(sp.Response(facts[0], 1000, 2000, True))
+    with pytest.raises(RuntimeError, match="already been logged at this start_time: 1000"):
+        model.register_response(sp.Response(facts[1], 1000, 2000, True))
+
+    # The rejected calls leave the indexes unchanged
+    assert [model.fact_index[f.fact_id] for f in facts] == [0, 1, 2]
+    assert model.facts[1] == facts[1]
+    assert len(model.responses) == 1 and model.start_times == {1000}
+    assert {k: list(rows) for (k, rows) in model.response_rows.items()} == {"0": [0]}
+
+
+def test_fact_index_follows_flipped_facts():
+    model = fm.FlippingModel()
+    model.load_facts(make_facts(fm.FlippingModel, 8))
+    run_session(model, random.Random(2), 150)
+
+    assert any(f.flipped for f in model.facts), "the session should flip some facts"
+    for position, fact in enumerate(model.facts):
+        assert model.fact_index[fact.fact_id] == position
+    assert sorted(model.response_rows) == sorted({r.fact.fact_id for r in model.responses})
+    for fact_id, rows in model.response_rows.items():
+        assert list(rows) == [i for (i, r) in enumerate(model.responses) if r.fact.fact_id == fact_id]
+
+    # Test questions are the studied facts, in their original orientation before the flip ratio is applied
+    questions = model.get_test_questions(flip_ratio=0)
+    assert sorted(f.fact_id for f in questions) == sorted(model.response_rows)
+    assert not any(f.flipped for f in questions)
+
+
+def test_load_facts_checks_all_ids_before_adding_any(tmp_path):
+    model = sp.SpacingModel()
+    with pytest.raises(RuntimeError, match="same ID: 1"):
+        model.load_facts([("0", "a", "b"), ("1", "c d", "e"), ("1", "f", "g")])
+    assert model.facts == [] and model.fact_index == {}
+
+    deck = tmp_path / "deck.csv"
+    deck.write_text("0,a,b\n\n1,two words,e\n", encoding="utf-8")
+    assert model.load_facts(deck) == 2
+    assert model.facts == [sp.Fact("0", "a", "b"), sp.Fact("1", "two words", "e")]
+    reading_time = model.get_reading_time("two words")
+    assert model.fact_timings["two words"] == (
+        reading_time, 1.5 * model.estimate_reaction_time_from_activation(model.FORGET_THRESHOLD, reading_time))
+    with pytest.raises(RuntimeError, match="same ID: 0"):
+        model.load_facts([sp.Fact("2", "h", "i"), sp.Fact("0", "j", "k")])
+    assert len(model.facts) == 2
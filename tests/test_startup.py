@@ -0,0 +1,29 @@
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT
+
+SESSION = """
+import sys
+import slimstampen.flippingmodel as fm
+import slimstampen.exportwriter
+assert "pandas" not in sys.modules, "importing the models loads pandas"
+
+model = fm.FlippingModel()
+model.load_facts([("1", "one", "moja"), ("2", "two", "mbili")])
+for i in range(6):
+    model.register_response(fm.Response(model.get_next_fact(i * 3000)[0], i * 3000, 1500, True))
+model.export_data("{path}", backend="{backend}")
+print("pandas" in sys.modules)
+"""
+
+
+@pytest.mark.parametrize("backend, loads_pandas", [("csv", False), ("columnar", False), ("pandas", True)])
+def test_pandas_is_only_imported_by_the_pandas_backend(tmp_path, backend, loads_pandas):
+    path = (tmp_path / "export").as_posix()
+    result = subprocess.run([sys.executable, "-c", SESSION.format(path=path, backend=backend)], cwd=ROOT,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split() == [str(loads_pandas)]